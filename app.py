@@ -10,6 +10,13 @@ import os
 # Adicionar pasta utils ao path
 sys.path.append(os.path.dirname(__file__))
 from utils.helpers import format_currency_br, apply_filters_sidebar, criar_tabela_vencimentos
+from utils.data_loader import carregar_datasets
+from utils.desempenho import iniciar_execucao, finalizar_execucao, exibir_grafico
+from utils.aquecimento import acompanhar_aquecimento
+from utils.figuras import figura_em_cache
+from utils.filtros import montar_filtros
+from utils.cubo import agregar
+from utils.motor import ler_relatorio_precomputado
 
 # Configuração da página
 st.set_page_config(
@@ -19,6 +26,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Medição de desempenho (ativada com ?desempenho=1 na URL)
+iniciar_execucao('app')
+# Aquecimento dos caches em segundo plano (aviso na sidebar enquanto não termina)
+acompanhar_aquecimento()
+
 # CSS customizado
 st.markdown("""
 <style>
@@ -31,18 +43,115 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Função para carregar dados
-@st.cache_data
-def load_data():
-    pr = pd.read_excel('data/PagamentosRealizadosRelatorio.xlsx')
-    cr = pd.read_excel('data/ContasRecebidaseaReceber.xlsx')
-    par = pd.read_excel('data/PagamentosaRealizarRelatorio.xlsx')
-    pf = pd.read_excel('data/PrevisaoFaturamento.xlsx')
-    return pr, cr, par, pf
+# Gráficos (cada figura é reaproveitada enquanto os dados agregados não mudam)
+
+@figura_em_cache
+def grafico_comparacao(dados_comparacao):
+    fig = px.bar(
+        dados_comparacao,
+        x='Categoria',
+        y='Valor',
+        color='Categoria',
+        text='Valor',
+        color_discrete_map={
+            'Receitas': '#10b981',
+            'Despesas': '#ef4444',
+            'Pendentes': '#f59e0b'
+        }
+    )
+    
+    fig.update_traces(
+        texttemplate='R$ %{text:,.2f}',
+        textposition='outside'
+    )
+    
+    fig.update_layout(
+        showlegend=False,
+        xaxis_title="",
+        yaxis_title="Valor (R$)",
+        height=400
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_pizza(dados_pizza):
+    fig = px.pie(
+        dados_pizza,
+        values='Valor',
+        names='Tipo',
+        color='Tipo',
+        color_discrete_map={
+            'Receitas': '#10b981',
+            'Despesas Realizadas': '#ef4444',
+            'Despesas Pendentes': '#f59e0b'
+        }
+    )
+    
+    fig.update_traces(
+        textposition='inside',
+        textinfo='percent+label',
+        hovertemplate='<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Percentual: %{percent}<extra></extra>'
+    )
+    
+    fig.update_layout(height=400)
+    return fig
+
+
+@figura_em_cache
+def grafico_top_despesas(top_despesas):
+    fig = px.bar(
+        x=top_despesas.values,
+        y=top_despesas.index,
+        orientation='h',
+        text=top_despesas.values,
+        color=top_despesas.values,
+        color_continuous_scale='Reds'
+    )
+    
+    fig.update_traces(
+        texttemplate='R$ %{text:,.2f}',
+        textposition='outside'
+    )
+    
+    fig.update_layout(
+        showlegend=False,
+        xaxis_title="Valor (R$)",
+        yaxis_title="",
+        height=400,
+        coloraxis_showscale=False
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_top_receitas(top_receitas):
+    fig = px.bar(
+        x=top_receitas.values,
+        y=top_receitas.index,
+        orientation='h',
+        text=top_receitas.values,
+        color=top_receitas.values,
+        color_continuous_scale='Greens'
+    )
+    
+    fig.update_traces(
+        texttemplate='R$ %{text:,.2f}',
+        textposition='outside'
+    )
+    
+    fig.update_layout(
+        showlegend=False,
+        xaxis_title="Valor (R$)",
+        yaxis_title="",
+        height=400,
+        coloraxis_showscale=False
+    )
+    return fig
+
 
-# Carregar dados
 try:
-    pr, cr, par, pf = load_data()
+    pr, cr, par = carregar_datasets('pr', 'cr', 'par')
     
     # Header
     st.markdown('<h1 class="main-header">📊 Dashboard Financeiro Consolidado</h1>', unsafe_allow_html=True)
@@ -68,18 +177,25 @@ try:
     if filtros_ativos:
         st.info(f"🔍 Filtros ativos: {' | '.join(filtros_ativos)}")
     
-    # Calcular KPIs
-    total_receitas = cr_filtrado['Pago ou Recebido'].sum()
-    total_despesas = pr_filtrado['Pago ou Recebido'].sum()
-    despesas_pendentes = par_filtrado['Valor Líquido'].sum()
+    # Calcular KPIs (resultado do lote noturno quando existe; senão cubo mensal
+    # quando o período cobre meses inteiros)
+    filtros = montar_filtros(grupo_sel, empresa_sel, grupos_despesa_sel, categorias_sel, data_inicio, data_fim)
+    relatorio = ler_relatorio_precomputado(filtros, {'pr': pr, 'cr': cr, 'par': par})
+    totais_pr = agregar(pr, pr_filtrado, 'pr', filtros, relatorio=relatorio)
+    totais_cr = agregar(cr, cr_filtrado, 'cr', filtros, relatorio=relatorio)
+    totais_par = agregar(par, par_filtrado, 'par', filtros, relatorio=relatorio)
+    
+    total_receitas = totais_cr['valor']
+    total_despesas = totais_pr['valor']
+    despesas_pendentes = totais_par['valor']
     
     # Conciliação
-    pr_conciliados = (pr_filtrado['Conciliado'] == 'Sim').sum()
-    pr_total = len(pr_filtrado)
+    pr_conciliados = totais_pr['conciliados']
+    pr_total = totais_pr['quantidade']
     perc_conciliacao_pr = (pr_conciliados / pr_total * 100) if pr_total > 0 else 0
     
-    cr_conciliados = (cr_filtrado['Conciliado'] == 'Sim').sum()
-    cr_total = len(cr_filtrado)
+    cr_conciliados = totais_cr['conciliados']
+    cr_total = totais_cr['quantidade']
     perc_conciliacao_cr = (cr_conciliados / cr_total * 100) if cr_total > 0 else 0
     
     # KPIs principais - REMOVIDO Lucro Líquido e Ticket Médio
@@ -89,21 +205,21 @@ try:
         st.metric(
             label="💰 Total Receitas",
             value=format_currency_br(total_receitas),
-            delta=f"{len(cr_filtrado)} transações"
+            delta=f"{cr_total} transações"
         )
     
     with col2:
         st.metric(
             label="💸 Total Despesas",
             value=format_currency_br(total_despesas),
-            delta=f"{len(pr_filtrado)} transações"
+            delta=f"{pr_total} transações"
         )
     
     with col3:
         st.metric(
             label="⏳ Despesas Pendentes",
             value=format_currency_br(despesas_pendentes),
-            delta=f"{len(par_filtrado)} contas"
+            delta=f"{totais_par['quantidade']} contas"
         )
     
     st.markdown("---")
@@ -126,7 +242,7 @@ try:
         )
     
     with col6:
-        total_registros = len(pr_filtrado) + len(cr_filtrado) + len(par_filtrado)
+        total_registros = pr_total + cr_total + totais_par['quantidade']
         st.metric(
             label="📋 Total Registros",
             value=f"{total_registros:,}",
@@ -146,32 +262,9 @@ try:
             'Valor': [total_receitas, total_despesas, despesas_pendentes]
         })
         
-        fig_comparacao = px.bar(
-            dados_comparacao,
-            x='Categoria',
-            y='Valor',
-            color='Categoria',
-            text='Valor',
-            color_discrete_map={
-                'Receitas': '#10b981',
-                'Despesas': '#ef4444',
-                'Pendentes': '#f59e0b'
-            }
-        )
-        
-        fig_comparacao.update_traces(
-            texttemplate='R$ %{text:,.2f}',
-            textposition='outside'
-        )
-        
-        fig_comparacao.update_layout(
-            showlegend=False,
-            xaxis_title="",
-            yaxis_title="Valor (R$)",
-            height=400
-        )
+        fig_comparacao = grafico_comparacao(dados_comparacao)
         
-        st.plotly_chart(fig_comparacao, use_container_width=True)
+        exibir_grafico(fig_comparacao, 'comparacao', use_container_width=True)
     
     with col_grafico2:
         st.subheader("🎯 Distribuição Financeira")
@@ -181,27 +274,9 @@ try:
             'Valor': [total_receitas, total_despesas, despesas_pendentes]
         })
         
-        fig_pizza = px.pie(
-            dados_pizza,
-            values='Valor',
-            names='Tipo',
-            color='Tipo',
-            color_discrete_map={
-                'Receitas': '#10b981',
-                'Despesas Realizadas': '#ef4444',
-                'Despesas Pendentes': '#f59e0b'
-            }
-        )
-        
-        fig_pizza.update_traces(
-            textposition='inside',
-            textinfo='percent+label',
-            hovertemplate='<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Percentual: %{percent}<extra></extra>'
-        )
-        
-        fig_pizza.update_layout(height=400)
+        fig_pizza = grafico_pizza(dados_pizza)
         
-        st.plotly_chart(fig_pizza, use_container_width=True)
+        exibir_grafico(fig_pizza, 'pizza', use_container_width=True)
     
     st.markdown("---")
     
@@ -213,67 +288,27 @@ try:
     with col_cat1:
         st.markdown("**💸 Top 10 Categorias de Despesas**")
         if 'Categoria' in pr_filtrado.columns:
-            top_despesas = pr_filtrado.groupby('Categoria')['Pago ou Recebido'].sum().sort_values(ascending=False).head(10)
-            
-            fig_top_despesas = px.bar(
-                x=top_despesas.values,
-                y=top_despesas.index,
-                orientation='h',
-                text=top_despesas.values,
-                color=top_despesas.values,
-                color_continuous_scale='Reds'
-            )
+            top_despesas = agregar(pr, pr_filtrado, 'pr', filtros, 'Categoria', 'valor', limite=10, relatorio=relatorio)
             
-            fig_top_despesas.update_traces(
-                texttemplate='R$ %{text:,.2f}',
-                textposition='outside'
-            )
+            fig_top_despesas = grafico_top_despesas(top_despesas)
             
-            fig_top_despesas.update_layout(
-                showlegend=False,
-                xaxis_title="Valor (R$)",
-                yaxis_title="",
-                height=400,
-                coloraxis_showscale=False
-            )
-            
-            st.plotly_chart(fig_top_despesas, use_container_width=True)
+            exibir_grafico(fig_top_despesas, 'top_despesas', use_container_width=True)
     
     with col_cat2:
         st.markdown("**💰 Top 10 Categorias de Receitas**")
         if 'Categoria' in cr_filtrado.columns:
-            top_receitas = cr_filtrado.groupby('Categoria')['Pago ou Recebido'].sum().sort_values(ascending=False).head(10)
-            
-            fig_top_receitas = px.bar(
-                x=top_receitas.values,
-                y=top_receitas.index,
-                orientation='h',
-                text=top_receitas.values,
-                color=top_receitas.values,
-                color_continuous_scale='Greens'
-            )
+            top_receitas = agregar(cr, cr_filtrado, 'cr', filtros, 'Categoria', 'valor', limite=10, relatorio=relatorio)
             
-            fig_top_receitas.update_traces(
-                texttemplate='R$ %{text:,.2f}',
-                textposition='outside'
-            )
+            fig_top_receitas = grafico_top_receitas(top_receitas)
             
-            fig_top_receitas.update_layout(
-                showlegend=False,
-                xaxis_title="Valor (R$)",
-                yaxis_title="",
-                height=400,
-                coloraxis_showscale=False
-            )
-            
-            st.plotly_chart(fig_top_receitas, use_container_width=True)
+            exibir_grafico(fig_top_receitas, 'top_receitas', use_container_width=True)
     
     st.markdown("---")
     
     # Tabela de Valores por Situação de Vencimento
     st.subheader("📅 Valores por Situação de Vencimento")
     
-    tabela_vencimentos = criar_tabela_vencimentos(par_filtrado, 'Vencimento', 'Valor Líquido')
+    tabela_vencimentos = criar_tabela_vencimentos(par_filtrado, 'Vencimento', 'Valor Líquido', relatorio=relatorio)
     
     if not tabela_vencimentos.empty:
         st.dataframe(
@@ -287,3 +322,5 @@ try:
 except Exception as e:
     st.error(f"❌ Erro ao carregar dados: {str(e)}")
     st.exception(e)
+
+finalizar_execucao()
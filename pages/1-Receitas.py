@@ -7,26 +7,149 @@ import os
 
 # Adicionar pasta utils ao path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils.helpers import format_currency_br, apply_filters_sidebar
+from utils.helpers import format_currency_br, format_currency_br_array, apply_filters_sidebar, rotulo_mes, pontos_do_grafico
+from utils.data_loader import carregar_datasets
+from utils.desempenho import iniciar_execucao, finalizar_execucao, exibir_grafico
+from utils.aquecimento import acompanhar_aquecimento
+from utils.figuras import figura_em_cache
+from utils.filtros import montar_filtros
+from utils.cubo import agregar
+from utils.motor import ler_relatorio_precomputado
+from utils.series import GRANULARIDADES, serie_temporal
 
 st.set_page_config(page_title="Dashboard de Receitas", page_icon="💰", layout="wide")
 
+# Medição de desempenho (ativada com ?desempenho=1 na URL)
+iniciar_execucao('Receitas')
+# Aquecimento dos caches em segundo plano (aviso na sidebar enquanto não termina)
+acompanhar_aquecimento()
+
 st.title("💰 Dashboard de Receitas")
 st.markdown("**Análise detalhada de receitas recebidas e a receber**")
 st.markdown("---")
 
-@st.cache_data
-def load_data():
-    pr = pd.read_excel('data/PagamentosRealizadosRelatorio.xlsx')
-    cr = pd.read_excel('data/ContasRecebidaseaReceber.xlsx')
-    par = pd.read_excel('data/PagamentosaRealizarRelatorio.xlsx')
-    return pr, cr, par
+# Gráficos (cada figura é reaproveitada enquanto os dados agregados não mudam)
+
+@figura_em_cache
+def grafico_evolucao(evolucao):
+    # Primeira coluna: Mes_Ano (mensal) ou Data (semanal/diária)
+    coluna_x = evolucao.columns[0]
+    fig = px.line(
+        evolucao,
+        x=coluna_x,
+        y='Pago ou Recebido',
+        markers=coluna_x == 'Mes_Ano',
+        labels={'Mes_Ano': 'Mês/Ano', 'Data': 'Data', 'Pago ou Recebido': 'Valor (R$)'}
+    )
+    
+    fig.update_layout(height=400)
+    fig.update_traces(
+        line_color='#10b981',
+        hovertemplate='<b>%{x}</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_cat(cat_receitas):
+    fig = px.bar(
+        x=cat_receitas.values,
+        y=cat_receitas.index,
+        orientation='h',
+        labels={'x': 'Valor (R$)', 'y': 'Categoria'},
+        color=cat_receitas.values,
+        color_continuous_scale='Greens'
+    )
+    
+    fig.update_layout(height=400, showlegend=False)
+    fig.update_traces(
+        hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_top(top_clientes):
+    fig = px.bar(
+        x=top_clientes['Pago ou Recebido'],
+        y=top_clientes.index,
+        orientation='h',
+        labels={'x': 'Receita Total (R$)', 'y': 'Cliente'},
+        color=top_clientes['Pago ou Recebido'],
+        color_continuous_scale='Blues'
+    )
+    
+    fig.update_layout(height=400, showlegend=False)
+    fig.update_traces(
+        hovertemplate='<b>%{y}</b><br>Receita: R$ %{x:,.2f}<extra></extra>'
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_conc(conciliadas, nao_conciliadas):
+    fig = go.Figure(data=[go.Pie(
+        labels=['Conciliadas', 'Não Conciliadas'],
+        values=[conciliadas, nao_conciliadas],
+        hole=0.4,
+        marker_colors=['#10b981', '#ef4444'],
+        textinfo='label+percent',
+        hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
+    )])
+    
+    fig.update_layout(height=350)
+    return fig
+
+
+@figura_em_cache
+def grafico_val_conc(valor_conciliadas, valor_nao_conciliadas):
+    fig = go.Figure(data=[
+        go.Bar(
+            name='Conciliadas',
+            x=['Receitas'],
+            y=[valor_conciliadas],
+            marker_color='#10b981',
+            text=[format_currency_br(valor_conciliadas)],
+            textposition='auto'
+        ),
+        go.Bar(
+            name='Não Conciliadas',
+            x=['Receitas'],
+            y=[valor_nao_conciliadas],
+            marker_color='#ef4444',
+            text=[format_currency_br(valor_nao_conciliadas)],
+            textposition='auto'
+        )
+    ])
+    
+    fig.update_layout(barmode='group', height=350, showlegend=True)
+    fig.update_yaxes(title_text='Valor (R$)')
+    return fig
+
+
+@figura_em_cache
+def grafico_empresa(receitas_empresa):
+    fig = px.bar(
+        x=receitas_empresa.values,
+        y=receitas_empresa.index,
+        orientation='h',
+        labels={'x': 'Receita Total (R$)', 'y': 'Empresa'},
+        color=receitas_empresa.values,
+        color_continuous_scale='Viridis'
+    )
+    
+    fig.update_layout(height=400, showlegend=False)
+    fig.update_traces(
+        hovertemplate='<b>%{y}</b><br>Receita: R$ %{x:,.2f}<extra></extra>'
+    )
+    return fig
+
 
 try:
-    pr, cr, par = load_data()
+    cr, = carregar_datasets('cr')
     
     # Aplicar filtros globais
-    pr_filtrado, cr_filtrado, par_filtrado, grupo_sel, empresa_sel, data_inicio, data_fim, grupos_despesa_sel, categorias_sel = apply_filters_sidebar(pr, cr, par)
+    _, cr_filtrado, _, grupo_sel, empresa_sel, data_inicio, data_fim, grupos_despesa_sel, categorias_sel = apply_filters_sidebar(cr=cr)
     
     # Mostrar filtros ativos
     if grupo_sel != 'Todos' or empresa_sel != 'Todas':
@@ -37,9 +160,14 @@ try:
             filtros_ativos.append(f"**Empresa:** {empresa_sel}")
         st.info(f"🔍 Filtros ativos: {' | '.join(filtros_ativos)}")
     
-    # Calcular métricas
-    total_receitas = cr_filtrado['Pago ou Recebido'].sum()
-    num_transacoes = len(cr_filtrado)
+    # Calcular métricas (resultado do lote noturno quando existe; senão cubo mensal
+    # quando o período cobre meses inteiros)
+    filtros = montar_filtros(grupo_sel, empresa_sel, grupos_despesa_sel, categorias_sel, data_inicio, data_fim)
+    relatorio = ler_relatorio_precomputado(filtros, {'cr': cr})
+    totais_cr = agregar(cr, cr_filtrado, 'cr', filtros, relatorio=relatorio)
+    
+    total_receitas = totais_cr['valor']
+    num_transacoes = totais_cr['quantidade']
     ticket_medio = total_receitas / num_transacoes if num_transacoes > 0 else 0
     
     # KPIs
@@ -60,7 +188,7 @@ try:
         )
     
     with col3:
-        receitas_conciliadas = (cr_filtrado['Conciliado'] == 'Sim').sum()
+        receitas_conciliadas = totais_cr['conciliados']
         perc_conciliacao = (receitas_conciliadas / num_transacoes * 100) if num_transacoes > 0 else 0
         st.metric(
             "✅ Taxa de Conciliação",
@@ -70,7 +198,7 @@ try:
     
     with col4:
         if 'Categoria' in cr_filtrado.columns:
-            num_categorias = cr_filtrado['Categoria'].nunique()
+            num_categorias = len(agregar(cr, cr_filtrado, 'cr', filtros, 'Categoria', 'quantidade'))
             st.metric(
                 "📂 Categorias",
                 f"{num_categorias}",
@@ -87,85 +215,58 @@ try:
     with col_left:
         st.subheader("📈 Evolução Temporal das Receitas")
         
-        if 'Data de Crédito ou Débito (No Extrato)' in cr_filtrado.columns:
-            cr_temp = cr_filtrado.copy()
-            cr_temp['Data de Crédito ou Débito (No Extrato)'] = pd.to_datetime(cr_temp['Data de Crédito ou Débito (No Extrato)'], errors='coerce')
-            cr_temp['Mes_Ano'] = cr_temp['Data de Crédito ou Débito (No Extrato)'].dt.to_period('M').astype(str)
+        if 'Mes_Ano' in cr_filtrado.columns:
+            granularidade = st.radio(
+                "Granularidade", list(GRANULARIDADES), horizontal=True, key='granularidade_receitas'
+            )
             
-            evolucao = cr_temp.groupby('Mes_Ano')['Pago ou Recebido'].sum().reset_index()
-            evolucao = evolucao.sort_values('Mes_Ano')
+            if granularidade == 'Mensal':
+                # Mes_Ano é a chave yyyymm calculada na carga a partir da data de crédito
+                evolucao = agregar(cr, cr_filtrado, 'cr', filtros, 'Mes_Ano', 'valor', relatorio=relatorio).reset_index()
+                evolucao = evolucao[evolucao['Mes_Ano'] > 0].sort_values('Mes_Ano')
+                evolucao['Mes_Ano'] = rotulo_mes(evolucao['Mes_Ano'])
+            else:
+                # Somas exatas por semana/dia; séries longas são reduzidas só no gráfico
+                serie = serie_temporal(cr_filtrado, 'cr', GRANULARIDADES[granularidade])
+                evolucao = serie.rename_axis('Data').rename('Pago ou Recebido').reset_index()
+                evolucao = pontos_do_grafico(evolucao, 'Data', 'Pago ou Recebido', 'janela_receitas')
             
-            fig_evolucao = px.line(
-                evolucao,
-                x='Mes_Ano',
-                y='Pago ou Recebido',
-                markers=True,
-                labels={'Mes_Ano': 'Mês/Ano', 'Pago ou Recebido': 'Valor (R$)'}
-            )
+            fig_evolucao = grafico_evolucao(evolucao)
             
-            fig_evolucao.update_layout(height=400)
-            fig_evolucao.update_traces(
-                line_color='#10b981',
-                hovertemplate='<b>%{x}</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
-            )
-            st.plotly_chart(fig_evolucao, use_container_width=True)
+            exibir_grafico(fig_evolucao, 'evolucao', use_container_width=True)
     
     with col_right:
         st.subheader("📊 Receitas por Categoria")
         
         if 'Categoria' in cr_filtrado.columns:
-            cat_receitas = cr_filtrado.groupby('Categoria')['Pago ou Recebido'].sum().sort_values(ascending=False).head(10)
+            cat_receitas = agregar(cr, cr_filtrado, 'cr', filtros, 'Categoria', 'valor', limite=10, relatorio=relatorio)
             
-            fig_cat = px.bar(
-                x=cat_receitas.values,
-                y=cat_receitas.index,
-                orientation='h',
-                labels={'x': 'Valor (R$)', 'y': 'Categoria'},
-                color=cat_receitas.values,
-                color_continuous_scale='Greens'
-            )
+            fig_cat = grafico_cat(cat_receitas)
             
-            fig_cat.update_layout(height=400, showlegend=False)
-            fig_cat.update_traces(
-                hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
-            )
-            st.plotly_chart(fig_cat, use_container_width=True)
+            exibir_grafico(fig_cat, 'cat', use_container_width=True)
     
     # Top 10 Clientes
     st.markdown("---")
     st.subheader("🏆 Top 10 Clientes por Receita")
     
     if 'Cliente' in cr_filtrado.columns:
-        top_clientes = cr_filtrado.groupby('Cliente').agg({
-            'Pago ou Recebido': 'sum',
-            'Cliente': 'count'
-        }).rename(columns={'Cliente': 'Num_Transacoes'})
-        top_clientes = top_clientes.sort_values('Pago ou Recebido', ascending=False).head(10)
+        top_clientes = agregar(cr, cr_filtrado, 'cr', filtros, 'Cliente', ['valor', 'quantidade'], limite=10).rename(
+            columns={'valor': 'Pago ou Recebido', 'quantidade': 'Num_Transacoes'}
+        )
         
         col_top1, col_top2 = st.columns([2, 1])
         
         with col_top1:
-            fig_top = px.bar(
-                x=top_clientes['Pago ou Recebido'],
-                y=top_clientes.index,
-                orientation='h',
-                labels={'x': 'Receita Total (R$)', 'y': 'Cliente'},
-                color=top_clientes['Pago ou Recebido'],
-                color_continuous_scale='Blues'
-            )
+            fig_top = grafico_top(top_clientes)
             
-            fig_top.update_layout(height=400, showlegend=False)
-            fig_top.update_traces(
-                hovertemplate='<b>%{y}</b><br>Receita: R$ %{x:,.2f}<extra></extra>'
-            )
-            st.plotly_chart(fig_top, use_container_width=True)
+            exibir_grafico(fig_top, 'top', use_container_width=True)
         
         with col_top2:
             st.markdown("**Detalhamento**")
             
             tabela_top = pd.DataFrame({
                 'Cliente': top_clientes.index,
-                'Receita Total': top_clientes['Pago ou Recebido'].apply(format_currency_br),
+                'Receita Total': format_currency_br_array(top_clientes['Pago ou Recebido']),
                 'Transações': top_clientes['Num_Transacoes']
             })
             
@@ -183,73 +284,36 @@ try:
     with col_conc1:
         st.subheader("✅ Status de Conciliação")
         
-        conciliadas = (cr_filtrado['Conciliado'] == 'Sim').sum()
-        nao_conciliadas = (cr_filtrado['Conciliado'] != 'Sim').sum()
+        conciliadas = totais_cr['conciliados']
+        nao_conciliadas = totais_cr['nao_conciliados']
         
-        fig_conc = go.Figure(data=[go.Pie(
-            labels=['Conciliadas', 'Não Conciliadas'],
-            values=[conciliadas, nao_conciliadas],
-            hole=0.4,
-            marker_colors=['#10b981', '#ef4444'],
-            textinfo='label+percent',
-            hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
-        )])
+        fig_conc = grafico_conc(conciliadas, nao_conciliadas)
         
-        fig_conc.update_layout(height=350)
-        st.plotly_chart(fig_conc, use_container_width=True)
+        exibir_grafico(fig_conc, 'conc', use_container_width=True)
     
     with col_conc2:
         st.subheader("📊 Valores por Status")
         
-        valor_conciliadas = cr_filtrado[cr_filtrado['Conciliado'] == 'Sim']['Pago ou Recebido'].sum()
-        valor_nao_conciliadas = cr_filtrado[cr_filtrado['Conciliado'] != 'Sim']['Pago ou Recebido'].sum()
+        valor_conciliadas = totais_cr['valor_conciliado']
+        valor_nao_conciliadas = totais_cr['valor_nao_conciliado']
         
-        fig_val_conc = go.Figure(data=[
-            go.Bar(
-                name='Conciliadas',
-                x=['Receitas'],
-                y=[valor_conciliadas],
-                marker_color='#10b981',
-                text=[format_currency_br(valor_conciliadas)],
-                textposition='auto'
-            ),
-            go.Bar(
-                name='Não Conciliadas',
-                x=['Receitas'],
-                y=[valor_nao_conciliadas],
-                marker_color='#ef4444',
-                text=[format_currency_br(valor_nao_conciliadas)],
-                textposition='auto'
-            )
-        ])
+        fig_val_conc = grafico_val_conc(valor_conciliadas, valor_nao_conciliadas)
         
-        fig_val_conc.update_layout(barmode='group', height=350, showlegend=True)
-        fig_val_conc.update_yaxes(title_text='Valor (R$)')
-        st.plotly_chart(fig_val_conc, use_container_width=True)
+        exibir_grafico(fig_val_conc, 'val_conc', use_container_width=True)
     
     # Análise por Empresa
     st.markdown("---")
     st.subheader("🏢 Receitas por Empresa")
     
     if 'Minha Empresa (Razão Social)' in cr_filtrado.columns:
-        receitas_empresa = cr_filtrado.groupby('Minha Empresa (Razão Social)')['Pago ou Recebido'].sum().sort_values(ascending=False)
+        receitas_empresa = agregar(cr, cr_filtrado, 'cr', filtros, 'Minha Empresa (Razão Social)', 'valor').sort_values(ascending=False)
         
-        fig_empresa = px.bar(
-            x=receitas_empresa.values,
-            y=receitas_empresa.index,
-            orientation='h',
-            labels={'x': 'Receita Total (R$)', 'y': 'Empresa'},
-            color=receitas_empresa.values,
-            color_continuous_scale='Viridis'
-        )
+        fig_empresa = grafico_empresa(receitas_empresa)
         
-        fig_empresa.update_layout(height=400, showlegend=False)
-        fig_empresa.update_traces(
-            hovertemplate='<b>%{y}</b><br>Receita: R$ %{x:,.2f}<extra></extra>'
-        )
-        st.plotly_chart(fig_empresa, use_container_width=True)
+        exibir_grafico(fig_empresa, 'empresa', use_container_width=True)
     
 except Exception as e:
     st.error(f"Erro ao carregar dados: {str(e)}")
     st.exception(e)
 
+finalizar_execucao()
@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import sys
@@ -7,26 +6,167 @@ import os
 
 # Adicionar pasta utils ao path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils.helpers import format_currency_br, apply_filters_sidebar, criar_tabela_vencimentos
+from utils.helpers import format_currency_br, apply_filters_sidebar, criar_tabela_vencimentos, rotulo_mes, pontos_do_grafico
+from utils.data_loader import carregar_datasets
+from utils.desempenho import iniciar_execucao, finalizar_execucao, exibir_grafico
+from utils.aquecimento import acompanhar_aquecimento
+from utils.figuras import figura_em_cache
+from utils.filtros import montar_filtros
+from utils.cubo import agregar
+from utils.motor import ler_relatorio_precomputado
+from utils.series import GRANULARIDADES, serie_temporal
 
 st.set_page_config(page_title="Dashboard de Despesas", page_icon="💸", layout="wide")
 
+# Medição de desempenho (ativada com ?desempenho=1 na URL)
+iniciar_execucao('Despesas')
+# Aquecimento dos caches em segundo plano (aviso na sidebar enquanto não termina)
+acompanhar_aquecimento()
+
 st.title("💸 Dashboard de Despesas")
 st.markdown("**Análise detalhada de despesas realizadas e pendentes**")
 st.markdown("---")
 
-@st.cache_data
-def load_data():
-    pr = pd.read_excel('data/PagamentosRealizadosRelatorio.xlsx')
-    cr = pd.read_excel('data/ContasRecebidaseaReceber.xlsx')
-    par = pd.read_excel('data/PagamentosaRealizarRelatorio.xlsx')
-    return pr, cr, par
+# Gráficos (cada figura é reaproveitada enquanto os dados agregados não mudam)
+
+@figura_em_cache
+def grafico_status(total_desp_pendentes, total_desp_realizadas):
+    fig = go.Figure(data=[
+        go.Bar(
+            name='Realizadas',
+            x=['Despesas'],
+            y=[total_desp_realizadas],
+            marker_color='#10b981',
+            text=[format_currency_br(total_desp_realizadas)],
+            textposition='auto'
+        ),
+        go.Bar(
+            name='Pendentes',
+            x=['Despesas'],
+            y=[total_desp_pendentes],
+            marker_color='#f59e0b',
+            text=[format_currency_br(total_desp_pendentes)],
+            textposition='auto'
+        )
+    ])
+    
+    fig.update_layout(barmode='group', height=400, showlegend=True)
+    fig.update_yaxes(title_text='Valor (R$)')
+    return fig
+
+
+@figura_em_cache
+def grafico_dist(total_desp_pendentes, total_desp_realizadas):
+    fig = go.Figure(data=[go.Pie(
+        labels=['Realizadas', 'Pendentes'],
+        values=[total_desp_realizadas, total_desp_pendentes],
+        hole=0.4,
+        marker_colors=['#10b981', '#f59e0b'],
+        textinfo='label+percent',
+        hovertemplate='<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Percentual: %{percent}<extra></extra>'
+    )])
+    
+    fig.update_layout(height=400)
+    return fig
+
+
+@figura_em_cache
+def grafico_cat_real(cat_realizadas):
+    fig = px.bar(
+        x=cat_realizadas.values,
+        y=cat_realizadas.index,
+        orientation='h',
+        labels={'x': 'Valor (R$)', 'y': 'Categoria'},
+        color=cat_realizadas.values,
+        color_continuous_scale='Greens'
+    )
+    
+    fig.update_layout(height=400, showlegend=False)
+    fig.update_traces(
+        hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_cat_pend(cat_pendentes):
+    fig = px.bar(
+        x=cat_pendentes.values,
+        y=cat_pendentes.index,
+        orientation='h',
+        labels={'x': 'Valor (R$)', 'y': 'Categoria'},
+        color=cat_pendentes.values,
+        color_continuous_scale='Oranges'
+    )
+    
+    fig.update_layout(height=400, showlegend=False)
+    fig.update_traces(
+        hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_forn_real(top_forn_real):
+    fig = px.bar(
+        x=top_forn_real.values,
+        y=top_forn_real.index,
+        orientation='h',
+        labels={'x': 'Valor Total (R$)', 'y': 'Fornecedor'},
+        color=top_forn_real.values,
+        color_continuous_scale='Blues'
+    )
+    
+    fig.update_layout(height=400, showlegend=False)
+    fig.update_traces(
+        hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_forn_pend(top_forn_pend):
+    fig = px.bar(
+        x=top_forn_pend.values,
+        y=top_forn_pend.index,
+        orientation='h',
+        labels={'x': 'Valor Total (R$)', 'y': 'Fornecedor'},
+        color=top_forn_pend.values,
+        color_continuous_scale='Reds'
+    )
+    
+    fig.update_layout(height=400, showlegend=False)
+    fig.update_traces(
+        hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_evolucao(evolucao):
+    # Primeira coluna: Mes_Ano (mensal) ou Data (semanal/diária)
+    coluna_x = evolucao.columns[0]
+    fig = px.line(
+        evolucao,
+        x=coluna_x,
+        y='Pago ou Recebido',
+        markers=coluna_x == 'Mes_Ano',
+        labels={'Mes_Ano': 'Mês/Ano', 'Data': 'Data', 'Pago ou Recebido': 'Valor (R$)'}
+    )
+    
+    fig.update_layout(height=400)
+    fig.update_traces(
+        line_color='#ef4444',
+        hovertemplate='<b>%{x}</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
+    )
+    return fig
+
 
 try:
-    pr, cr, par = load_data()
+    pr, par = carregar_datasets('pr', 'par')
     
     # Aplicar filtros globais
-    pr_filtrado, cr_filtrado, par_filtrado, grupo_sel, empresa_sel, data_inicio, data_fim, grupos_despesa_sel, categorias_sel = apply_filters_sidebar(pr, cr, par)
+    pr_filtrado, _, par_filtrado, grupo_sel, empresa_sel, data_inicio, data_fim, grupos_despesa_sel, categorias_sel = apply_filters_sidebar(pr=pr, par=par)
     
     # Mostrar filtros ativos
     if grupo_sel != 'Todos' or empresa_sel != 'Todas':
@@ -37,9 +177,15 @@ try:
             filtros_ativos.append(f"**Empresa:** {empresa_sel}")
         st.info(f"🔍 Filtros ativos: {' | '.join(filtros_ativos)}")
     
-    # Calcular métricas
-    total_desp_realizadas = pr_filtrado['Pago ou Recebido'].sum()
-    total_desp_pendentes = par_filtrado['Valor Líquido'].sum()
+    # Calcular métricas (resultado do lote noturno quando existe; senão cubo mensal
+    # quando o período cobre meses inteiros)
+    filtros = montar_filtros(grupo_sel, empresa_sel, grupos_despesa_sel, categorias_sel, data_inicio, data_fim)
+    relatorio = ler_relatorio_precomputado(filtros, {'pr': pr, 'par': par})
+    totais_pr = agregar(pr, pr_filtrado, 'pr', filtros, relatorio=relatorio)
+    totais_par = agregar(par, par_filtrado, 'par', filtros, relatorio=relatorio)
+    
+    total_desp_realizadas = totais_pr['valor']
+    total_desp_pendentes = totais_par['valor']
     total_geral = total_desp_realizadas + total_desp_pendentes
     
     # KPIs
@@ -49,21 +195,21 @@ try:
         st.metric(
             "💸 Despesas Realizadas",
             format_currency_br(total_desp_realizadas),
-            f"{len(pr_filtrado)} pagamentos"
+            f"{totais_pr['quantidade']} pagamentos"
         )
     
     with col2:
         st.metric(
             "⏳ Despesas Pendentes",
             format_currency_br(total_desp_pendentes),
-            f"{len(par_filtrado)} contas"
+            f"{totais_par['quantidade']} contas"
         )
     
     with col3:
         st.metric(
             "💰 Total Geral",
             format_currency_br(total_geral),
-            f"{len(pr_filtrado) + len(par_filtrado)} registros"
+            f"{totais_pr['quantidade'] + totais_par['quantidade']} registros"
         )
     
     with col4:
@@ -80,7 +226,7 @@ try:
     st.subheader("📅 Valores por Situação de Vencimento")
     st.markdown("*Ordenado por proximidade temporal do vencimento*")
     
-    tabela_vencimentos = criar_tabela_vencimentos(par_filtrado, 'Vencimento', 'Valor Líquido')
+    tabela_vencimentos = criar_tabela_vencimentos(par_filtrado, 'Vencimento', 'Valor Líquido', relatorio=relatorio)
     
     if not tabela_vencimentos.empty:
         st.dataframe(
@@ -99,43 +245,16 @@ try:
     with col_left:
         st.subheader("📊 Despesas: Realizadas vs Pendentes")
         
-        fig_status = go.Figure(data=[
-            go.Bar(
-                name='Realizadas',
-                x=['Despesas'],
-                y=[total_desp_realizadas],
-                marker_color='#10b981',
-                text=[format_currency_br(total_desp_realizadas)],
-                textposition='auto'
-            ),
-            go.Bar(
-                name='Pendentes',
-                x=['Despesas'],
-                y=[total_desp_pendentes],
-                marker_color='#f59e0b',
-                text=[format_currency_br(total_desp_pendentes)],
-                textposition='auto'
-            )
-        ])
+        fig_status = grafico_status(total_desp_pendentes, total_desp_realizadas)
         
-        fig_status.update_layout(barmode='group', height=400, showlegend=True)
-        fig_status.update_yaxes(title_text='Valor (R$)')
-        st.plotly_chart(fig_status, use_container_width=True)
+        exibir_grafico(fig_status, 'status', use_container_width=True)
     
     with col_right:
         st.subheader("🥧 Distribuição de Despesas")
         
-        fig_dist = go.Figure(data=[go.Pie(
-            labels=['Realizadas', 'Pendentes'],
-            values=[total_desp_realizadas, total_desp_pendentes],
-            hole=0.4,
-            marker_colors=['#10b981', '#f59e0b'],
-            textinfo='label+percent',
-            hovertemplate='<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Percentual: %{percent}<extra></extra>'
-        )])
+        fig_dist = grafico_dist(total_desp_pendentes, total_desp_realizadas)
         
-        fig_dist.update_layout(height=400)
-        st.plotly_chart(fig_dist, use_container_width=True)
+        exibir_grafico(fig_dist, 'dist', use_container_width=True)
     
     # Análise por categoria
     st.markdown("---")
@@ -147,43 +266,21 @@ try:
         st.markdown("**Despesas Realizadas**")
         
         if 'Categoria' in pr_filtrado.columns:
-            cat_realizadas = pr_filtrado.groupby('Categoria')['Pago ou Recebido'].sum().sort_values(ascending=False).head(10)
+            cat_realizadas = agregar(pr, pr_filtrado, 'pr', filtros, 'Categoria', 'valor', limite=10, relatorio=relatorio)
             
-            fig_cat_real = px.bar(
-                x=cat_realizadas.values,
-                y=cat_realizadas.index,
-                orientation='h',
-                labels={'x': 'Valor (R$)', 'y': 'Categoria'},
-                color=cat_realizadas.values,
-                color_continuous_scale='Greens'
-            )
+            fig_cat_real = grafico_cat_real(cat_realizadas)
             
-            fig_cat_real.update_layout(height=400, showlegend=False)
-            fig_cat_real.update_traces(
-                hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
-            )
-            st.plotly_chart(fig_cat_real, use_container_width=True)
+            exibir_grafico(fig_cat_real, 'cat_real', use_container_width=True)
     
     with col_cat2:
         st.markdown("**Despesas Pendentes**")
         
         if 'Categoria' in par_filtrado.columns:
-            cat_pendentes = par_filtrado.groupby('Categoria')['Valor Líquido'].sum().sort_values(ascending=False).head(10)
+            cat_pendentes = agregar(par, par_filtrado, 'par', filtros, 'Categoria', 'valor', limite=10, relatorio=relatorio)
             
-            fig_cat_pend = px.bar(
-                x=cat_pendentes.values,
-                y=cat_pendentes.index,
-                orientation='h',
-                labels={'x': 'Valor (R$)', 'y': 'Categoria'},
-                color=cat_pendentes.values,
-                color_continuous_scale='Oranges'
-            )
+            fig_cat_pend = grafico_cat_pend(cat_pendentes)
             
-            fig_cat_pend.update_layout(height=400, showlegend=False)
-            fig_cat_pend.update_traces(
-                hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
-            )
-            st.plotly_chart(fig_cat_pend, use_container_width=True)
+            exibir_grafico(fig_cat_pend, 'cat_pend', use_container_width=True)
     
     # Top 10 Fornecedores
     st.markdown("---")
@@ -195,72 +292,48 @@ try:
         st.markdown("**Por Despesas Realizadas**")
         
         if 'Fornecedor' in pr_filtrado.columns:
-            top_forn_real = pr_filtrado.groupby('Fornecedor')['Pago ou Recebido'].sum().sort_values(ascending=False).head(10)
+            top_forn_real = agregar(pr, pr_filtrado, 'pr', filtros, 'Fornecedor', 'valor', limite=10, relatorio=relatorio)
             
-            fig_forn_real = px.bar(
-                x=top_forn_real.values,
-                y=top_forn_real.index,
-                orientation='h',
-                labels={'x': 'Valor Total (R$)', 'y': 'Fornecedor'},
-                color=top_forn_real.values,
-                color_continuous_scale='Blues'
-            )
+            fig_forn_real = grafico_forn_real(top_forn_real)
             
-            fig_forn_real.update_layout(height=400, showlegend=False)
-            fig_forn_real.update_traces(
-                hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
-            )
-            st.plotly_chart(fig_forn_real, use_container_width=True)
+            exibir_grafico(fig_forn_real, 'forn_real', use_container_width=True)
     
     with col_forn2:
         st.markdown("**Por Despesas Pendentes**")
         
         if 'Razão Social' in par_filtrado.columns:
-            top_forn_pend = par_filtrado.groupby('Razão Social')['Valor Líquido'].sum().sort_values(ascending=False).head(10)
+            top_forn_pend = agregar(par, par_filtrado, 'par', filtros, 'Razão Social', 'valor', limite=10, relatorio=relatorio)
             
-            fig_forn_pend = px.bar(
-                x=top_forn_pend.values,
-                y=top_forn_pend.index,
-                orientation='h',
-                labels={'x': 'Valor Total (R$)', 'y': 'Fornecedor'},
-                color=top_forn_pend.values,
-                color_continuous_scale='Reds'
-            )
+            fig_forn_pend = grafico_forn_pend(top_forn_pend)
             
-            fig_forn_pend.update_layout(height=400, showlegend=False)
-            fig_forn_pend.update_traces(
-                hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
-            )
-            st.plotly_chart(fig_forn_pend, use_container_width=True)
+            exibir_grafico(fig_forn_pend, 'forn_pend', use_container_width=True)
     
     # Evolução temporal
     st.markdown("---")
     st.subheader("📈 Evolução Temporal das Despesas Realizadas")
     
-    if 'Data de Registro (completa)' in pr_filtrado.columns:
-        pr_temp = pr_filtrado.copy()
-        pr_temp['Data de Registro (completa)'] = pd.to_datetime(pr_temp['Data de Registro (completa)'], errors='coerce')
-        pr_temp['Mes_Ano'] = pr_temp['Data de Registro (completa)'].dt.to_period('M').astype(str)
+    if 'Mes_Ano' in pr_filtrado.columns:
+        granularidade = st.radio(
+            "Granularidade", list(GRANULARIDADES), horizontal=True, key='granularidade_despesas'
+        )
         
-        evolucao = pr_temp.groupby('Mes_Ano')['Pago ou Recebido'].sum().reset_index()
-        evolucao = evolucao.sort_values('Mes_Ano')
+        if granularidade == 'Mensal':
+            # Mes_Ano é a chave yyyymm calculada na carga a partir da data de registro
+            evolucao = agregar(pr, pr_filtrado, 'pr', filtros, 'Mes_Ano', 'valor', relatorio=relatorio).reset_index()
+            evolucao = evolucao[evolucao['Mes_Ano'] > 0].sort_values('Mes_Ano')
+            evolucao['Mes_Ano'] = rotulo_mes(evolucao['Mes_Ano'])
+        else:
+            # Somas exatas por semana/dia; séries longas são reduzidas só no gráfico
+            serie = serie_temporal(pr_filtrado, 'pr', GRANULARIDADES[granularidade])
+            evolucao = serie.rename_axis('Data').rename('Pago ou Recebido').reset_index()
+            evolucao = pontos_do_grafico(evolucao, 'Data', 'Pago ou Recebido', 'janela_despesas')
         
-        fig_evolucao = px.line(
-            evolucao,
-            x='Mes_Ano',
-            y='Pago ou Recebido',
-            markers=True,
-            labels={'Mes_Ano': 'Mês/Ano', 'Pago ou Recebido': 'Valor (R$)'}
-        )
+        fig_evolucao = grafico_evolucao(evolucao)
         
-        fig_evolucao.update_layout(height=400)
-        fig_evolucao.update_traces(
-            line_color='#ef4444',
-            hovertemplate='<b>%{x}</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
-        )
-        st.plotly_chart(fig_evolucao, use_container_width=True)
+        exibir_grafico(fig_evolucao, 'evolucao', use_container_width=True)
     
 except Exception as e:
     st.error(f"Erro ao carregar dados: {str(e)}")
     st.exception(e)
 
+finalizar_execucao()
@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import sys
@@ -7,25 +6,104 @@ import os
 
 # Adicionar pasta utils ao path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils.helpers import format_currency_br, apply_filters_sidebar
+from utils.helpers import format_currency_br, apply_filters_sidebar, format_dataframe_currency
+from utils.data_loader import carregar_datasets
+from utils.desempenho import iniciar_execucao, finalizar_execucao, exibir_grafico, secao
+from utils.aquecimento import acompanhar_aquecimento
+from utils.figuras import figura_em_cache
+from utils.filtros import linhas_filtradas, montar_filtros
+from utils.cubo import agregar
+from utils.motor import ler_relatorio_precomputado, taxas_precomputadas
+from utils.metricas import taxas_por_grupo
 
 st.set_page_config(page_title="Dashboard de Conciliação", page_icon="✅", layout="wide")
 
+# Medição de desempenho (ativada com ?desempenho=1 na URL)
+iniciar_execucao('Conciliação')
+# Aquecimento dos caches em segundo plano (aviso na sidebar enquanto não termina)
+acompanhar_aquecimento()
+
 st.title("✅ Dashboard de Conciliação")
 st.markdown("---")
 
-@st.cache_data
-def load_data():
-    pr = pd.read_excel('data/PagamentosRealizadosRelatorio.xlsx')
-    cr = pd.read_excel('data/ContasRecebidaseaReceber.xlsx')
-    par = pd.read_excel('data/PagamentosaRealizarRelatorio.xlsx')
-    return pr, cr, par
+# Gráficos (cada figura é reaproveitada enquanto os dados agregados não mudam)
+
+@figura_em_cache
+def grafico_desp(pr_conciliados, pr_nao_conciliados):
+    fig = go.Figure(data=[go.Pie(
+        labels=['Conciliadas', 'Não Conciliadas'],
+        values=[pr_conciliados, pr_nao_conciliados],
+        hole=0.4,
+        marker_colors=['#10b981', '#ef4444'],
+        textinfo='label+percent',
+        hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
+    )])
+    
+    fig.update_layout(height=350)
+    return fig
+
+
+@figura_em_cache
+def grafico_rec(cr_conciliados, cr_nao_conciliados):
+    fig = go.Figure(data=[go.Pie(
+        labels=['Conciliadas', 'Não Conciliadas'],
+        values=[cr_conciliados, cr_nao_conciliados],
+        hole=0.4,
+        marker_colors=['#10b981', '#ef4444'],
+        textinfo='label+percent',
+        hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
+    )])
+    
+    fig.update_layout(height=350)
+    return fig
+
+
+@figura_em_cache
+def grafico_comp(cr_conciliados, cr_nao_conciliados, pr_conciliados, pr_nao_conciliados):
+    fig = go.Figure(data=[
+        go.Bar(
+            name='Conciliadas',
+            x=['Despesas', 'Receitas'],
+            y=[pr_conciliados, cr_conciliados],
+            marker_color='#10b981',
+            text=[f'{pr_conciliados}', f'{cr_conciliados}'],
+            textposition='auto'
+        ),
+        go.Bar(
+            name='Não Conciliadas',
+            x=['Despesas', 'Receitas'],
+            y=[pr_nao_conciliados, cr_nao_conciliados],
+            marker_color='#ef4444',
+            text=[f'{pr_nao_conciliados}', f'{cr_nao_conciliados}'],
+            textposition='auto'
+        )
+    ])
+    
+    fig.update_layout(barmode='group', height=400)
+    return fig
+
+
+@figura_em_cache
+def grafico_empresa(conc_empresa):
+    fig = px.bar(
+        x=conc_empresa.values,
+        y=conc_empresa.index,
+        orientation='h',
+        labels={'x': '% Conciliação', 'y': 'Empresa'},
+        color=conc_empresa.values,
+        color_continuous_scale='RdYlGn',
+        range_color=[0, 100]
+    )
+    
+    fig.update_layout(height=400, showlegend=False)
+    return fig
+
 
 try:
-    pr, cr, par = load_data()
+    pr, cr = carregar_datasets('pr', 'cr')
     
     # Aplicar filtros globais
-    pr_filtrado, cr_filtrado, par_filtrado, grupo_sel, empresa_sel, data_inicio, data_fim, grupos_despesa_sel, categorias_sel = apply_filters_sidebar(pr, cr, par)
+    pr_filtrado, cr_filtrado, _, grupo_sel, empresa_sel, data_inicio, data_fim, grupos_despesa_sel, categorias_sel = apply_filters_sidebar(pr=pr, cr=cr)
     
     # Mostrar filtros ativos
     filtros_ativos = []
@@ -39,20 +117,25 @@ try:
     if filtros_ativos:
         st.info(f"🔍 Filtros ativos: {' | '.join(filtros_ativos)}")
     
-    # Calcular métricas de conciliação
-    pr_conciliados = (pr_filtrado['Conciliado'] == 'Sim').sum()
-    pr_nao_conciliados = (pr_filtrado['Conciliado'] != 'Sim').sum()
-    pr_total = len(pr_filtrado)
+    # Calcular métricas de conciliação (uma passada por dataset)
+    filtros = montar_filtros(grupo_sel, empresa_sel, grupos_despesa_sel, categorias_sel, data_inicio, data_fim)
+    relatorio = ler_relatorio_precomputado(filtros, {'pr': pr, 'cr': cr})
+    metricas_pr = agregar(pr, pr_filtrado, 'pr', filtros, relatorio=relatorio)
+    metricas_cr = agregar(cr, cr_filtrado, 'cr', filtros, relatorio=relatorio)
+    
+    pr_conciliados = metricas_pr['conciliados']
+    pr_nao_conciliados = metricas_pr['nao_conciliados']
+    pr_total = metricas_pr['quantidade']
     perc_conciliacao_pr = (pr_conciliados / pr_total * 100) if pr_total > 0 else 0
     
-    cr_conciliados = (cr_filtrado['Conciliado'] == 'Sim').sum()
-    cr_nao_conciliados = (cr_filtrado['Conciliado'] != 'Sim').sum()
-    cr_total = len(cr_filtrado)
+    cr_conciliados = metricas_cr['conciliados']
+    cr_nao_conciliados = metricas_cr['nao_conciliados']
+    cr_total = metricas_cr['quantidade']
     perc_conciliacao_cr = (cr_conciliados / cr_total * 100) if cr_total > 0 else 0
     
     # Valores não conciliados
-    valor_desp_nao_conc = pr_filtrado[pr_filtrado['Conciliado'] != 'Sim']['Pago ou Recebido'].sum()
-    valor_rec_nao_conc = cr_filtrado[cr_filtrado['Conciliado'] != 'Sim']['Pago ou Recebido'].sum()
+    valor_desp_nao_conc = metricas_pr['valor_nao_conciliado']
+    valor_rec_nao_conc = metricas_cr['valor_nao_conciliado']
     
     # KPIs
     col1, col2, col3, col4 = st.columns(4)
@@ -93,34 +176,18 @@ try:
     with col_left:
         st.subheader("📊 Status de Conciliação - Despesas")
         
-        fig_desp = go.Figure(data=[go.Pie(
-            labels=['Conciliadas', 'Não Conciliadas'],
-            values=[pr_conciliados, pr_nao_conciliados],
-            hole=0.4,
-            marker_colors=['#10b981', '#ef4444'],
-            textinfo='label+percent',
-            hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
-        )])
+        fig_desp = grafico_desp(pr_conciliados, pr_nao_conciliados)
         
-        fig_desp.update_layout(height=350)
-        st.plotly_chart(fig_desp, use_container_width=True)
+        exibir_grafico(fig_desp, 'desp', use_container_width=True)
         
         st.metric("Total de Despesas", f"{pr_total:,} transações")
     
     with col_right:
         st.subheader("📊 Status de Conciliação - Receitas")
         
-        fig_rec = go.Figure(data=[go.Pie(
-            labels=['Conciliadas', 'Não Conciliadas'],
-            values=[cr_conciliados, cr_nao_conciliados],
-            hole=0.4,
-            marker_colors=['#10b981', '#ef4444'],
-            textinfo='label+percent',
-            hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
-        )])
+        fig_rec = grafico_rec(cr_conciliados, cr_nao_conciliados)
         
-        fig_rec.update_layout(height=350)
-        st.plotly_chart(fig_rec, use_container_width=True)
+        exibir_grafico(fig_rec, 'rec', use_container_width=True)
         
         st.metric("Total de Receitas", f"{cr_total:,} transações")
     
@@ -128,27 +195,9 @@ try:
     st.markdown("---")
     st.subheader("📈 Comparativo de Conciliação")
     
-    fig_comp = go.Figure(data=[
-        go.Bar(
-            name='Conciliadas',
-            x=['Despesas', 'Receitas'],
-            y=[pr_conciliados, cr_conciliados],
-            marker_color='#10b981',
-            text=[f'{pr_conciliados}', f'{cr_conciliados}'],
-            textposition='auto'
-        ),
-        go.Bar(
-            name='Não Conciliadas',
-            x=['Despesas', 'Receitas'],
-            y=[pr_nao_conciliados, cr_nao_conciliados],
-            marker_color='#ef4444',
-            text=[f'{pr_nao_conciliados}', f'{cr_nao_conciliados}'],
-            textposition='auto'
-        )
-    ])
+    fig_comp = grafico_comp(cr_conciliados, cr_nao_conciliados, pr_conciliados, pr_nao_conciliados)
     
-    fig_comp.update_layout(barmode='group', height=400)
-    st.plotly_chart(fig_comp, use_container_width=True)
+    exibir_grafico(fig_comp, 'comp', use_container_width=True)
     
     # Tabelas de itens não conciliados
     st.markdown("---")
@@ -158,16 +207,14 @@ try:
     with col_tab1:
         st.subheader("❌ Despesas Não Conciliadas")
         
-        nao_conf_pr = pr_filtrado[pr_filtrado['Conciliado'] != 'Sim']
-        
-        if len(nao_conf_pr) > 0:
+        if pr_nao_conciliados > 0:
             colunas_exibir = ['Fornecedor', 'Pago ou Recebido', 'Categoria']
-            colunas_disponiveis = [col for col in colunas_exibir if col in nao_conf_pr.columns]
+            colunas_disponiveis = [col for col in colunas_exibir if col in pr_filtrado.columns]
             
             if colunas_disponiveis:
-                df_display = nao_conf_pr[colunas_disponiveis].head(20).copy()
-                if 'Pago ou Recebido' in df_display.columns:
-                    df_display['Pago ou Recebido'] = df_display['Pago ou Recebido'].apply(format_currency_br)
+                # Só as linhas exibidas (LIMIT no armazém SQLite, quando ativo)
+                nao_conf_pr = linhas_filtradas(pr_filtrado, colunas_disponiveis, 'nao_conciliado', limite=20)
+                df_display = format_dataframe_currency(nao_conf_pr, ['Pago ou Recebido'], max_linhas=20)
                 
                 st.dataframe(
                     df_display,
@@ -180,16 +227,14 @@ try:
     with col_tab2:
         st.subheader("❌ Receitas Não Conciliadas")
         
-        nao_conf_cr = cr_filtrado[cr_filtrado['Conciliado'] != 'Sim']
-        
-        if len(nao_conf_cr) > 0:
+        if cr_nao_conciliados > 0:
             colunas_exibir = ['Cliente', 'Pago ou Recebido', 'Categoria']
-            colunas_disponiveis = [col for col in colunas_exibir if col in nao_conf_cr.columns]
+            colunas_disponiveis = [col for col in colunas_exibir if col in cr_filtrado.columns]
             
             if colunas_disponiveis:
-                df_display = nao_conf_cr[colunas_disponiveis].head(20).copy()
-                if 'Pago ou Recebido' in df_display.columns:
-                    df_display['Pago ou Recebido'] = df_display['Pago ou Recebido'].apply(format_currency_br)
+                # Só as linhas exibidas (LIMIT no armazém SQLite, quando ativo)
+                nao_conf_cr = linhas_filtradas(cr_filtrado, colunas_disponiveis, 'nao_conciliado', limite=20)
+                df_display = format_dataframe_currency(nao_conf_cr, ['Pago ou Recebido'], max_linhas=20)
                 
                 st.dataframe(
                     df_display,
@@ -204,24 +249,22 @@ try:
     st.subheader("🏢 Conciliação por Empresa")
     
     if 'Minha Empresa (Nome Fantasia)' in pr_filtrado.columns:
-        conc_empresa = pr_filtrado.groupby('Minha Empresa (Nome Fantasia)')['Conciliado'].apply(
-            lambda x: (x == 'Sim').sum() / len(x) * 100 if len(x) > 0 else 0
-        ).sort_values(ascending=False)
+        if relatorio is not None:
+            conc_empresa = taxas_precomputadas(relatorio, 'conciliacao')
+        else:
+            with secao('conciliação por empresa', len(pr_filtrado)) as registro:
+                conc_empresa = taxas_por_grupo(
+                    linhas_filtradas(pr_filtrado, ['Minha Empresa (Nome Fantasia)', 'Conciliado']),
+                    'Conciliado', 'Minha Empresa (Nome Fantasia)'
+                )['taxa'].sort_values(ascending=False)
+                registro.linhas_saida = len(conc_empresa)
         
-        fig_empresa = px.bar(
-            x=conc_empresa.values,
-            y=conc_empresa.index,
-            orientation='h',
-            labels={'x': '% Conciliação', 'y': 'Empresa'},
-            color=conc_empresa.values,
-            color_continuous_scale='RdYlGn',
-            range_color=[0, 100]
-        )
+        fig_empresa = grafico_empresa(conc_empresa)
         
-        fig_empresa.update_layout(height=400, showlegend=False)
-        st.plotly_chart(fig_empresa, use_container_width=True)
+        exibir_grafico(fig_empresa, 'empresa', use_container_width=True)
     
 except Exception as e:
     st.error(f"Erro ao carregar dados: {str(e)}")
     st.exception(e)
 
+finalizar_execucao()
@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import sys
@@ -7,26 +6,104 @@ import os
 
 # Adicionar pasta utils ao path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils.helpers import format_currency_br, apply_filters_sidebar
+from utils.helpers import apply_filters_sidebar, format_dataframe_currency
+from utils.data_loader import carregar_datasets
+from utils.desempenho import iniciar_execucao, finalizar_execucao, exibir_grafico, secao
+from utils.aquecimento import acompanhar_aquecimento
+from utils.figuras import figura_em_cache
+from utils.filtros import linhas_filtradas, montar_filtros
+from utils.metricas import taxas_por_grupo
+from utils.motor import ler_relatorio_precomputado, mascara_conformidade, resumir_conformidade, taxas_precomputadas
 
 st.set_page_config(page_title="Conformidade Emissão x Registro", page_icon="📅", layout="wide")
 
+# Medição de desempenho (ativada com ?desempenho=1 na URL)
+iniciar_execucao('Conformidade')
+# Aquecimento dos caches em segundo plano (aviso na sidebar enquanto não termina)
+acompanhar_aquecimento()
+
 st.title("📅 Conformidade: Emissão x Registro")
 st.markdown("**Análise de conformidade entre data de emissão e data de registro**")
 st.markdown("---")
 
-@st.cache_data
-def load_data():
-    pr = pd.read_excel('data/PagamentosRealizadosRelatorio.xlsx')
-    cr = pd.read_excel('data/ContasRecebidaseaReceber.xlsx')
-    par = pd.read_excel('data/PagamentosaRealizarRelatorio.xlsx')
-    return pr, cr, par
+# Gráficos (cada figura é reaproveitada enquanto os dados agregados não mudam)
+
+@figura_em_cache
+def grafico_pr(conformes_pr, nao_conformes_pr):
+    fig = go.Figure(data=[go.Pie(
+        labels=['Conforme (Mesmo Mês)', 'Não Conforme (Mês Diferente)'],
+        values=[conformes_pr, nao_conformes_pr],
+        hole=0.4,
+        marker_colors=['#10b981', '#ef4444'],
+        textinfo='label+percent',
+        hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
+    )])
+    
+    fig.update_layout(height=350)
+    return fig
+
+
+@figura_em_cache
+def grafico_par(conformes_par, nao_conformes_par):
+    fig = go.Figure(data=[go.Pie(
+        labels=['Conforme (Mesmo Mês)', 'Não Conforme (Mês Diferente)'],
+        values=[conformes_par, nao_conformes_par],
+        hole=0.4,
+        marker_colors=['#10b981', '#ef4444'],
+        textinfo='label+percent',
+        hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
+    )])
+    
+    fig.update_layout(height=350)
+    return fig
+
+
+@figura_em_cache
+def grafico_comp(conformes_par, conformes_pr, nao_conformes_par, nao_conformes_pr):
+    fig = go.Figure(data=[
+        go.Bar(
+            name='Conforme',
+            x=['Realizados', 'Pendentes'],
+            y=[conformes_pr, conformes_par],
+            marker_color='#10b981',
+            text=[f'{conformes_pr}', f'{conformes_par}'],
+            textposition='auto'
+        ),
+        go.Bar(
+            name='Não Conforme',
+            x=['Realizados', 'Pendentes'],
+            y=[nao_conformes_pr, nao_conformes_par],
+            marker_color='#ef4444',
+            text=[f'{nao_conformes_pr}', f'{nao_conformes_par}'],
+            textposition='auto'
+        )
+    ])
+    
+    fig.update_layout(barmode='group', height=400)
+    return fig
+
+
+@figura_em_cache
+def grafico_empresa(conf_empresa):
+    fig = px.bar(
+        x=conf_empresa.values,
+        y=conf_empresa.index,
+        orientation='h',
+        labels={'x': '% Conformidade', 'y': 'Empresa'},
+        color=conf_empresa.values,
+        color_continuous_scale='RdYlGn',
+        range_color=[0, 100]
+    )
+    
+    fig.update_layout(height=400, showlegend=False)
+    return fig
+
 
 try:
-    pr, cr, par = load_data()
+    pr, par = carregar_datasets('pr', 'par')
     
     # Aplicar filtros globais
-    pr_filtrado, cr_filtrado, par_filtrado, grupo_sel, empresa_sel, data_inicio, data_fim, grupos_despesa_sel, categorias_sel = apply_filters_sidebar(pr, cr, par)
+    pr_filtrado, _, par_filtrado, grupo_sel, empresa_sel, data_inicio, data_fim, grupos_despesa_sel, categorias_sel = apply_filters_sidebar(pr=pr, par=par)
     
     # Mostrar filtros ativos
     filtros_ativos = []
@@ -40,20 +117,25 @@ try:
     if filtros_ativos:
         st.info(f"🔍 Filtros ativos: {' | '.join(filtros_ativos)}")
     
+    # Resultado do lote noturno para estes filtros, quando existe
+    filtros = montar_filtros(grupo_sel, empresa_sel, grupos_despesa_sel, categorias_sel, data_inicio, data_fim)
+    relatorio = ler_relatorio_precomputado(filtros, {'pr': pr, 'par': par})
+    
     # Análise de conformidade para Pagamentos Realizados
-    if 'Emissão' in pr_filtrado.columns and 'Data de Registro (completa)' in pr_filtrado.columns:
-        pr_filtrado['Emissão'] = pd.to_datetime(pr_filtrado['Emissão'], errors='coerce')
-        pr_filtrado['Registro'] = pd.to_datetime(pr_filtrado['Data de Registro (completa)'], errors='coerce')
+    # Mes_Emissao e Mes_Registro são chaves yyyymm calculadas na carga (0 = data ausente)
+    # Só as colunas da conformidade (vindas do armazém SQLite, quando ativo)
+    conforme_pr = None
+    if 'Mes_Emissao' in pr_filtrado.columns and 'Mes_Registro' in pr_filtrado.columns:
+        colunas_base = [col for col in ['Mes_Emissao', 'Mes_Registro', 'Minha Empresa (Nome Fantasia)'] if col in pr_filtrado.columns]
+        base_pr = linhas_filtradas(pr_filtrado, colunas_base)
+        conforme_pr = mascara_conformidade(base_pr)
         
-        pr_filtrado['Mes_Emissao'] = pr_filtrado['Emissão'].dt.to_period('M')
-        pr_filtrado['Mes_Registro'] = pr_filtrado['Registro'].dt.to_period('M')
-        
-        pr_filtrado['Conforme'] = pr_filtrado['Mes_Emissao'] == pr_filtrado['Mes_Registro']
-        
-        conformes_pr = pr_filtrado['Conforme'].sum()
-        nao_conformes_pr = (~pr_filtrado['Conforme']).sum()
-        total_pr = len(pr_filtrado)
-        perc_conformidade_pr = (conformes_pr / total_pr * 100) if total_pr > 0 else 0
+        conformidade_pr = (relatorio['conformidade']['pr'] if relatorio is not None
+                           else resumir_conformidade(conforme_pr))
+        conformes_pr = conformidade_pr['conformes']
+        nao_conformes_pr = conformidade_pr['nao_conformes']
+        total_pr = conformidade_pr['total']
+        perc_conformidade_pr = conformidade_pr['percentual']
     else:
         conformes_pr = 0
         nao_conformes_pr = 0
@@ -61,19 +143,16 @@ try:
         perc_conformidade_pr = 0
     
     # Análise de conformidade para Pagamentos a Realizar
-    if 'Emissão' in par_filtrado.columns and 'Registro' in par_filtrado.columns:
-        par_filtrado['Emissão'] = pd.to_datetime(par_filtrado['Emissão'], errors='coerce')
-        par_filtrado['Registro'] = pd.to_datetime(par_filtrado['Registro'], errors='coerce')
-        
-        par_filtrado['Mes_Emissao'] = par_filtrado['Emissão'].dt.to_period('M')
-        par_filtrado['Mes_Registro'] = par_filtrado['Registro'].dt.to_period('M')
+    conforme_par = None
+    if 'Mes_Emissao' in par_filtrado.columns and 'Mes_Registro' in par_filtrado.columns:
+        conforme_par = mascara_conformidade(linhas_filtradas(par_filtrado, ['Mes_Emissao', 'Mes_Registro']))
         
-        par_filtrado['Conforme'] = par_filtrado['Mes_Emissao'] == par_filtrado['Mes_Registro']
-        
-        conformes_par = par_filtrado['Conforme'].sum()
-        nao_conformes_par = (~par_filtrado['Conforme']).sum()
-        total_par = len(par_filtrado)
-        perc_conformidade_par = (conformes_par / total_par * 100) if total_par > 0 else 0
+        conformidade_par = (relatorio['conformidade']['par'] if relatorio is not None
+                            else resumir_conformidade(conforme_par))
+        conformes_par = conformidade_par['conformes']
+        nao_conformes_par = conformidade_par['nao_conformes']
+        total_par = conformidade_par['total']
+        perc_conformidade_par = conformidade_par['percentual']
     else:
         conformes_par = 0
         nao_conformes_par = 0
@@ -123,58 +202,24 @@ try:
     with col_left:
         st.subheader("📊 Conformidade - Pagamentos Realizados")
         
-        fig_pr = go.Figure(data=[go.Pie(
-            labels=['Conforme (Mesmo Mês)', 'Não Conforme (Mês Diferente)'],
-            values=[conformes_pr, nao_conformes_pr],
-            hole=0.4,
-            marker_colors=['#10b981', '#ef4444'],
-            textinfo='label+percent',
-            hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
-        )])
+        fig_pr = grafico_pr(conformes_pr, nao_conformes_pr)
         
-        fig_pr.update_layout(height=350)
-        st.plotly_chart(fig_pr, use_container_width=True)
+        exibir_grafico(fig_pr, 'pr', use_container_width=True)
     
     with col_right:
         st.subheader("📊 Conformidade - Pagamentos Pendentes")
         
-        fig_par = go.Figure(data=[go.Pie(
-            labels=['Conforme (Mesmo Mês)', 'Não Conforme (Mês Diferente)'],
-            values=[conformes_par, nao_conformes_par],
-            hole=0.4,
-            marker_colors=['#10b981', '#ef4444'],
-            textinfo='label+percent',
-            hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
-        )])
+        fig_par = grafico_par(conformes_par, nao_conformes_par)
         
-        fig_par.update_layout(height=350)
-        st.plotly_chart(fig_par, use_container_width=True)
+        exibir_grafico(fig_par, 'par', use_container_width=True)
     
     # Comparativo
     st.markdown("---")
     st.subheader("📈 Comparativo de Conformidade")
     
-    fig_comp = go.Figure(data=[
-        go.Bar(
-            name='Conforme',
-            x=['Realizados', 'Pendentes'],
-            y=[conformes_pr, conformes_par],
-            marker_color='#10b981',
-            text=[f'{conformes_pr}', f'{conformes_par}'],
-            textposition='auto'
-        ),
-        go.Bar(
-            name='Não Conforme',
-            x=['Realizados', 'Pendentes'],
-            y=[nao_conformes_pr, nao_conformes_par],
-            marker_color='#ef4444',
-            text=[f'{nao_conformes_pr}', f'{nao_conformes_par}'],
-            textposition='auto'
-        )
-    ])
+    fig_comp = grafico_comp(conformes_par, conformes_pr, nao_conformes_par, nao_conformes_pr)
     
-    fig_comp.update_layout(barmode='group', height=400)
-    st.plotly_chart(fig_comp, use_container_width=True)
+    exibir_grafico(fig_comp, 'comp', use_container_width=True)
     
     # Tabelas de não conformes
     st.markdown("---")
@@ -184,17 +229,17 @@ try:
     with col_tab1:
         st.subheader("❌ Pagamentos Realizados Não Conformes")
         
-        if 'Conforme' in pr_filtrado.columns:
-            nao_conf_pr = pr_filtrado[~pr_filtrado['Conforme']]
-            
-            if len(nao_conf_pr) > 0:
-                colunas_exibir = ['Fornecedor', 'Emissão', 'Registro', 'Pago ou Recebido']
-                colunas_disponiveis = [col for col in colunas_exibir if col in nao_conf_pr.columns]
+        if conforme_pr is not None:
+            if nao_conformes_pr > 0:
+                colunas_exibir = ['Fornecedor', 'Emissão', 'Data de Registro (completa)', 'Pago ou Recebido']
+                colunas_disponiveis = [col for col in colunas_exibir if col in pr_filtrado.columns]
                 
                 if colunas_disponiveis:
-                    df_display = nao_conf_pr[colunas_disponiveis].head(20).copy()
-                    if 'Pago ou Recebido' in df_display.columns:
-                        df_display['Pago ou Recebido'] = df_display['Pago ou Recebido'].apply(format_currency_br)
+                    # Só as linhas exibidas (LIMIT no armazém SQLite, quando ativo)
+                    nao_conf_pr = linhas_filtradas(pr_filtrado, colunas_disponiveis, 'nao_conforme', limite=20).rename(
+                        columns={'Data de Registro (completa)': 'Registro'}
+                    )
+                    df_display = format_dataframe_currency(nao_conf_pr, ['Pago ou Recebido'], max_linhas=20)
                     
                     st.dataframe(
                         df_display,
@@ -207,17 +252,15 @@ try:
     with col_tab2:
         st.subheader("❌ Pagamentos Pendentes Não Conformes")
         
-        if 'Conforme' in par_filtrado.columns:
-            nao_conf_par = par_filtrado[~par_filtrado['Conforme']]
-            
-            if len(nao_conf_par) > 0:
+        if conforme_par is not None:
+            if nao_conformes_par > 0:
                 colunas_exibir = ['Razão Social', 'Emissão', 'Registro', 'Valor Líquido']
-                colunas_disponiveis = [col for col in colunas_exibir if col in nao_conf_par.columns]
+                colunas_disponiveis = [col for col in colunas_exibir if col in par_filtrado.columns]
                 
                 if colunas_disponiveis:
-                    df_display = nao_conf_par[colunas_disponiveis].head(20).copy()
-                    if 'Valor Líquido' in df_display.columns:
-                        df_display['Valor Líquido'] = df_display['Valor Líquido'].apply(format_currency_br)
+                    # Só as linhas exibidas (LIMIT no armazém SQLite, quando ativo)
+                    nao_conf_par = linhas_filtradas(par_filtrado, colunas_disponiveis, 'nao_conforme', limite=20)
+                    df_display = format_dataframe_currency(nao_conf_par, ['Valor Líquido'], max_linhas=20)
                     
                     st.dataframe(
                         df_display,
@@ -231,23 +274,19 @@ try:
     st.markdown("---")
     st.subheader("🏢 Conformidade por Empresa")
     
-    if 'Minha Empresa (Nome Fantasia)' in pr_filtrado.columns and 'Conforme' in pr_filtrado.columns:
-        conf_empresa = pr_filtrado.groupby('Minha Empresa (Nome Fantasia)')['Conforme'].apply(
-            lambda x: (x.sum() / len(x) * 100) if len(x) > 0 else 0
-        ).sort_values(ascending=False)
+    if 'Minha Empresa (Nome Fantasia)' in pr_filtrado.columns and conforme_pr is not None:
+        if relatorio is not None:
+            conf_empresa = taxas_precomputadas(relatorio, 'conformidade')
+        else:
+            with secao('conformidade por empresa', len(pr_filtrado)) as registro:
+                conf_empresa = taxas_por_grupo(
+                    base_pr, conforme_pr, 'Minha Empresa (Nome Fantasia)'
+                )['taxa'].sort_values(ascending=False)
+                registro.linhas_saida = len(conf_empresa)
         
-        fig_empresa = px.bar(
-            x=conf_empresa.values,
-            y=conf_empresa.index,
-            orientation='h',
-            labels={'x': '% Conformidade', 'y': 'Empresa'},
-            color=conf_empresa.values,
-            color_continuous_scale='RdYlGn',
-            range_color=[0, 100]
-        )
+        fig_empresa = grafico_empresa(conf_empresa)
         
-        fig_empresa.update_layout(height=400, showlegend=False)
-        st.plotly_chart(fig_empresa, use_container_width=True)
+        exibir_grafico(fig_empresa, 'empresa', use_container_width=True)
     
     # Explicação
     st.markdown("---")
@@ -264,3 +303,4 @@ except Exception as e:
     st.error(f"Erro ao carregar dados: {str(e)}")
     st.exception(e)
 
+finalizar_execucao()
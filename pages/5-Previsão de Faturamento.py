@@ -7,27 +7,120 @@ import os
 
 # Adicionar pasta utils ao path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils.helpers import format_currency_br, apply_filters_sidebar
+from utils.helpers import format_currency_br, format_currency_br_array, apply_filters_sidebar, pontos_do_grafico
+from utils.data_loader import carregar_datasets
+from utils.desempenho import iniciar_execucao, finalizar_execucao, exibir_grafico, secao
+from utils.aquecimento import acompanhar_aquecimento
+from utils.figuras import figura_em_cache
+from utils.filtros import montar_filtros
+from utils.cubo import agregar
 
 st.set_page_config(page_title="Previsão de Faturamento", page_icon="🔮", layout="wide")
 
+# Medição de desempenho (ativada com ?desempenho=1 na URL)
+iniciar_execucao('Previsão de Faturamento')
+# Aquecimento dos caches em segundo plano (aviso na sidebar enquanto não termina)
+acompanhar_aquecimento()
+
 st.title("🔮 Previsão de Faturamento")
 st.markdown("**Análise de faturamento futuro e tendências**")
 st.markdown("---")
 
-@st.cache_data
-def load_data():
-    pr = pd.read_excel('data/PagamentosRealizadosRelatorio.xlsx')
-    cr = pd.read_excel('data/ContasRecebidaseaReceber.xlsx')
-    par = pd.read_excel('data/PagamentosaRealizarRelatorio.xlsx')
-    pf = pd.read_excel('data/PrevisaoFaturamento.xlsx')
-    return pr, cr, par, pf
+# Gráficos (cada figura é reaproveitada enquanto os dados agregados não mudam)
+
+@figura_em_cache
+def grafico_linha(pf_long):
+    fig = px.line(
+        pf_long,
+        x='Data',
+        y='Valor',
+        color='Minha Empresa (Nome Fantasia)',
+        markers=True,
+        labels={'Valor': 'Faturamento Previsto (R$)', 'Data': 'Data'}
+    )
+    
+    fig.update_layout(height=500, hovermode='x unified')
+    fig.update_traces(
+        hovertemplate='<b>%{fullData.name}</b><br>Data: %{x|%d/%m/%Y}<br>Valor: R$ %{y:,.2f}<extra></extra>'
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_total(total_por_data):
+    fig = go.Figure()
+    
+    fig.add_trace(go.Bar(
+        x=total_por_data['Data'],
+        y=total_por_data['Valor'],
+        marker_color='#3b82f6',
+        text=format_currency_br_array(total_por_data['Valor']),
+        textposition='auto',
+        hovertemplate='<b>%{x|%d/%m/%Y}</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        xaxis_title='Data',
+        yaxis_title='Valor (R$)',
+        height=400
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_comp(total_previsto, total_realizado):
+    fig = go.Figure(data=[
+        go.Bar(
+            name='Realizado',
+            x=['Faturamento'],
+            y=[total_realizado],
+            marker_color='#10b981',
+            text=[format_currency_br(total_realizado)],
+            textposition='auto',
+            hovertemplate='<b>Realizado</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
+        ),
+        go.Bar(
+            name='Previsto',
+            x=['Faturamento'],
+            y=[total_previsto],
+            marker_color='#3b82f6',
+            text=[format_currency_br(total_previsto)],
+            textposition='auto',
+            hovertemplate='<b>Previsto</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
+        )
+    ])
+    
+    fig.update_layout(
+        barmode='group',
+        height=400,
+        yaxis_title='Valor (R$)'
+    )
+    return fig
+
+
+@figura_em_cache
+def grafico_empresa(total_por_empresa):
+    fig = px.bar(
+        x=total_por_empresa.values,
+        y=total_por_empresa.index,
+        orientation='h',
+        labels={'x': 'Faturamento Previsto (R$)', 'y': 'Empresa'},
+        color=total_por_empresa.values,
+        color_continuous_scale='Blues'
+    )
+    
+    fig.update_layout(height=400, showlegend=False)
+    fig.update_traces(
+        hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
+    )
+    return fig
+
 
 try:
-    pr, cr, par, pf = load_data()
+    cr, pf = carregar_datasets('cr', 'pf')
     
     # Aplicar filtros globais
-    pr_filtrado, cr_filtrado, par_filtrado, grupo_sel, empresa_sel, data_inicio, data_fim, grupos_despesa_sel, categorias_sel = apply_filters_sidebar(pr, cr, par)
+    _, cr_filtrado, _, grupo_sel, empresa_sel, data_inicio, data_fim, grupos_despesa_sel, categorias_sel = apply_filters_sidebar(cr=cr)
     
     # Mostrar filtros ativos
     filtros_ativos = []
@@ -50,8 +143,8 @@ try:
         for col in pf_display.columns:
             if col != 'Minha Empresa (Nome Fantasia)':
                 try:
-                    pf_display[col] = pf_display[col].apply(lambda x: format_currency_br(x) if pd.notna(x) else '-')
-                except:
+                    pf_display[col] = format_currency_br_array(pf_display[col]).where(pf_display[col].notna(), '-')
+                except (TypeError, ValueError):
                     pass
         
         st.dataframe(pf_display, use_container_width=True, hide_index=True)
@@ -65,33 +158,27 @@ try:
         st.subheader("📈 Evolução do Faturamento Previsto")
         
         # Transformar dados para formato longo
-        pf_long = pf.melt(
-            id_vars=['Minha Empresa (Nome Fantasia)'],
-            value_vars=colunas_data,
-            var_name='Data',
-            value_name='Valor'
-        )
-        
-        # Converter datas
-        pf_long['Data'] = pd.to_datetime(pf_long['Data'], errors='coerce')
-        pf_long = pf_long.dropna(subset=['Data'])
-        pf_long = pf_long.sort_values('Data')
-        
-        # Gráfico de linhas
-        fig_linha = px.line(
-            pf_long,
-            x='Data',
-            y='Valor',
-            color='Minha Empresa (Nome Fantasia)',
-            markers=True,
-            labels={'Valor': 'Faturamento Previsto (R$)', 'Data': 'Data'}
+        with secao('previsão: formato longo', len(pf)) as registro:
+            pf_long = pf.melt(
+                id_vars=['Minha Empresa (Nome Fantasia)'],
+                value_vars=colunas_data,
+                var_name='Data',
+                value_name='Valor'
+            )
+            
+            # Converter datas
+            pf_long['Data'] = pd.to_datetime(pf_long['Data'], errors='coerce')
+            pf_long = pf_long.dropna(subset=['Data'])
+            pf_long = pf_long.sort_values('Data')
+            registro.linhas_saida = len(pf_long)
+        
+        # Gráfico de linhas (séries longas: seletor de intervalo e redução de pontos só no gráfico)
+        pontos_linha = pontos_do_grafico(
+            pf_long, 'Data', 'Valor', 'janela_previsao', grupo='Minha Empresa (Nome Fantasia)'
         )
+        fig_linha = grafico_linha(pontos_linha)
         
-        fig_linha.update_layout(height=500, hovermode='x unified')
-        fig_linha.update_traces(
-            hovertemplate='<b>%{fullData.name}</b><br>Data: %{x|%d/%m/%Y}<br>Valor: R$ %{y:,.2f}<extra></extra>'
-        )
-        st.plotly_chart(fig_linha, use_container_width=True)
+        exibir_grafico(fig_linha, 'linha', use_container_width=True)
         
         st.markdown("---")
         
@@ -100,24 +187,9 @@ try:
         
         total_por_data = pf_long.groupby('Data')['Valor'].sum().reset_index()
         
-        fig_total = go.Figure()
+        fig_total = grafico_total(pontos_do_grafico(total_por_data, 'Data', 'Valor', 'janela_previsao_total'))
         
-        fig_total.add_trace(go.Bar(
-            x=total_por_data['Data'],
-            y=total_por_data['Valor'],
-            marker_color='#3b82f6',
-            text=total_por_data['Valor'].apply(lambda x: format_currency_br(x)),
-            textposition='auto',
-            hovertemplate='<b>%{x|%d/%m/%Y}</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
-        ))
-        
-        fig_total.update_layout(
-            xaxis_title='Data',
-            yaxis_title='Valor (R$)',
-            height=400
-        )
-        
-        st.plotly_chart(fig_total, use_container_width=True)
+        exibir_grafico(fig_total, 'total', use_container_width=True)
         
         # KPIs
         st.markdown("---")
@@ -146,37 +218,13 @@ try:
         # Comparação com receitas realizadas
         st.subheader("📊 Comparação: Previsto vs Realizado")
         
-        # Calcular total realizado
-        total_realizado = cr_filtrado['Pago ou Recebido'].sum()
-        
-        fig_comp = go.Figure(data=[
-            go.Bar(
-                name='Realizado',
-                x=['Faturamento'],
-                y=[total_realizado],
-                marker_color='#10b981',
-                text=[format_currency_br(total_realizado)],
-                textposition='auto',
-                hovertemplate='<b>Realizado</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
-            ),
-            go.Bar(
-                name='Previsto',
-                x=['Faturamento'],
-                y=[total_previsto],
-                marker_color='#3b82f6',
-                text=[format_currency_br(total_previsto)],
-                textposition='auto',
-                hovertemplate='<b>Previsto</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
-            )
-        ])
+        # Calcular total realizado (cubo ou armazém, sem percorrer as linhas)
+        filtros = montar_filtros(grupo_sel, empresa_sel, grupos_despesa_sel, categorias_sel, data_inicio, data_fim)
+        total_realizado = agregar(cr, cr_filtrado, 'cr', filtros)['valor']
         
-        fig_comp.update_layout(
-            barmode='group',
-            height=400,
-            yaxis_title='Valor (R$)'
-        )
+        fig_comp = grafico_comp(total_previsto, total_realizado)
         
-        st.plotly_chart(fig_comp, use_container_width=True)
+        exibir_grafico(fig_comp, 'comp', use_container_width=True)
         
         # Análise por empresa
         st.markdown("---")
@@ -184,20 +232,9 @@ try:
         
         total_por_empresa = pf_long.groupby('Minha Empresa (Nome Fantasia)')['Valor'].sum().sort_values(ascending=False)
         
-        fig_empresa = px.bar(
-            x=total_por_empresa.values,
-            y=total_por_empresa.index,
-            orientation='h',
-            labels={'x': 'Faturamento Previsto (R$)', 'y': 'Empresa'},
-            color=total_por_empresa.values,
-            color_continuous_scale='Blues'
-        )
+        fig_empresa = grafico_empresa(total_por_empresa)
         
-        fig_empresa.update_layout(height=400, showlegend=False)
-        fig_empresa.update_traces(
-            hovertemplate='<b>%{y}</b><br>Valor: R$ %{x:,.2f}<extra></extra>'
-        )
-        st.plotly_chart(fig_empresa, use_container_width=True)
+        exibir_grafico(fig_empresa, 'empresa', use_container_width=True)
         
         # Tabela resumo
         st.markdown("---")
@@ -212,8 +249,8 @@ try:
         
         # Formatar para exibição
         resumo_display = resumo_empresa.copy()
-        resumo_display['Total Previsto'] = resumo_display['Total Previsto'].apply(format_currency_br)
-        resumo_display['Média por Período'] = resumo_display['Média por Período'].apply(format_currency_br)
+        resumo_display['Total Previsto'] = format_currency_br_array(resumo_display['Total Previsto'])
+        resumo_display['Média por Período'] = format_currency_br_array(resumo_display['Média por Período'])
         
         st.dataframe(
             resumo_display,
@@ -237,3 +274,4 @@ except Exception as e:
     st.error(f"Erro ao carregar dados: {str(e)}")
     st.exception(e)
 
+finalizar_execucao()
@@ -0,0 +1,189 @@
+"""
+Aquecimento dos caches na subida do servidor
+Em uma thread de fundo carrega e normaliza todos os datasets, monta os
+catálogos da sidebar, os índices de filtros e os cubos, e calcula a visão sem
+filtros de todas as páginas (o que deixa no cache de filtros o estado padrão
+da sidebar). As páginas continuam respondendo durante o aquecimento e mostram
+um aviso na sidebar; quem chegar antes espera só o que ainda falta.
+
+Para aquecer já na subida do processo (antes do primeiro acesso), inicie o
+dashboard por este módulo, que sobe o Streamlit no mesmo processo:
+    python -m utils.aquecimento --porta-saude 8502 -- --server.port 8501
+A porta de saúde responde GET /pronto com 200 quando o aquecimento terminou
+(503 enquanto aquece ou se falhou), com o estado e o tempo até ficar pronto em
+JSON, para o health check só encaminhar tráfego depois do aquecimento.
+Com `streamlit run app.py` o aquecimento começa no primeiro acesso
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+_trava = threading.Lock()
+_estado = {
+    'status': 'parado',     # parado, aquecendo, pronto ou erro
+    'etapa': None,
+    'iniciado_em': None,
+    'segundos_ate_pronto': None,
+    'erro': None,
+}
+_thread = None
+
+
+def estado_aquecimento():
+    """
+    Cópia do estado atual do aquecimento
+    """
+    with _trava:
+        estado = dict(_estado)
+    if estado['status'] == 'aquecendo':
+        estado['segundos_decorridos'] = round(time.time() - estado['iniciado_em'], 3)
+    return estado
+
+
+def aquecimento_pronto():
+    return estado_aquecimento()['status'] == 'pronto'
+
+
+def _etapa(nome):
+    with _trava:
+        _estado['etapa'] = nome
+    logger.info("Aquecimento: %s", nome)
+
+
+def aquecer():
+    """
+    Executa o aquecimento na thread atual (ver iniciar_aquecimento)
+    """
+    inicio = time.perf_counter()
+    with _trava:
+        _estado.update(status='aquecendo', iniciado_em=time.time(), segundos_ate_pronto=None, erro=None)
+    try:
+        # Importados aqui: o módulo precisa subir antes do Streamlit (ver main)
+        from utils.armazem import recorte_armazem
+        from utils.cubo import cubo_dataset
+        from utils.data_loader import carregar_datasets, catalogos_filtros
+        from utils.esquema import DATASETS
+        from utils.filtros import indice_filtros
+        from utils.motor import calcular_relatorio
+
+        datasets = {}
+        for nome in DATASETS:
+            _etapa(f'carga de {nome}')
+            datasets[nome], = carregar_datasets(nome)
+
+        _etapa('catálogos da sidebar')
+        catalogos_filtros('pr', 'cr', 'par')
+
+        for nome in ('pr', 'cr', 'par'):
+            if recorte_armazem(datasets[nome]):
+                # Filtros e agregações deste dataset são consultados no armazém SQLite
+                continue
+            _etapa(f'índice e cubo de {nome}')
+            indice_filtros(datasets[nome], nome)
+            cubo_dataset(datasets[nome], nome)
+
+        _etapa('visão sem filtros')
+        calcular_relatorio(datasets)
+    except Exception as e:
+        logger.exception("Aquecimento falhou")
+        with _trava:
+            _estado.update(status='erro', erro=str(e))
+        return
+
+    segundos = round(time.perf_counter() - inicio, 3)
+    with _trava:
+        _estado.update(status='pronto', etapa=None, segundos_ate_pronto=segundos)
+    logger.info("Aquecimento concluído em %.1f s", segundos)
+
+
+def iniciar_aquecimento():
+    """
+    Inicia o aquecimento em uma thread de fundo (uma única vez por processo)
+    DASHBOARD_AQUECIMENTO=0 desliga (ex.: desenvolvimento)
+    """
+    global _thread
+    if os.environ.get('DASHBOARD_AQUECIMENTO', '1') == '0':
+        return
+    with _trava:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=aquecer, name='aquecimento', daemon=True)
+    _thread.start()
+
+
+def acompanhar_aquecimento():
+    """
+    Início de cada página: garante que o aquecimento foi disparado e, enquanto
+    ele não termina, mostra o andamento na sidebar sem bloquear a página
+    """
+    iniciar_aquecimento()
+    estado = estado_aquecimento()
+    if estado['status'] == 'aquecendo':
+        import streamlit as st
+        st.sidebar.info(f"⏳ Preparando os dados ({estado['etapa']})... a primeira consulta pode demorar.")
+
+
+class _Saude(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('/pronto', ''):
+            self.send_error(404)
+            return
+        estado = estado_aquecimento()
+        corpo = json.dumps(estado, ensure_ascii=False).encode()
+        self.send_response(200 if estado['status'] == 'pronto' else 503)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        logger.debug(formato, *args)
+
+
+def servir_saude(porta, endereco='0.0.0.0'):
+    """
+    Sobe em uma thread de fundo o endpoint de prontidão (GET /pronto)
+    """
+    servidor = ThreadingHTTPServer((endereco, porta), _Saude)
+    threading.Thread(target=servidor.serve_forever, name='saude', daemon=True).start()
+    return servidor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sobe o dashboard aquecendo os caches em segundo plano",
+        epilog="Argumentos após -- são repassados ao streamlit run (ex.: -- --server.port 8501)",
+    )
+    parser.add_argument('--script', default='app.py', help="Página principal do Streamlit")
+    parser.add_argument('--porta-saude', type=int, default=int(os.environ.get('DASHBOARD_PORTA_SAUDE', 0)),
+                        help="Porta do endpoint GET /pronto (0 = desligado)")
+    args, repassados = parser.parse_known_args(argv)
+    if repassados[:1] == ['--']:
+        repassados = repassados[1:]
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    # Streamlit no mesmo processo: os caches aquecidos são os mesmos que as páginas usam.
+    # Importado antes da thread de aquecimento, que também o importa
+    from streamlit.web import cli
+
+    if args.porta_saude:
+        servir_saude(args.porta_saude)
+        logger.info("Prontidão em http://localhost:%d/pronto", args.porta_saude)
+    iniciar_aquecimento()
+
+    sys.argv = ['streamlit', 'run', args.script] + repassados
+    sys.exit(cli.main())
+
+
+if __name__ == '__main__':
+    # Executado com -m: usa a instância importável do módulo, a mesma que as páginas
+    # importam, para que o estado e a thread de aquecimento sejam compartilhados
+    from utils.aquecimento import main as _main
+    _main()
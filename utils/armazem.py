@@ -0,0 +1,445 @@
+"""
+Armazém analítico embutido (SQLite)
+A carga grava cada relatório transacional (todas as colunas do esquema) em um
+banco local em data/.cache, e as agregações das páginas (filtro + agrupamento
++ top-N) viram SQL que devolve só o resultado pequeno que o gráfico precisa.
+Com o armazém ativo o processo não guarda os DataFrames completos: as páginas
+recebem recortes vazios só com o esquema (ver recorte_armazem) e as linhas de
+que precisam (colunas pedidas, tabelas de detalhe com LIMIT) vêm por SQL.
+Opcional: ativado com DASHBOARD_ARMAZEM=sqlite; sem ele, ou em caso de erro,
+tudo segue pelo caminho pandas (cubo / linhas filtradas)
+"""
+import os
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from utils.esquema import DATASETS
+from utils.ingest import CACHE_DIR
+from utils.metricas import MEDIDAS
+from utils.moeda import centavos_ativos, em_centavos
+
+logger = logging.getLogger(__name__)
+
+CAMINHO_ARMAZEM = os.path.join(CACHE_DIR, 'financeiro.sqlite')
+
+# Versão do formato das tabelas: incrementar regrava todas no próximo uso
+VERSAO_ARMAZEM = 2
+
+# Colunas internas de cada tabela, além das colunas do dataset
+_COLUNA_VALOR = '_valor'
+_COLUNA_CONCILIADO = '_conciliado'
+_COLUNA_DATA = '_data'
+# Posição da linha no dataset (rótulo do índice dos recortes lidos do armazém)
+_COLUNA_LINHA = '_linha'
+
+# Marca, em attrs, dos DataFrames que só têm o esquema (as linhas estão no armazém)
+ATRIBUTO_RECORTE = 'armazem'
+
+_NANOSSEGUNDOS_DIA = 86_400 * 10**9
+
+_trava_escrita = threading.Lock()
+
+# Versão do dataset (attrs['versao'] do DataFrame carregado) que a tabela contém
+_versao_sincronizada = {}
+
+
+def armazem_ativo():
+    """
+    Indica se as agregações devem ser enviadas ao armazém SQLite
+    """
+    return os.environ.get('DASHBOARD_ARMAZEM', '').lower() == 'sqlite'
+
+
+def _citar(coluna):
+    return '"' + str(coluna).replace('"', '""') + '"'
+
+
+def _tabela(nome):
+    return f'relatorio_{nome}'
+
+
+def colunas_armazem(df, nome):
+    """
+    Colunas de df guardadas no armazém (todas as do dataset normalizado)
+    """
+    return [str(coluna) for coluna in df.columns]
+
+
+def recorte_armazem(df):
+    """
+    Indica se df é um recorte do armazém: só o esquema, sem linhas em memória
+    (attrs: 'dataset', 'versao' e, depois de filtrar_dataset, 'filtros')
+    """
+    return bool(df.attrs.get(ATRIBUTO_RECORTE))
+
+
+def filtros_recorte(df):
+    """
+    Estado de filtros de um recorte do armazém (sem filtro: o dataset inteiro)
+    """
+    return df.attrs.get('filtros') or {'selecoes': {}, 'data_inicio': None, 'data_fim': None}
+
+
+def _assinatura_tabela(assinatura, centavos):
+    # A unidade do valor e o formato da tabela fazem parte da versão gravada
+    return f'{assinatura}:v{VERSAO_ARMAZEM}' + (':centavos' if centavos else '')
+
+
+def _conectar(caminho):
+    # Autocommit: as transações são abertas explicitamente onde precisam ser atômicas
+    return closing(sqlite3.connect(caminho, timeout=30, isolation_level=None))
+
+
+def _assinatura_gravada(conexao, nome):
+    conexao.execute('CREATE TABLE IF NOT EXISTS _origem (nome TEXT PRIMARY KEY, assinatura TEXT, linhas INTEGER)')
+    linha = conexao.execute('SELECT assinatura FROM _origem WHERE nome = ?', (nome,)).fetchone()
+    return linha[0] if linha else None
+
+
+def _tipo_coluna(serie):
+    """
+    Tipo pandas de uma coluna, como guardado em _colunas (categorias levam o tipo dos valores)
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return f'category:{serie.cat.categories.dtype}'
+    return str(serie.dtype)
+
+
+def _valores_sql(serie):
+    """
+    Valores de uma coluna no formato gravado: datas em nanossegundos (inteiro),
+    booleanos 0/1 e ausentes como NULL
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        datas = serie.to_numpy(dtype='datetime64[ns]')
+        return pd.Series(datas.view('int64'), dtype=object).where(~np.isnat(datas), None)
+    if pd.api.types.is_bool_dtype(serie.dtype) and not isinstance(serie.dtype, pd.CategoricalDtype):
+        return pd.Series(serie.to_numpy(dtype=np.int64, na_value=0))
+    return pd.Series(serie.astype(object).where(serie.notna(), None).to_numpy(dtype=object))
+
+
+def _restaurar_tipos(tabela, tipos):
+    """
+    Converte as colunas lidas do SQL de volta para os tipos do dataset
+    """
+    for coluna, tipo in tipos.items():
+        valores = tabela[coluna]
+        if tipo.startswith('category:'):
+            tipo_valores = tipo.split(':', 1)[1]
+            if tipo_valores not in ('object', 'str', 'string'):
+                valores = valores.astype(tipo_valores)
+            tabela[coluna] = valores.astype('category')
+        elif tipo.startswith('datetime64'):
+            tabela[coluna] = pd.to_datetime(pd.array(valores, dtype='Int64'), unit='ns').astype(tipo)
+        elif tipo == 'bool':
+            tabela[coluna] = valores.fillna(0).astype(bool)
+        else:
+            tabela[coluna] = valores.astype(tipo)
+    return tabela
+
+
+def _linhas_tabela(df, nome, centavos, inicio=0):
+    """
+    Linhas de df no formato da tabela do armazém
+    inicio: posição da primeira linha de df no dataset
+    """
+    especificacao = DATASETS[nome]
+    tabela = pd.DataFrame({coluna: _valores_sql(df[coluna]) for coluna in colunas_armazem(df, nome)})
+    valores = df[especificacao['coluna_valor']].to_numpy(dtype='float64', na_value=np.nan)
+    tabela[_COLUNA_VALOR] = np.where(np.isnan(valores), 0.0, valores)
+    if centavos:
+        tabela[_COLUNA_VALOR] = tabela[_COLUNA_VALOR].astype(np.int64)
+    if 'Conciliado' in df.columns:
+        tabela[_COLUNA_CONCILIADO] = df['Conciliado'].to_numpy(dtype=np.int64)
+    else:
+        tabela[_COLUNA_CONCILIADO] = 0
+    # Datas em nanossegundos (inteiro), como no índice de datas dos filtros
+    datas = df[especificacao['coluna_data_filtro']].to_numpy(dtype='datetime64[ns]')
+    tabela[_COLUNA_DATA] = pd.Series(datas.view('int64'), dtype=object).where(~np.isnat(datas), None)
+    tabela[_COLUNA_LINHA] = np.arange(inicio, inicio + len(df), dtype=np.int64)
+    return tabela
+
+
+def _gravar_tipos(conexao, nome, df):
+    conexao.execute('CREATE TABLE IF NOT EXISTS _colunas (nome TEXT, posicao INTEGER, coluna TEXT, tipo TEXT)')
+    conexao.execute('DELETE FROM _colunas WHERE nome = ?', (nome,))
+    conexao.executemany(
+        'INSERT INTO _colunas (nome, posicao, coluna, tipo) VALUES (?, ?, ?, ?)',
+        [(nome, posicao, str(coluna), _tipo_coluna(df[coluna])) for posicao, coluna in enumerate(df.columns)],
+    )
+
+
+def _ler_tipos(conexao, nome):
+    conexao.execute('CREATE TABLE IF NOT EXISTS _colunas (nome TEXT, posicao INTEGER, coluna TEXT, tipo TEXT)')
+    linhas = conexao.execute('SELECT coluna, tipo FROM _colunas WHERE nome = ? ORDER BY posicao', (nome,)).fetchall()
+    return dict(linhas)
+
+
+def _gravar_ancoras(conexao, nome, ancoras):
+    conexao.execute('CREATE TABLE IF NOT EXISTS _ancoras (nome TEXT PRIMARY KEY, ancoras TEXT)')
+    conexao.execute('INSERT OR REPLACE INTO _ancoras (nome, ancoras) VALUES (?, ?)',
+                    (nome, None if ancoras is None else json.dumps(ancoras)))
+
+
+def _ler_ancoras(conexao, nome):
+    conexao.execute('CREATE TABLE IF NOT EXISTS _ancoras (nome TEXT PRIMARY KEY, ancoras TEXT)')
+    linha = conexao.execute('SELECT ancoras FROM _ancoras WHERE nome = ?', (nome,)).fetchone()
+    return None if linha is None or linha[0] is None else json.loads(linha[0])
+
+
+def sincronizar(nome, df, assinatura, caminho=CAMINHO_ARMAZEM):
+    """
+    Grava o dataset normalizado no armazém quando a assinatura da origem
+    (sha256 da planilha) mudou; a tabela nova substitui a antiga na mesma transação
+    Valores em centavos são gravados como INTEGER (somas exatas no SQL)
+    """
+    especificacao = DATASETS[nome]
+    if not especificacao.get('coluna_valor'):
+        # Previsão de Faturamento (formato largo) não é consultada por SQL
+        return False
+    centavos = em_centavos(df[especificacao['coluna_valor']])
+    # Trocar a unidade (centavos) ou o formato da tabela regrava a tabela
+    assinatura = _assinatura_tabela(assinatura, centavos)
+
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with _trava_escrita, _conectar(caminho) as conexao:
+        if _assinatura_gravada(conexao, nome) == assinatura:
+            _versao_sincronizada[nome] = df.attrs.get('versao')
+            return False
+
+        tabela = _linhas_tabela(df, nome, centavos)
+        temporaria = _tabela(nome) + '_nova'
+        conexao.execute(f'DROP TABLE IF EXISTS {temporaria}')
+        tabela.to_sql(temporaria, conexao, index=False)
+
+        conexao.execute('BEGIN')
+        conexao.execute(f'DROP TABLE IF EXISTS {_tabela(nome)}')
+        conexao.execute(f'ALTER TABLE {temporaria} RENAME TO {_tabela(nome)}')
+        conexao.execute(f'CREATE INDEX idx_{nome}_data ON {_tabela(nome)} ({_COLUNA_DATA})')
+        _gravar_tipos(conexao, nome, df)
+        # Âncoras da leitura (exportação cumulativa): a recarga seguinte pode ser incremental
+        _gravar_ancoras(conexao, nome, df.attrs.get('ancoras'))
+        conexao.execute(
+            'INSERT OR REPLACE INTO _origem (nome, assinatura, linhas) VALUES (?, ?, ?)',
+            (nome, assinatura, len(tabela)),
+        )
+        conexao.execute('COMMIT')
+        _versao_sincronizada[nome] = df.attrs.get('versao')
+    logger.info("Armazém atualizado para %s (%d linhas)", nome, len(df))
+    return True
+
+
+def anexar(nome, novas, inicio, versao_anterior, versao, assinatura, caminho=CAMINHO_ARMAZEM):
+    """
+    Grava as linhas novas (já normalizadas) de uma exportação cumulativa depois
+    das `inicio` linhas já gravadas, quando a tabela contém exatamente a versão
+    anterior do dataset; `versao` passa a ser a versão sincronizada e as
+    âncoras de novas.attrs['ancoras'] as da tabela
+    Retorna False quando isso não pode ser garantido: use sincronizar
+    """
+    especificacao = DATASETS[nome]
+    if not especificacao.get('coluna_valor') or _versao_sincronizada.get(nome) != versao_anterior:
+        return False
+    centavos = em_centavos(novas[especificacao['coluna_valor']])
+    assinatura = _assinatura_tabela(assinatura, centavos)
+
+    with _trava_escrita, _conectar(caminho) as conexao:
+        conexao.execute('CREATE TABLE IF NOT EXISTS _origem (nome TEXT PRIMARY KEY, assinatura TEXT, linhas INTEGER)')
+        linha = conexao.execute('SELECT linhas FROM _origem WHERE nome = ?', (nome,)).fetchone()
+        if linha is None or linha[0] != inicio or list(_ler_tipos(conexao, nome)) != colunas_armazem(novas, nome):
+            return False
+
+        tabela = _linhas_tabela(novas, nome, centavos, inicio)
+        colunas = ', '.join(_citar(coluna) for coluna in tabela.columns)
+        temporaria = _tabela(nome) + '_anexo'
+        conexao.execute(f'DROP TABLE IF EXISTS {temporaria}')
+        tabela.to_sql(temporaria, conexao, index=False)
+
+        conexao.execute('BEGIN')
+        conexao.execute(f'INSERT INTO {_tabela(nome)} ({colunas}) SELECT {colunas} FROM {temporaria}')
+        conexao.execute(
+            'UPDATE _origem SET assinatura = ?, linhas = ? WHERE nome = ?', (assinatura, inicio + len(tabela), nome)
+        )
+        _gravar_ancoras(conexao, nome, novas.attrs.get('ancoras'))
+        conexao.execute('COMMIT')
+        conexao.execute(f'DROP TABLE {temporaria}')
+        _versao_sincronizada[nome] = versao
+    logger.info("Armazém: %d linhas anexadas a %s", len(tabela), nome)
+    return True
+
+
+def recorte_sincronizado(nome, assinatura, versao, caminho=CAMINHO_ARMAZEM):
+    """
+    Recorte (só o esquema) do dataset se a tabela já contém a planilha com
+    essa assinatura, sem ler o relatório; None se precisa ser sincronizada
+    versao: versão do dataset que a tabela passa a representar
+    """
+    if not os.path.exists(caminho):
+        return None
+    with _conectar(caminho) as conexao:
+        if _assinatura_gravada(conexao, nome) != _assinatura_tabela(assinatura, centavos_ativos()):
+            return None
+        tipos = _ler_tipos(conexao, nome)
+    if not tipos:
+        return None
+    _versao_sincronizada[nome] = versao
+    return recorte_vazio(nome, versao, caminho)
+
+
+def recorte_vazio(nome, versao, caminho=CAMINHO_ARMAZEM):
+    """
+    DataFrame sem linhas com as colunas e os tipos do dataset gravado,
+    marcado como recorte do armazém (com as âncoras da última leitura, se houver)
+    """
+    with _conectar(caminho) as conexao:
+        tipos = _ler_tipos(conexao, nome)
+        ancoras = _ler_ancoras(conexao, nome)
+    recorte = _restaurar_tipos(pd.DataFrame({coluna: pd.Series([], dtype=object) for coluna in tipos}), tipos)
+    recorte.attrs.update({ATRIBUTO_RECORTE: True, 'dataset': nome, 'versao': versao})
+    if ancoras is not None:
+        recorte.attrs['ancoras'] = ancoras
+    return recorte
+
+
+def ler_linhas(nome, filtros, colunas=None, condicao=None, limite=None, caminho=CAMINHO_ARMAZEM):
+    """
+    Linhas do dataset que atendem ao estado de filtros, na ordem do relatório
+    colunas: colunas devolvidas (None = todas)
+    condicao: expressão SQL adicional sobre as colunas (ver filtros.CONDICOES)
+    limite: no máximo N linhas (tabelas de detalhe)
+    Retorna DataFrame com os tipos do dataset, indexado pela posição da linha
+    """
+    with _conectar(caminho) as conexao:
+        tipos = _ler_tipos(conexao, nome)
+        colunas = list(tipos) if colunas is None else list(colunas)
+        condicoes, parametros = _clausula_where(nome, filtros)
+        if condicao:
+            condicoes.append(f'({condicao})')
+        selecao = ', '.join([_COLUNA_LINHA] + [_citar(coluna) for coluna in colunas])
+        sql = f'SELECT {selecao} FROM {_tabela(nome)}'
+        if condicoes:
+            sql += ' WHERE ' + ' AND '.join(condicoes)
+        # rowid segue a ordem de gravação (a do relatório), sem ordenar
+        sql += ' ORDER BY rowid'
+        if limite is not None:
+            sql += f' LIMIT {int(limite)}'
+        linhas = pd.read_sql_query(sql, conexao, params=parametros)
+
+    linhas = _restaurar_tipos(linhas, {coluna: tipos[coluna] for coluna in colunas})
+    return linhas.set_index(_COLUNA_LINHA).rename_axis(None)
+
+
+def somas_por_dia(nome, filtros, caminho=CAMINHO_ARMAZEM):
+    """
+    Soma do valor por dia da data do filtro (só dias com lançamentos)
+    Retorna (dias desde 1970-01-01, somas) em arrays ordenados por dia
+    """
+    condicoes, parametros = _clausula_where(nome, filtros)
+    condicoes.append(f'{_COLUNA_DATA} IS NOT NULL')
+    # Divisão inteira arredondando para baixo também antes de 1970
+    dia = (f'({_COLUNA_DATA} / {_NANOSSEGUNDOS_DIA} '
+           f'- ({_COLUNA_DATA} < 0 AND {_COLUNA_DATA} % {_NANOSSEGUNDOS_DIA} != 0))')
+    sql = (f'SELECT {dia} AS dia, SUM({_COLUNA_VALOR}) AS valor FROM {_tabela(nome)} '
+           f"WHERE {' AND '.join(condicoes)} GROUP BY dia ORDER BY dia")
+    with _conectar(caminho) as conexao:
+        resultado = conexao.execute(sql, parametros).fetchall()
+    dias = np.array([linha[0] for linha in resultado], dtype=np.int64)
+    somas = np.array([linha[1] for linha in resultado], dtype='float64')
+    return dias, somas
+
+
+def limites_datas(nome, caminho=CAMINHO_ARMAZEM):
+    """
+    Menor e maior data do filtro de período no dataset gravado (None se não houver)
+    """
+    with _conectar(caminho) as conexao:
+        menor, maior = conexao.execute(f'SELECT MIN({_COLUNA_DATA}), MAX({_COLUNA_DATA}) FROM {_tabela(nome)}').fetchone()
+    if menor is None:
+        return None
+    return pd.Timestamp(menor), pd.Timestamp(maior)
+
+
+def em_sincronia(nome, df):
+    """
+    Indica se a tabela do armazém contém a mesma versão que df
+    Depois de uma recarga, execuções que ainda usam a versão antiga seguem pelo
+    caminho pandas; DataFrames sem versão (ex.: motor em lote) não são conferidos
+    """
+    versao = df.attrs.get('versao')
+    return versao is None or _versao_sincronizada.get(nome) == versao
+
+
+def _clausula_where(nome, filtros):
+    """
+    WHERE com os critérios do estado de filtros que se aplicam ao dataset
+    """
+    dimensoes = DATASETS[nome]['dimensoes']
+    condicoes = []
+    parametros = []
+    for dimensao, valores in filtros['selecoes'].items():
+        coluna = dimensoes.get(dimensao)
+        if valores and coluna:
+            condicoes.append(f"{_citar(coluna)} IN ({', '.join('?' * len(valores))})")
+            parametros.extend(str(valor) for valor in valores)
+    if filtros.get('data_inicio') is not None and filtros.get('data_fim') is not None:
+        condicoes.append(f'{_COLUNA_DATA} BETWEEN ? AND ?')
+        parametros.extend([pd.Timestamp(filtros['data_inicio']).value, pd.Timestamp(filtros['data_fim']).value])
+    return condicoes, parametros
+
+
+def consultar(nome, filtros, por=(), ordenar_por=None, limite=None, caminho=CAMINHO_ARMAZEM):
+    """
+    Agrega no armazém as medidas do cubo para o estado de filtros
+    por: colunas de agrupamento (vazio = métricas de cabeçalho)
+    ordenar_por/limite: top-N calculado no próprio SQL (ordem decrescente)
+    Retorna no mesmo formato de utils.cubo.agregar
+    """
+    por = list(por)
+    if ordenar_por is not None and ordenar_por not in MEDIDAS:
+        raise ValueError(f"Medida desconhecida: {ordenar_por}")
+    condicoes, parametros = _clausula_where(nome, filtros)
+    condicoes.extend(f'{_citar(coluna)} IS NOT NULL' for coluna in por)
+
+    selecao = [_citar(coluna) for coluna in por] + [
+        'COUNT(*) AS quantidade',
+        f'COALESCE(SUM({_COLUNA_VALOR}), 0.0) AS valor',
+        f'COALESCE(SUM({_COLUNA_CONCILIADO}), 0) AS conciliados',
+        f'COALESCE(SUM(CASE WHEN {_COLUNA_CONCILIADO} = 1 THEN {_COLUNA_VALOR} ELSE 0.0 END), 0.0) AS valor_conciliado',
+        f'COALESCE(SUM(CASE WHEN {_COLUNA_CONCILIADO} = 1 THEN 0.0 ELSE {_COLUNA_VALOR} END), 0.0) AS valor_nao_conciliado',
+        f'MIN({_COLUNA_DATA}) AS data_min',
+        f'MAX({_COLUNA_DATA}) AS data_max',
+    ]
+    sql = f"SELECT {', '.join(selecao)} FROM {_tabela(nome)}"
+    if condicoes:
+        sql += ' WHERE ' + ' AND '.join(condicoes)
+    if por:
+        colunas = ', '.join(_citar(coluna) for coluna in por)
+        sql += f' GROUP BY {colunas}'
+        sql += f' ORDER BY {ordenar_por} DESC, {colunas}' if ordenar_por else f' ORDER BY {colunas}'
+        if limite is not None:
+            sql += f' LIMIT {int(limite)}'
+
+    with _conectar(caminho) as conexao:
+        resultado = pd.read_sql_query(sql, conexao, params=parametros)
+
+    if not por:
+        linha = resultado.iloc[0]
+        quantidade = int(linha['quantidade'])
+        conciliados = int(linha['conciliados'])
+        return {
+            'quantidade': quantidade,
+            'valor': float(linha['valor']),
+            'conciliados': conciliados,
+            'valor_conciliado': float(linha['valor_conciliado']),
+            'nao_conciliados': quantidade - conciliados,
+            'valor_nao_conciliado': float(linha['valor_nao_conciliado']),
+            'data_min': None if pd.isna(linha['data_min']) else pd.Timestamp(int(linha['data_min'])),
+            'data_max': None if pd.isna(linha['data_max']) else pd.Timestamp(int(linha['data_max'])),
+        }
+    return resultado.set_index(por)[MEDIDAS]
@@ -0,0 +1,254 @@
+"""
+Suíte de benchmark do dashboard
+Mede, sobre dados sintéticos em várias escalas, a carga dos relatórios,
+os filtros da sidebar em combinações representativas, a tabela de vencimentos
+e os blocos de agregação das páginas (Top 10, inclusive em fluxo sobre o
+Parquet, taxas por empresa, evolução mensal, previsão). Grava JSON e compara com um baseline, apontando
+lentidões acima de um limite.
+
+Uso:
+    python -m utils.benchmark --saida benchmark.json
+    python -m utils.benchmark --escalas 10000 100000 1000000 10000000
+    python -m utils.benchmark --saida atual.json --comparar benchmark.json --limite 0.2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.cubo import agregar, construir_cubo, cubo_dataset
+from utils.esquema import DATASETS
+from utils.filtros import IndiceFiltros, cache_filtros, filtrar_dataset, montar_filtros
+from utils.metricas import taxas_por_grupo
+from utils.helpers import criar_tabela_vencimentos
+from utils.motor import calcular_relatorio, carregar_dados, limites_periodo, mascara_conformidade, resumir_previsao
+from utils.sintetico import gerar_datasets, salvar_datasets
+from utils.topk import blocos_parquet, top_k_em_fluxo
+
+ESCALAS_PADRAO = [10_000, 100_000, 1_000_000]
+AS_OF = pd.Timestamp('2025-10-15')
+
+
+def cronometrar(funcao, repeticoes=5, preparar=None):
+    """
+    Executa a função repetidas vezes e retorna os tempos em segundos
+    preparar (opcional) roda antes de cada repetição, fora da medição
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return {
+        'mediana_s': statistics.median(tempos),
+        'min_s': min(tempos),
+        'max_s': max(tempos),
+        'repeticoes': repeticoes,
+    }
+
+
+def estados_representativos(datasets):
+    """
+    Combinações de filtros típicas da sidebar, montadas a partir dos dados:
+    sem filtro, grupo, grupo + empresa, categorias + período em meses e período em dias
+    """
+    pr = datasets['pr']
+    data_min, data_max = limites_periodo(datasets)
+    grupo = pr['Grupo'].value_counts().index[0]
+    empresa = pr.loc[pr['Grupo'] == grupo, 'Minha Empresa (Nome Fantasia)'].value_counts().index[0]
+    categorias = pr['Categoria'].value_counts().index[:3].tolist()
+    meio = data_min + (data_max - data_min) / 2
+    inicio_mes = meio.to_period('M').start_time
+    return {
+        'sem_filtro': montar_filtros('Todos', 'Todas', [], [], data_min, data_max),
+        'grupo': montar_filtros(grupo, 'Todas', [], [], data_min, data_max),
+        'grupo_empresa': montar_filtros(grupo, empresa, [], [], data_min, data_max),
+        'categorias_periodo': montar_filtros(
+            'Todos', 'Todas', [], categorias, inicio_mes, (inicio_mes + pd.DateOffset(months=3)) - pd.Timedelta(days=1)
+        ),
+        'periodo_dias': montar_filtros(
+            'Todos', 'Todas', [], [], meio - pd.Timedelta(days=45), meio + pd.Timedelta(days=17)
+        ),
+    }
+
+
+def _filtrar_todos(datasets, filtros):
+    return {
+        nome: filtrar_dataset(datasets[nome], nome, filtros['selecoes'], filtros['data_inicio'], filtros['data_fim'])
+        for nome in ('pr', 'cr', 'par')
+    }
+
+
+def medir_escala(linhas, repeticoes=5, seed=0):
+    """
+    Todos os casos de benchmark para uma escala (linhas de Pagamentos Realizados)
+    """
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        salvar_datasets(gerar_datasets(linhas, seed=seed), pasta, 'parquet')
+        cache_dir = os.path.join(pasta, '.cache')
+
+        resultados['carga'] = cronometrar(
+            lambda: carregar_dados(data_dir=pasta, cache_dir=cache_dir), repeticoes=min(repeticoes, 3)
+        )
+        datasets = carregar_dados(data_dir=pasta, cache_dir=cache_dir)
+
+        # Top 10 fornecedores lendo o Parquet em blocos, com memória limitada por partições
+        caminho_pr = os.path.join(pasta, os.path.splitext(DATASETS['pr']['arquivo'])[0] + '.parquet')
+        colunas_fluxo = ['Fornecedor', DATASETS['pr']['coluna_valor']]
+        resultados['top10_fluxo'] = cronometrar(lambda: top_k_em_fluxo(
+            lambda: blocos_parquet(caminho_pr, colunas_fluxo, linhas_por_bloco=max(linhas // 4, 1)),
+            *colunas_fluxo, 10, particoes=4,
+        ), min(repeticoes, 3))
+
+    pr = datasets['pr']
+    especificacao = DATASETS['pr']
+    resultados['indice_filtros'] = cronometrar(
+        lambda: IndiceFiltros(pr, especificacao['dimensoes'], especificacao['coluna_data_filtro']), repeticoes
+    )
+    resultados['cubo'] = cronometrar(lambda: construir_cubo(pr, 'pr'), repeticoes)
+
+    estados = estados_representativos(datasets)
+    for nome_estado, filtros in estados.items():
+        # Sem cache de filtros: mede a resolução completa do estado
+        resultados[f'filtros_{nome_estado}'] = cronometrar(
+            lambda: _filtrar_todos(datasets, filtros), repeticoes, preparar=cache_filtros.limpar
+        )
+
+    # Blocos das páginas medidos com índice e cubo já construídos, como após a carga
+    for nome in ('pr', 'cr', 'par'):
+        cubo_dataset(datasets[nome], nome)
+    filtros = estados['grupo']
+    filtrados = _filtrar_todos(datasets, filtros)
+    pr_filtrado, par_filtrado = filtrados['pr'], filtrados['par']
+    filtros_dias = estados['periodo_dias']
+    filtrados_dias = _filtrar_todos(datasets, filtros_dias)
+
+    resultados['vencimentos'] = cronometrar(
+        lambda: criar_tabela_vencimentos(par_filtrado, 'Vencimento', 'Valor Líquido', as_of=AS_OF), repeticoes
+    )
+    resultados['top10_cubo'] = cronometrar(lambda: (
+        agregar(pr, pr_filtrado, 'pr', filtros, 'Categoria', 'valor', limite=10),
+        agregar(pr, pr_filtrado, 'pr', filtros, 'Fornecedor', 'valor', limite=10),
+    ), repeticoes)
+    resultados['top10_linhas'] = cronometrar(lambda: (
+        agregar(pr, filtrados_dias['pr'], 'pr', filtros_dias, 'Categoria', 'valor', limite=10),
+        agregar(pr, filtrados_dias['pr'], 'pr', filtros_dias, 'Fornecedor', 'valor', limite=10),
+    ), repeticoes)
+    resultados['taxa_conciliacao_empresa'] = cronometrar(lambda: taxas_por_grupo(
+        pr_filtrado, 'Conciliado', 'Minha Empresa (Nome Fantasia)'
+    ), repeticoes)
+    resultados['taxa_conformidade_empresa'] = cronometrar(lambda: taxas_por_grupo(
+        pr_filtrado, mascara_conformidade(pr_filtrado), 'Minha Empresa (Nome Fantasia)'
+    ), repeticoes)
+    # Várias dimensões de uma vez, com valores: empresa x fornecedor
+    resultados['taxa_empresa_fornecedor'] = cronometrar(lambda: taxas_por_grupo(
+        pr_filtrado, 'Conciliado', ['Minha Empresa (Nome Fantasia)', 'Fornecedor'],
+        valores=DATASETS['pr']['coluna_valor'],
+    ), repeticoes)
+    resultados['evolucao_mensal'] = cronometrar(
+        lambda: agregar(pr, pr_filtrado, 'pr', filtros, 'Mes_Ano', 'valor'), repeticoes
+    )
+    resultados['previsao_melt'] = cronometrar(lambda: resumir_previsao(datasets['pf'], 0.0), repeticoes)
+    resultados['relatorio_completo'] = cronometrar(
+        lambda: calcular_relatorio(datasets, {}, as_of=AS_OF), min(repeticoes, 3), preparar=cache_filtros.limpar
+    )
+    return resultados
+
+
+def executar(escalas=None, repeticoes=5, seed=0, progresso=None):
+    escalas = escalas or ESCALAS_PADRAO
+    resultado = {
+        'meta': {
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'seed': seed,
+            'repeticoes': repeticoes,
+        },
+        'escalas': {},
+    }
+    for linhas in escalas:
+        if progresso:
+            progresso(f"Escala {linhas:,} linhas...")
+        resultado['escalas'][str(linhas)] = medir_escala(linhas, repeticoes, seed)
+    return resultado
+
+
+def comparar(atual, baseline, limite=0.2, piso_s=0.001):
+    """
+    Compara as medianas com as do baseline
+    Retorna a lista de regressões: casos mais lentos que baseline * (1 + limite);
+    tempos abaixo de piso_s são ignorados (ruído de medição)
+    """
+    regressoes = []
+    for escala, casos in atual['escalas'].items():
+        casos_base = baseline.get('escalas', {}).get(escala, {})
+        for caso, medida in casos.items():
+            if caso not in casos_base:
+                continue
+            antes = casos_base[caso]['mediana_s']
+            depois = medida['mediana_s']
+            if max(antes, depois) < piso_s:
+                continue
+            if depois > antes * (1 + limite):
+                regressoes.append({
+                    'escala': escala, 'caso': caso,
+                    'baseline_s': antes, 'atual_s': depois,
+                    'variacao': depois / antes - 1 if antes > 0 else float('inf'),
+                })
+    return regressoes
+
+
+def _imprimir(resultado):
+    for escala, casos in resultado['escalas'].items():
+        print(f"\n== {int(escala):,} linhas")
+        for caso, medida in casos.items():
+            print(f"  {caso:28s} {medida['mediana_s'] * 1000:10.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de carga, filtros e agregações do dashboard")
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS_PADRAO,
+                        help="Linhas de Pagamentos Realizados (os demais relatórios seguem a proporção real)")
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--saida', default='benchmark.json')
+    parser.add_argument('--comparar', help="JSON de baseline para comparação")
+    parser.add_argument('--limite', type=float, default=0.2, help="Lentidão tolerada (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    resultado = executar(args.escalas, args.repeticoes, args.seed, progresso=print)
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    _imprimir(resultado)
+    print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressoes = comparar(resultado, baseline, args.limite)
+        if regressoes:
+            print(f"\n{len(regressoes)} regressão(ões) acima de {args.limite:.0%}:")
+            for item in regressoes:
+                print(f"  {int(item['escala']):>10,} {item['caso']:28s} "
+                      f"{item['baseline_s'] * 1000:9.2f} ms -> {item['atual_s'] * 1000:9.2f} ms "
+                      f"(+{item['variacao']:.0%})")
+            sys.exit(1)
+        print(f"\nSem regressões acima de {args.limite:.0%}")
+
+
+if __name__ == '__main__':
+    main()
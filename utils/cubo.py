@@ -0,0 +1,265 @@
+"""
+Cubo OLAP mensal pré-agregado
+Construído uma vez por dataset com as medidas de valor, quantidade e conciliação
+(e a menor/maior data de cada célula) por mês × grupo × empresa × Grupo.1 ×
+categoria × contraparte.
+KPIs e gráficos leem do cubo sempre que o período cobre meses inteiros;
+períodos que cortam um mês no meio usam as linhas já filtradas
+"""
+import sqlite3
+import logging
+
+import numpy as np
+import pandas as pd
+
+from utils import armazem
+from utils.desempenho import medido
+from utils.esquema import DATASETS
+from utils.filtros import estrutura_por_dataset, indice_filtros
+from utils.metricas import MEDIDAS, calcular_metricas, colunas_kernel, resumir_metricas
+from utils.moeda import em_centavos, medidas_em_reais
+from utils.topk import top_k, top_k_agrupado
+
+logger = logging.getLogger(__name__)
+
+
+def _colunas_dimensao(df, nome):
+    especificacao = DATASETS[nome]
+    colunas = ['Mes_Ano'] + list(especificacao['dimensoes'].values()) + [especificacao['coluna_contraparte']]
+    return [coluna for coluna in dict.fromkeys(colunas) if coluna in df.columns]
+
+
+def _base_medidas(df, nome, dimensoes):
+    """
+    Uma linha por registro com as dimensões pedidas e as medidas já calculadas
+    """
+    valores, conciliado, _ = colunas_kernel(df, nome)
+
+    base = df[dimensoes].copy()
+    base['valor'] = valores
+    base['quantidade'] = np.ones(len(df), dtype=np.int32)
+    base['conciliados'] = conciliado.astype(np.int32)
+    base['valor_conciliado'] = np.where(conciliado, valores, 0.0)
+    base['valor_nao_conciliado'] = np.where(conciliado, 0.0, valores)
+    return base
+
+
+def construir_cubo(df, nome):
+    """
+    Agrega o dataset inteiro nas dimensões do cubo
+    Mantém grupos com dimensões ausentes (NaN) para que os totais fechem
+    """
+    dimensoes = _colunas_dimensao(df, nome)
+    base = _base_medidas(df, nome, dimensoes)
+    agregacoes = {medida: (medida, 'sum') for medida in MEDIDAS}
+
+    coluna_data = DATASETS[nome]['coluna_data_filtro']
+    if coluna_data in df.columns:
+        base['data'] = df[coluna_data].to_numpy()
+        agregacoes['data_min'] = ('data', 'min')
+        agregacoes['data_max'] = ('data', 'max')
+
+    return base.groupby(dimensoes, observed=True, dropna=False, sort=False).agg(**agregacoes).reset_index()
+
+
+def estender_cubo(cubo, df, nome, inicio):
+    """
+    Cubo de df a partir do cubo das suas primeiras `inicio` linhas (exportação
+    cumulativa): só as linhas novas são agregadas, e as células resultantes são
+    somadas às existentes (a ordem das células é a mesma de construir_cubo)
+    """
+    novo = construir_cubo(df.iloc[inicio:], nome)
+    anterior = cubo.copy()
+    for coluna in novo.columns:
+        if isinstance(novo[coluna].dtype, pd.CategoricalDtype):
+            anterior[coluna] = anterior[coluna].cat.set_categories(novo[coluna].cat.categories)
+
+    agregacoes = {medida: (medida, 'sum') for medida in MEDIDAS}
+    if 'data_min' in cubo.columns:
+        agregacoes['data_min'] = ('data_min', 'min')
+        agregacoes['data_max'] = ('data_max', 'max')
+    dimensoes = _colunas_dimensao(df, nome)
+    combinado = pd.concat([anterior, novo], ignore_index=True)
+    return combinado.groupby(dimensoes, observed=True, dropna=False, sort=False).agg(**agregacoes).reset_index()
+
+
+def cubo_dataset(df, nome):
+    """
+    Cubo de um dataset, construído uma vez por objeto DataFrame
+    """
+    return estrutura_por_dataset(df, nome, 'cubo', construir_cubo)
+
+
+def meses_do_periodo(df, nome, data_inicio, data_fim):
+    """
+    Verifica se o período pode ser atendido pelo cubo
+    Isso acontece quando o intervalo em dias seleciona exatamente as mesmas linhas
+    que os meses inteiros que ele toca (contagem pelo índice ordenado de datas)
+    Retorna (mes_inicio, mes_fim) em yyyymm, () sem filtro de período,
+    ou None quando o período precisa das linhas
+    """
+    datas = indice_filtros(df, nome).datas
+    if datas is None or data_inicio is None or data_fim is None:
+        return ()
+
+    inicio = pd.Timestamp(data_inicio)
+    fim = pd.Timestamp(data_fim)
+    inicio_mes = inicio.to_period('M').start_time
+    fim_mes = fim.to_period('M').end_time
+
+    contagem_dias = datas.contagem(np.datetime64(inicio, 'ns'), np.datetime64(fim, 'ns'))
+    contagem_meses = datas.contagem(np.datetime64(inicio_mes, 'ns'), np.datetime64(fim_mes, 'ns'))
+    if contagem_dias != contagem_meses:
+        return None
+    return (inicio.year * 100 + inicio.month, fim.year * 100 + fim.month)
+
+
+def selecionar_cubo(df, nome, filtros, por=()):
+    """
+    Células do cubo que atendem ao estado de filtros
+    Retorna None quando o cubo não atende (período em dias ou coluna fora do cubo)
+    """
+    meses = meses_do_periodo(df, nome, filtros['data_inicio'], filtros['data_fim'])
+    if meses is None:
+        return None
+
+    cubo = cubo_dataset(df, nome)
+    if any(coluna not in cubo.columns for coluna in por):
+        return None
+
+    mascara = np.ones(len(cubo), dtype=bool)
+    dimensoes = DATASETS[nome]['dimensoes']
+    for dimensao, valores in filtros['selecoes'].items():
+        coluna = dimensoes.get(dimensao)
+        if valores and coluna in cubo.columns:
+            mascara &= cubo[coluna].isin(valores).to_numpy()
+    if meses:
+        mes = cubo['Mes_Ano'].to_numpy()
+        mascara &= (mes >= meses[0]) & (mes <= meses[1])
+
+    return cubo[mascara]
+
+
+def consultar_cubo(df, nome, filtros, por):
+    """
+    Agrega as medidas do cubo pelo estado de filtros
+    Retorna None quando o cubo não atende (período em dias ou coluna fora do cubo)
+    """
+    selecionado = selecionar_cubo(df, nome, filtros, por)
+    if selecionado is None:
+        return None
+    if not por:
+        return resumir_metricas(selecionado)
+    return selecionado.groupby(por, observed=True)[MEDIDAS].sum()
+
+
+def _top_k_medida(df, df_filtrado, nome, filtros, coluna, medida, limite):
+    """
+    Os N maiores grupos de uma coluna por uma medida, sem agregar todas as
+    medidas nem ordenar todos os grupos (somas por código + seleção parcial),
+    a partir das células do cubo ou das linhas filtradas
+    """
+    if medida not in MEDIDAS:
+        raise KeyError(medida)
+    base = selecionar_cubo(df, nome, filtros, [coluna])
+    if base is not None:
+        return top_k_agrupado(base[coluna], base[medida], limite).rename(medida)
+
+    # Linhas filtradas: só a medida pedida é calculada
+    valores, conciliado, _ = colunas_kernel(df_filtrado, nome)
+    pesos = {
+        'valor': lambda: valores,
+        'quantidade': lambda: np.ones(len(valores)),
+        'conciliados': lambda: conciliado.astype('float64'),
+        'valor_conciliado': lambda: np.where(conciliado, valores, 0.0),
+        'valor_nao_conciliado': lambda: np.where(conciliado, 0.0, valores),
+    }[medida]()
+    return top_k_agrupado(df_filtrado[coluna], pesos, limite).rename(medida)
+
+
+def _consultar_armazem(df, nome, filtros, por, medida, limite):
+    """
+    Envia a agregação ao armazém SQLite quando ativo
+    Retorna None (caminho pandas) se inativo, se o armazém já tem outra versão do dataset, se a coluna não estiver no armazém ou em erro
+    Um recorte do armazém (sem linhas em memória) não tem caminho pandas: é
+    sempre consultado no banco, e erros são propagados
+    """
+    recorte = armazem.recorte_armazem(df)
+    if not armazem.armazem_ativo() or not (recorte or armazem.em_sincronia(nome, df)):
+        return None
+    if any(coluna not in armazem.colunas_armazem(df, nome) for coluna in por):
+        return None
+    try:
+        return armazem.consultar(nome, filtros, por, ordenar_por=medida if limite else None, limite=limite)
+    except sqlite3.Error as e:
+        if recorte:
+            raise
+        logger.warning("Armazém indisponível para %s, usando pandas: %s", nome, e)
+        return None
+
+
+def _nome_agregacao(df, df_filtrado, nome, filtros, por=None, *args, **kwargs):
+    return f'agregar {nome}' + (f' por {por}' if por else '')
+
+
+@medido(_nome_agregacao, linhas_entrada=lambda args, kwargs: len(args[1]))
+def agregar(df, df_filtrado, nome, filtros, por=None, medida=None, limite=None, relatorio=None):
+    """
+    Agrega as medidas de um dataset pelo estado de filtros
+    Ordem de tentativa: relatório pré-calculado (se informado), armazém SQLite
+    (se ativo), cubo (quando o estado permite) e, por fim, as linhas filtradas
+
+    por: coluna ou lista de colunas de agrupamento
+    (None = métricas de cabeçalho, no formato de utils.metricas)
+    medida: devolve só essa medida; 'valor' vem nomeada com a coluna de valor
+    (ex.: 'Pago ou Recebido'), como em um groupby direto.
+    Uma lista de medidas devolve um DataFrame com essas colunas
+    limite: com por e medida, devolve só os N maiores valores da medida
+    (a primeira, se for lista); equivale a sort_values(ascending=False).head(N),
+    mas por seleção parcial (utils/topk.py), sem ordenar todos os grupos
+    Valores sempre em reais: com a coluna de valor em centavos, as somas são
+    feitas em centavos (exatas) e convertidas só no resultado
+    relatorio: resultado do lote para este estado de filtros
+    (motor.ler_relatorio_precomputado); usado quando tem a agregação pedida
+    """
+    por = [] if por is None else ([por] if isinstance(por, str) else list(por))
+    if limite is not None and (not por or medida is None):
+        raise ValueError("limite exige por e medida")
+    if relatorio is not None:
+        # Import tardio: o motor usa este módulo
+        from utils.motor import resultado_precomputado
+
+        resultado = resultado_precomputado(relatorio, nome, por[0] if len(por) == 1 else (por or None), medida, limite)
+        if resultado is not None:
+            return resultado
+    coluna_valor = DATASETS[nome]['coluna_valor']
+    centavos = coluna_valor in df.columns and em_centavos(df[coluna_valor])
+
+    if limite is not None and len(por) == 1 and isinstance(medida, str) and not armazem.armazem_ativo():
+        selecionado = _top_k_medida(df, df_filtrado, nome, filtros, por[0], medida, limite)
+        if centavos:
+            selecionado = medidas_em_reais(selecionado, medida)
+        if medida == 'valor':
+            selecionado = selecionado.rename(DATASETS[nome]['coluna_valor'])
+        return selecionado
+
+    ordenar_por = medida if isinstance(medida, str) else (medida[0] if medida else None)
+    resultado = _consultar_armazem(df, nome, filtros, por, ordenar_por, limite)
+    if resultado is None:
+        resultado = consultar_cubo(df, nome, filtros, por)
+    if resultado is None:
+        if por:
+            resultado = _base_medidas(df_filtrado, nome, por).groupby(por, observed=True)[MEDIDAS].sum()
+        else:
+            resultado = calcular_metricas(df_filtrado, nome)
+    if centavos:
+        resultado = medidas_em_reais(resultado)
+
+    if medida is None:
+        return resultado
+    selecionado = resultado[medida]
+    if limite is not None:
+        selecionado = top_k(selecionado, limite, coluna=ordenar_por if isinstance(medida, list) else None)
+    if medida == 'valor' and por:
+        selecionado = selecionado.rename(DATASETS[nome]['coluna_valor'])
+    return selecionado
@@ -0,0 +1,316 @@
+"""
+Carregador de dados compartilhado entre todas as páginas
+Mantém uma única cópia em memória de cada dataset por processo,
+compartilhada entre páginas e sessões (somente leitura).
+Cada dataset é carregado na primeira página que o pede; a sidebar usa
+só os catálogos de filtros (colunas de dimensão e data).
+
+Recarga a quente: cada dataset tem uma versão corrente (tamanho e mtime do
+arquivo de origem) e as cargas em cache são por (dataset, versão). Um
+observador em segundo plano confere data/ periodicamente; quando um arquivo
+muda (e fica estável por um ciclo), a nova versão é carregada por inteiro e só
+então passa a ser a corrente. Execuções em andamento terminam com os objetos
+da versão antiga; as seguintes recebem a nova. Índices, cubo e cache de
+filtros são por objeto DataFrame e o cache de figuras é pelo conteúdo, então
+nada precisa ser esvaziado.
+Datasets de exportação cumulativa (com 'chave_linha' no esquema) são
+atualizados de forma incremental: só as linhas acrescentadas ao arquivo são
+lidas e normalizadas, e o índice de filtros, o cubo e o armazém da versão
+anterior são estendidos com elas
+Com o armazém SQLite ativo (DASHBOARD_ARMAZEM=sqlite) os datasets
+transacionais não ficam em memória: a carga grava o relatório no armazém e
+devolve um recorte só com o esquema, e filtros, agregações e linhas de detalhe
+são consultados por SQL. Se o armazém falhar, a carga volta ao DataFrame
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+import weakref
+
+import streamlit as st
+
+from utils import armazem
+from utils.cubo import estender_cubo
+from utils.desempenho import medido
+from utils.esquema import DATASETS
+from utils.filtros import catalogo_filtros, estender_estrutura, estender_indice
+from utils.ingest import (
+    anexar_linhas, assinatura_relatorio, ler_incremento, ler_relatorio, memoria_mb, normalizar_relatorio,
+    versao_relatorio,
+)
+
+logger = logging.getLogger(__name__)
+
+# Intervalo do observador de data/ em segundos (0 desliga a recarga a quente)
+INTERVALO_RECARGA = float(os.environ.get('DASHBOARD_INTERVALO_RECARGA', 10))
+
+# Versão corrente de cada dataset já usado no processo
+_versoes = {}
+_trava_versoes = threading.Lock()
+_observador = None
+
+# Datasets em memória por (nome, versão), para a recarga incremental partir da versão anterior
+_carregados = weakref.WeakValueDictionary()
+
+
+def versao_atual(nome):
+    """
+    Versão corrente de um dataset; fixada no primeiro uso e trocada só pelo observador
+    """
+    with _trava_versoes:
+        versao = _versoes.get(nome)
+        if versao is None:
+            versao = _versoes[nome] = versao_relatorio(DATASETS[nome]['arquivo'])
+    return versao
+
+
+# Até duas versões de cada dataset (a corrente e a que execuções em andamento ainda usam)
+@st.cache_resource(max_entries=2 * len(DATASETS), show_spinner="Carregando dados...")
+def _carregar_dataset(nome, versao, _anterior=None):
+    """
+    Lê e normaliza uma versão de um dataset uma única vez por processo
+    _anterior: versão anterior já carregada (fora da chave do cache); quando o
+    arquivo só ganhou linhas no fim, a nova versão é montada a partir dela
+    O objeto retornado é compartilhado: não deve ser modificado in-place
+    """
+    especificacao = DATASETS[nome]
+    df = _anexar_versao(nome, _anterior) if _anterior is not None else None
+    incremental = df is not None
+    if not incremental:
+        df = normalizar_relatorio(
+            ler_relatorio(especificacao['arquivo'], colunas=especificacao.get('colunas'),
+                          chave=especificacao.get('chave_linha')),
+            especificacao,
+        )
+    # Acompanha os recortes filtrados (iloc preserva attrs)
+    df.attrs['versao'] = versao
+    _carregados[(nome, versao)] = df
+    logger.info("%s: %d linhas, %d colunas, %.1f MB em memória", nome, len(df), len(df.columns), memoria_mb(df))
+
+    if armazem.armazem_ativo():
+        try:
+            assinatura = assinatura_relatorio(especificacao['arquivo'])
+            if not (incremental and armazem.anexar(nome, df.iloc[len(_anterior):], len(_anterior),
+                                                   _anterior.attrs.get('versao'), versao, assinatura)):
+                armazem.sincronizar(nome, df, assinatura)
+        except sqlite3.Error as e:
+            logger.warning("Armazém não atualizado para %s: %s", nome, e)
+    return df
+
+
+def _anexar_versao(nome, anterior):
+    """
+    Nova versão de um dataset de exportação cumulativa a partir da anterior:
+    só as linhas acrescentadas ao arquivo são lidas e normalizadas, e o índice
+    de filtros e o cubo já construídos para a anterior são estendidos com elas
+    Retorna None quando o arquivo não continua o anterior (carga completa)
+    """
+    especificacao = DATASETS[nome]
+    ancoras = anterior.attrs.get('ancoras')
+    if not especificacao.get('chave_linha') or not ancoras:
+        return None
+    novas = ler_incremento(especificacao['arquivo'], ancoras, especificacao['chave_linha'],
+                           colunas=especificacao.get('colunas'))
+    if novas is None:
+        logger.info("%s: o arquivo não continua a versão carregada; leitura completa", nome)
+        return None
+
+    df = anexar_linhas(anterior, normalizar_relatorio(novas, especificacao))
+    df.attrs['ancoras'] = novas.attrs['ancoras']
+    estender_estrutura(anterior, df, nome, 'indice', estender_indice)
+    estender_estrutura(anterior, df, nome, 'cubo', estender_cubo)
+    logger.info("%s: %d linhas novas anexadas às %d já carregadas", nome, len(novas), len(anterior))
+    return df
+
+
+@st.cache_resource(max_entries=2 * len(DATASETS), show_spinner="Carregando dados...")
+def _carregar_no_armazem(nome, versao, _anterior=None):
+    """
+    Carrega uma versão de um dataset no armazém SQLite e devolve o recorte
+    (só o esquema) que as páginas usam no lugar do DataFrame
+    A planilha só é lida quando a tabela não tem essa versão; exportações
+    cumulativas anexam apenas as linhas novas. Em erro do armazém, carrega o
+    DataFrame completo (caminho pandas)
+    """
+    especificacao = DATASETS[nome]
+    try:
+        assinatura = assinatura_relatorio(especificacao['arquivo'])
+        recorte = armazem.recorte_sincronizado(nome, assinatura, versao)
+        if recorte is None and _anterior is not None:
+            recorte = _anexar_no_armazem(nome, versao, _anterior, assinatura)
+        if recorte is None:
+            df = normalizar_relatorio(
+                ler_relatorio(especificacao['arquivo'], colunas=especificacao.get('colunas'),
+                              chave=especificacao.get('chave_linha')),
+                especificacao,
+            )
+            df.attrs['versao'] = versao
+            armazem.sincronizar(nome, df, assinatura)
+            recorte = armazem.recorte_vazio(nome, versao)
+            logger.info("%s: %d linhas gravadas no armazém", nome, len(df))
+    except sqlite3.Error as e:
+        logger.warning("Armazém indisponível para %s, carregando em memória: %s", nome, e)
+        return _carregar_dataset(nome, versao)
+    _carregados[(nome, versao)] = recorte
+    return recorte
+
+
+def _anexar_no_armazem(nome, versao, anterior, assinatura):
+    """
+    Nova versão de um dataset de exportação cumulativa no armazém: só as
+    linhas acrescentadas ao arquivo são lidas, normalizadas e gravadas
+    Retorna None quando o arquivo não continua o anterior (carga completa)
+    """
+    especificacao = DATASETS[nome]
+    ancoras = anterior.attrs.get('ancoras')
+    if not especificacao.get('chave_linha') or not ancoras:
+        return None
+    novas = ler_incremento(especificacao['arquivo'], ancoras, especificacao['chave_linha'],
+                           colunas=especificacao.get('colunas'))
+    if novas is None:
+        logger.info("%s: o arquivo não continua a versão carregada; leitura completa", nome)
+        return None
+    normalizadas = normalizar_relatorio(novas, especificacao)
+    normalizadas.attrs['ancoras'] = novas.attrs['ancoras']
+    if not armazem.anexar(nome, normalizadas, ancoras['linhas'], anterior.attrs.get('versao'), versao, assinatura):
+        return None
+    logger.info("%s: %d linhas novas anexadas no armazém às %d já gravadas", nome, len(novas), ancoras['linhas'])
+    return armazem.recorte_vazio(nome, versao)
+
+
+def _carregar(nome, versao, anterior=None):
+    """
+    Carga de uma versão de um dataset: no armazém SQLite quando ativo (datasets
+    transacionais), senão em memória
+    """
+    if armazem.armazem_ativo() and DATASETS[nome].get('coluna_valor'):
+        return _carregar_no_armazem(nome, versao, _anterior=anterior)
+    return _carregar_dataset(nome, versao, _anterior=anterior)
+
+
+@medido('carga dos datasets')
+def carregar_datasets(*nomes):
+    """
+    Retorna os datasets pedidos (na versão corrente), na ordem informada
+    Exemplo: pr, cr, par = carregar_datasets('pr', 'cr', 'par')
+
+    Os DataFrames são compartilhados entre sessões; quem precisar alterá-los
+    deve trabalhar sobre uma cópia (.copy())
+    """
+    for nome in nomes:
+        if nome not in DATASETS:
+            raise KeyError(f"Dataset desconhecido: {nome}")
+    iniciar_observador()
+    return tuple(_carregar(nome, versao_atual(nome)) for nome in nomes)
+
+
+@st.cache_resource(max_entries=2 * len(DATASETS), show_spinner=False)
+def _catalogo_dataset(nome, versao):
+    """
+    Catálogo de filtros lido só das colunas de dimensão e de data do snapshot
+    """
+    especificacao = DATASETS[nome]
+    colunas = list(especificacao.get('dimensoes', {}).values()) + [especificacao.get('coluna_data_filtro')]
+    df = normalizar_relatorio(ler_relatorio(especificacao['arquivo'], colunas=colunas), especificacao)
+    return catalogo_filtros(df, nome)
+
+
+def catalogos_filtros(*nomes):
+    """
+    Opções da sidebar de cada dataset pedido, sem carregar o dataset completo
+    Exemplo: catalogos_filtros('pr', 'cr', 'par')['pr']['valores']['categoria']
+    """
+    return {nome: _catalogo_dataset(nome, versao_atual(nome)) for nome in nomes}
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _ler_colunas(nome, colunas, versao):
+    especificacao = DATASETS[nome]
+    return normalizar_relatorio(ler_relatorio(especificacao['arquivo'], colunas=list(colunas)), especificacao)
+
+
+def colunas_sob_demanda(df, nome, colunas):
+    """
+    Acrescenta a df (o dataset ou um recorte filtrado dele) colunas que ficaram
+    fora da projeção do esquema, lidas do snapshot só quando alguma página pede
+    Exemplo: colunas_sob_demanda(pr_filtrado, 'pr', ['Vencimento', 'Histórico'])
+    Colunas inexistentes no relatório são ignoradas; retorna um novo DataFrame.
+    Se df é de uma versão já substituída, o snapshot não tem mais as linhas
+    dela e df volta sem as colunas
+    """
+    faltantes = tuple(coluna for coluna in colunas if coluna not in df.columns)
+    if not faltantes:
+        return df
+    versao = df.attrs.get('versao', versao_atual(nome))
+    if versao != versao_atual(nome):
+        logger.warning("%s: colunas %s pedidas para a versão substituída %s", nome, faltantes, versao)
+        return df
+    extras = _ler_colunas(nome, faltantes, versao)
+    lidas = [coluna for coluna in faltantes if coluna in extras.columns]
+    if not lidas:
+        return df
+    # Os recortes filtrados preservam os rótulos do índice do dataset completo
+    return df.join(extras.loc[df.index, lidas])
+
+
+def atualizar_versoes(pendentes):
+    """
+    Um ciclo do observador: confere a versão de origem dos datasets em uso
+    pendentes: {nome: versão vista no ciclo anterior}, atualizado in-place;
+    uma versão nova só é carregada quando se repete em dois ciclos seguidos
+    (arquivo ainda sendo copiado não é lido pela metade)
+    Retorna os nomes dos datasets trocados
+    """
+    with _trava_versoes:
+        correntes = dict(_versoes)
+
+    trocados = []
+    for nome, corrente in correntes.items():
+        nova = versao_relatorio(DATASETS[nome]['arquivo'])
+        if nova is None or nova == corrente:
+            pendentes.pop(nome, None)
+            continue
+        if pendentes.get(nome) != nova:
+            pendentes[nome] = nova
+            continue
+
+        try:
+            # Carrega a versão nova por inteiro antes de torná-la a corrente
+            _carregar(nome, nova, anterior=_carregados.get((nome, corrente)))
+            if DATASETS[nome].get('dimensoes'):
+                _catalogo_dataset(nome, nova)
+        except Exception:
+            logger.exception("Recarga de %s falhou; mantida a versão %s", nome, corrente)
+            continue
+        with _trava_versoes:
+            _versoes[nome] = nova
+        pendentes.pop(nome, None)
+        trocados.append(nome)
+        logger.info("%s: versão %s substituída por %s", nome, corrente, nova)
+    return trocados
+
+
+def _observar(intervalo):
+    pendentes = {}
+    while True:
+        time.sleep(intervalo)
+        try:
+            atualizar_versoes(pendentes)
+        except Exception:
+            logger.exception("Observador de data/ falhou neste ciclo")
+
+
+def iniciar_observador():
+    """
+    Inicia o observador de data/ em uma thread de fundo (uma única vez por processo)
+    """
+    global _observador
+    if INTERVALO_RECARGA <= 0 or _observador is not None:
+        return
+    with _trava_versoes:
+        if _observador is not None:
+            return
+        _observador = threading.Thread(target=_observar, args=(INTERVALO_RECARGA,), name='observador-data', daemon=True)
+    _observador.start()
@@ -0,0 +1,242 @@
+"""
+Instrumentação de desempenho das páginas
+Mede tempo, linhas de entrada/saída e variação de memória de cada seção
+(carga, filtros, agregações, gráficos) e exibe o resultado em um expander
+"Desempenho" na sidebar, além de registrar uma linha de log estruturada (JSON)
+por seção.
+
+Ativação por query parameter na URL:
+    ?desempenho=1            mede as seções e mostra o painel
+    ?perfil=cprofile         perfila a execução inteira com cProfile
+    ?perfil=pyinstrument     idem com pyinstrument (se instalado)
+Desativada, cada seção custa uma verificação de atributo.
+O Streamlit só é importado nas funções de página, para que módulos usados
+sem ele (ex.: utils/cubo.py no motor em lote) possam usar secao/medido
+"""
+import io
+import os
+import json
+import time
+import pstats
+import logging
+import cProfile
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger('dashboard.desempenho')
+
+# Estado da execução atual (cada sessão do Streamlit roda o script em sua própria thread)
+_execucao = threading.local()
+
+
+class Registro:
+    """
+    Medição de uma seção; linhas_saida pode ser preenchido dentro do bloco
+    """
+    __slots__ = ('secao', 'linhas_entrada', 'linhas_saida', 'tempo_s', 'memoria_bytes')
+
+    def __init__(self, secao, linhas_entrada=None):
+        self.secao = secao
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.tempo_s = None
+        self.memoria_bytes = None
+
+
+# Devolvido quando a instrumentação está desligada: aceita atribuições e é descartado
+_REGISTRO_INATIVO = Registro('')
+
+
+def _memoria_rss():
+    """
+    Memória residente do processo em bytes (Linux); None onde não houver /proc
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def instrumentacao_ativa():
+    return getattr(_execucao, 'registros', None) is not None
+
+
+def _parametro(nome):
+    import streamlit as st
+    try:
+        return st.query_params.get(nome)
+    except Exception:
+        # Fora de uma sessão do Streamlit (ex.: motor em lote)
+        return None
+
+
+def iniciar_execucao(pagina):
+    """
+    Início de cada página: lê os query parameters e prepara as medições da execução
+    """
+    # Execução anterior interrompida (rerun no meio do script): descarta o perfilador pendente
+    anterior = getattr(_execucao, 'perfilador', None)
+    if anterior is not None:
+        tipo, objeto = anterior
+        if tipo == 'cprofile':
+            objeto.disable()
+        elif objeto.is_running:
+            objeto.stop()
+
+    _execucao.registros = None
+    _execucao.perfilador = None
+    _execucao.pagina = pagina
+
+    perfil = _parametro('perfil')
+    if _parametro('desempenho') not in (None, '', '0') or perfil:
+        _execucao.registros = []
+        _execucao.inicio = time.perf_counter()
+
+    if perfil == 'cprofile':
+        _execucao.perfilador = ('cprofile', cProfile.Profile())
+        _execucao.perfilador[1].enable()
+    elif perfil == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            import streamlit as st
+            st.sidebar.warning("pyinstrument não está instalado; use ?perfil=cprofile")
+        else:
+            _execucao.perfilador = ('pyinstrument', Profiler())
+            _execucao.perfilador[1].start()
+
+
+@contextmanager
+def secao(nome, linhas_entrada=None):
+    """
+    Mede um bloco da página:
+        with secao('Top 10 despesas', len(pr_filtrado)) as registro:
+            ...
+            registro.linhas_saida = len(top_despesas)
+    """
+    registros = getattr(_execucao, 'registros', None)
+    if registros is None:
+        yield _REGISTRO_INATIVO
+        return
+
+    registro = Registro(nome, linhas_entrada)
+    memoria_antes = _memoria_rss()
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro.tempo_s = time.perf_counter() - inicio
+        memoria_depois = _memoria_rss()
+        if memoria_antes is not None and memoria_depois is not None:
+            registro.memoria_bytes = memoria_depois - memoria_antes
+        registros.append(registro)
+        logger.info(json.dumps({
+            'pagina': getattr(_execucao, 'pagina', None),
+            'secao': registro.secao,
+            'tempo_ms': round(registro.tempo_s * 1000, 3),
+            'linhas_entrada': registro.linhas_entrada,
+            'linhas_saida': registro.linhas_saida,
+            'memoria_bytes': registro.memoria_bytes,
+        }, ensure_ascii=False))
+
+
+def _linhas(valor):
+    """
+    Linhas de um resultado (DataFrame/Series, tupla de DataFrames ou dicionário de métricas)
+    """
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return len(valor)
+    if isinstance(valor, tuple):
+        tamanhos = [len(item) for item in valor if isinstance(item, (pd.DataFrame, pd.Series))]
+        return sum(tamanhos) if tamanhos else None
+    if isinstance(valor, dict):
+        return 1
+    return None
+
+
+def medido(nome, linhas_entrada=None):
+    """
+    Decorator: mede cada chamada da função como uma seção
+    linhas_entrada: função opcional (args, kwargs) -> linhas de entrada; recebe
+    os argumentos já associados à assinatura (com os padrões), então args[i]
+    é o i-ésimo parâmetro mesmo quando a chamada o passa por nome
+    """
+    def decorador(funcao):
+        assinatura = inspect.signature(funcao)
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            if not instrumentacao_ativa():
+                return funcao(*args, **kwargs)
+            nome_secao = nome(*args, **kwargs) if callable(nome) else nome
+            entrada = None
+            if linhas_entrada:
+                argumentos = assinatura.bind(*args, **kwargs)
+                argumentos.apply_defaults()
+                entrada = linhas_entrada(argumentos.args, argumentos.kwargs)
+            with secao(nome_secao, entrada) as registro:
+                resultado = funcao(*args, **kwargs)
+                registro.linhas_saida = _linhas(resultado)
+            return resultado
+        return envoltorio
+    return decorador
+
+
+def exibir_grafico(figura, nome='gráfico', **kwargs):
+    """
+    st.plotly_chart medido: inclui a serialização da figura para o navegador
+    linhas_entrada = pontos enviados (soma de todos os traces)
+    """
+    import streamlit as st
+    if not instrumentacao_ativa():
+        return st.plotly_chart(figura, **kwargs)
+    pontos = 0
+    for trace in figura.data:
+        valores = getattr(trace, 'values', None) if getattr(trace, 'x', None) is None else trace.x
+        pontos += len(valores) if valores is not None else 0
+    with secao(f'gráfico: {nome}', pontos):
+        return st.plotly_chart(figura, **kwargs)
+
+
+def finalizar_execucao():
+    """
+    Fim de cada página: encerra o perfilador e mostra o painel de desempenho na sidebar
+    """
+    registros = getattr(_execucao, 'registros', None)
+    perfilador = getattr(_execucao, 'perfilador', None)
+    _execucao.registros = None
+    _execucao.perfilador = None
+    if registros is None:
+        return
+
+    import streamlit as st
+    total_s = time.perf_counter() - _execucao.inicio
+    texto_perfil = None
+    if perfilador is not None:
+        tipo, objeto = perfilador
+        if tipo == 'cprofile':
+            objeto.disable()
+            saida = io.StringIO()
+            pstats.Stats(objeto, stream=saida).sort_stats('cumulative').print_stats(30)
+            texto_perfil = saida.getvalue()
+        else:
+            objeto.stop()
+            texto_perfil = objeto.output_text(unicode=True, color=False)
+
+    with st.sidebar.expander("⏱️ Desempenho", expanded=False):
+        st.caption(f"Execução total: {total_s * 1000:,.0f} ms")
+        tabela = pd.DataFrame([{
+            'Seção': registro.secao,
+            'Tempo (ms)': round(registro.tempo_s * 1000, 1),
+            'Linhas entrada': registro.linhas_entrada,
+            'Linhas saída': registro.linhas_saida,
+            'Memória (MB)': None if registro.memoria_bytes is None else round(registro.memoria_bytes / 2 ** 20, 2),
+        } for registro in registros])
+        st.dataframe(tabela, use_container_width=True, hide_index=True)
+        if texto_perfil:
+            st.code(texto_perfil, language=None)
@@ -0,0 +1,120 @@
+"""
+Esquema dos relatórios financeiros
+Centraliza o arquivo de origem e as colunas de cada dataset usadas pelas páginas.
+Só as colunas declaradas em 'colunas' são carregadas em memória
+"""
+
+DATASETS = {
+    # Pagamentos Realizados
+    'pr': {
+        'arquivo': 'PagamentosRealizadosRelatorio.xlsx',
+        # Colunas mantidas em memória (as demais ficam no snapshot, ver data_loader.colunas_sob_demanda)
+        'colunas': [
+            'Grupo', 'Minha Empresa (Nome Fantasia)', 'Fornecedor', 'Emissão', 'Grupo.1', 'Categoria',
+            'Pago ou Recebido', 'Conciliado', 'Data de Registro (completa)',
+        ],
+        'colunas_data': [
+            'Data de Registro (completa)',
+            'Data de Crédito ou Débito (No Extrato)',
+            'Vencimento',
+            'Emissão',
+        ],
+        'colunas_categoricas': [
+            'Grupo', 'Minha Empresa (Nome Fantasia)', 'Grupo.1', 'Categoria', 'Fornecedor',
+        ],
+        # Coluna de texto guardada como booleana -> valor que significa verdadeiro
+        'colunas_booleanas': {'Conciliado': 'Sim'},
+        # Chave de mês (yyyymm) -> coluna de data de origem
+        'colunas_mes': {
+            'Mes_Ano': 'Data de Registro (completa)',
+            'Mes_Emissao': 'Emissão',
+            'Mes_Registro': 'Data de Registro (completa)',
+        },
+        # Dimensões dos filtros da sidebar -> coluna no dataset
+        'dimensoes': {
+            'grupo': 'Grupo',
+            'empresa': 'Minha Empresa (Nome Fantasia)',
+            'grupo_despesa': 'Grupo.1',
+            'categoria': 'Categoria',
+        },
+        # Coluna usada no filtro de período
+        'coluna_data_filtro': 'Data de Registro (completa)',
+        # Coluna de valor e contraparte (fornecedor/cliente) usadas nas agregações
+        'coluna_valor': 'Pago ou Recebido',
+        'coluna_contraparte': 'Fornecedor',
+        # Exportação cumulativa: chave estável de linha para a leitura incremental
+        # (a exportação não traz número de documento; as duas partes, a data e o valor identificam o lançamento)
+        'chave_linha': ['Minha Empresa (CNPJ)', 'CNPJ/CPF', 'Data de Registro (completa)', 'Pago ou Recebido'],
+    },
+    # Contas Recebidas
+    'cr': {
+        'arquivo': 'ContasRecebidaseaReceber.xlsx',
+        'colunas': [
+            'Grupo', 'Minha Empresa (Razão Social)', 'Data de Crédito ou Débito (No Extrato)', 'Cliente',
+            'Categoria', 'Pago ou Recebido', 'Conciliado',
+        ],
+        'colunas_data': [
+            'Data de Crédito ou Débito (No Extrato)',
+            'Vencimento',
+            'Emissão',
+        ],
+        'colunas_categoricas': [
+            'Grupo', 'Minha Empresa (Razão Social)', 'Categoria', 'Cliente',
+        ],
+        'colunas_booleanas': {'Conciliado': 'Sim'},
+        'colunas_mes': {
+            'Mes_Ano': 'Data de Crédito ou Débito (No Extrato)',
+        },
+        'dimensoes': {
+            'grupo': 'Grupo',
+            'empresa': 'Minha Empresa (Razão Social)',
+            'categoria': 'Categoria',
+        },
+        'coluna_data_filtro': 'Data de Crédito ou Débito (No Extrato)',
+        'coluna_valor': 'Pago ou Recebido',
+        'coluna_contraparte': 'Cliente',
+    },
+    # Pagamentos a Realizar
+    'par': {
+        'arquivo': 'PagamentosaRealizarRelatorio.xlsx',
+        'colunas': [
+            'Grupo', 'Minha Empresa (Razão Social)', 'Razão Social', 'Emissão', 'Vencimento', 'Registro',
+            'Grupo.1', 'Categoria', 'Valor Líquido',
+        ],
+        'colunas_data': [
+            'Vencimento',
+            'Emissão',
+            'Registro',
+        ],
+        'colunas_categoricas': [
+            'Grupo', 'Minha Empresa (Razão Social)', 'Grupo.1', 'Categoria', 'Razão Social',
+        ],
+        'colunas_mes': {
+            'Mes_Ano': 'Vencimento',
+            'Mes_Emissao': 'Emissão',
+            'Mes_Registro': 'Registro',
+        },
+        'dimensoes': {
+            'grupo': 'Grupo',
+            'empresa': 'Minha Empresa (Razão Social)',
+            'grupo_despesa': 'Grupo.1',
+            'categoria': 'Categoria',
+        },
+        'coluna_data_filtro': 'Vencimento',
+        'coluna_valor': 'Valor Líquido',
+        'coluna_contraparte': 'Razão Social',
+    },
+    # Previsão de Faturamento (formato largo: uma coluna por data)
+    'pf': {
+        'arquivo': 'PrevisaoFaturamento.xlsx',
+        # Todas as colunas (uma por data de previsão)
+        'colunas': None,
+        'colunas_data': [],
+        'colunas_categoricas': [],
+        'colunas_mes': {},
+        'dimensoes': {},
+        'coluna_data_filtro': None,
+        'coluna_valor': None,
+        'coluna_contraparte': None,
+    },
+}
@@ -0,0 +1,140 @@
+"""
+Cache de figuras Plotly
+Cada gráfico das páginas é montado por uma função que recebe os dados já
+agregados e devolve a figura pronta. A chave do cache combina o código da
+função (a especificação do gráfico) com um hash do conteúdo dos argumentos,
+de modo que um rerun que não altera a série do gráfico (ex.: mudar o período
+não afeta a Previsão de Faturamento) reaproveita a figura já construída e
+validada, em vez de refazer px.bar / px.line / go.Pie.
+Compartilhado por todas as páginas e sessões, com despejo LRU
+"""
+import hashlib
+import functools
+
+import numpy as np
+import pandas as pd
+
+from utils.filtros import CacheLRU
+
+
+# Atributos de trace que carregam os dados (um valor por ponto)
+_ATRIBUTOS_DADOS = ('x', 'y', 'z', 'values', 'labels', 'parents', 'ids', 'text', 'hovertext', 'customdata')
+# Estimativa por figura para layout e propriedades escalares, e por item de textos/objetos
+_BYTES_LAYOUT = 4096
+_BYTES_POR_ITEM_OBJETO = 64
+
+
+def tamanho_figura(figura):
+    """
+    Estimativa barata dos bytes de uma figura: soma dos nbytes dos arrays de
+    dados dos traces (textos contam um tamanho fixo por item), sem serializar
+    """
+    total = _BYTES_LAYOUT
+    for trace in figura.data:
+        for atributo in _ATRIBUTOS_DADOS:
+            valores = trace[atributo] if atributo in trace else None
+            if valores is None or isinstance(valores, str):
+                continue
+            valores = np.asarray(valores)
+            if valores.dtype.kind in 'OUS':
+                total += valores.size * _BYTES_POR_ITEM_OBJETO
+            else:
+                total += valores.nbytes
+    return total
+
+
+class CacheFiguras(CacheLRU):
+    """
+    CacheLRU de figuras: cada entrada é (figura, bytes estimados da figura)
+    """
+
+    @staticmethod
+    def _tamanho(valor):
+        return valor[1]
+
+
+cache_figuras = CacheFiguras(max_entradas=256, max_bytes=32 * 1024 * 1024)
+
+
+def _atualizar_hash(h, valor):
+    if isinstance(valor, (pd.Series, pd.DataFrame, pd.Index)):
+        h.update(type(valor).__name__.encode())
+        if isinstance(valor, pd.DataFrame):
+            h.update(repr(list(valor.columns)).encode())
+            h.update(repr(list(valor.dtypes.astype(str))).encode())
+        else:
+            h.update(repr((valor.name, str(valor.dtype))).encode())
+        if isinstance(valor, pd.Index):
+            valor = valor.to_series(index=np.arange(len(valor)))
+        else:
+            h.update(repr(valor.index.names).encode())
+        h.update(pd.util.hash_pandas_object(valor, index=True).to_numpy().tobytes())
+    elif isinstance(valor, np.ndarray):
+        h.update(repr((valor.dtype.str, valor.shape)).encode())
+        h.update(np.ascontiguousarray(valor).tobytes() if valor.dtype != object else repr(valor.tolist()).encode())
+    elif isinstance(valor, (list, tuple)):
+        h.update(f'{type(valor).__name__}{len(valor)}'.encode())
+        for item in valor:
+            _atualizar_hash(h, item)
+    elif isinstance(valor, dict):
+        h.update(f'dict{len(valor)}'.encode())
+        for chave in sorted(valor, key=repr):
+            _atualizar_hash(h, chave)
+            _atualizar_hash(h, valor[chave])
+    else:
+        h.update(repr(valor).encode())
+    h.update(b'|')
+
+
+def assinatura_dados(*valores):
+    """
+    Hash do conteúdo dos dados de um gráfico (Series, DataFrames, arrays e escalares)
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for valor in valores:
+        _atualizar_hash(h, valor)
+    return h.hexdigest()
+
+
+def _assinatura_codigo(codigo, h=None):
+    """
+    Hash do código de uma função (bytecode, constantes e nomes): a especificação do gráfico
+    Funções aninhadas entram pelo próprio código, não pelo endereço em memória
+    """
+    raiz = h is None
+    if raiz:
+        h = hashlib.blake2b(digest_size=16)
+    h.update(codigo.co_code)
+    h.update(repr(codigo.co_names).encode())
+    for constante in codigo.co_consts:
+        if hasattr(constante, 'co_code'):
+            _assinatura_codigo(constante, h)
+        else:
+            h.update(repr(constante).encode())
+    return h.hexdigest() if raiz else None
+
+
+def figura_em_cache(construir):
+    """
+    Decorator para as funções que montam os gráficos das páginas:
+        @figura_em_cache
+        def grafico_categorias(serie):
+            fig = px.bar(...)
+            fig.update_layout(...)
+            return fig
+
+    A função deve depender só dos argumentos, e a figura devolvida não deve
+    ser alterada depois (ela é compartilhada entre execuções e sessões)
+    """
+    especificacao = (construir.__module__, construir.__qualname__, _assinatura_codigo(construir.__code__))
+
+    @functools.wraps(construir)
+    def envoltorio(*args, **kwargs):
+        chave = especificacao + (assinatura_dados(args, kwargs),)
+        entrada = cache_figuras.obter(chave)
+        if entrada is not None:
+            return entrada[0]
+        figura = construir(*args, **kwargs)
+        cache_figuras.guardar(chave, (figura, tamanho_figura(figura)))
+        return figura
+    return envoltorio
@@ -0,0 +1,502 @@
+"""
+Motor de filtros da sidebar
+Índice invertido por dataset: para cada valor das dimensões filtráveis
+(Grupo, Minha Empresa, Grupo.1, Categoria) guarda as linhas em que ele aparece.
+O período usa a ordem das linhas pela data do filtro (busca binária).
+Um estado de filtros é resolvido em um único array de linhas e cada
+DataFrame é fatiado uma única vez no final.
+Com o armazém SQLite ativo o dataset é um recorte sem linhas (só o esquema):
+filtrar_dataset só registra o estado de filtros e as linhas que as páginas
+usam são lidas por linhas_filtradas, com o filtro aplicado no SQL
+"""
+import itertools
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils import armazem
+from utils.esquema import DATASETS
+from utils.metricas import mascara_conformidade
+
+
+class IndiceDimensao:
+    """
+    Índice de uma coluna de dimensão
+    codigos: código de cada linha (0 = valor ausente, 1..k = valores)
+    linhas_ordenadas/limites: lista de linhas de cada código, em ordem crescente
+    """
+
+    def __init__(self, serie):
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy()
+            valores = serie.cat.categories
+        else:
+            codigos, valores = pd.factorize(serie)
+
+        self.valores = pd.Index(valores)
+        self.codigos = codigos.astype(np.int32) + 1
+        self.linhas_ordenadas = np.argsort(self.codigos, kind='stable').astype(np.int32)
+        self.limites = np.searchsorted(self.codigos[self.linhas_ordenadas], np.arange(len(self.valores) + 2))
+
+    def estendido(self, serie, inicio):
+        """
+        Índice de `serie`, cujas primeiras `inicio` linhas são as já indexadas
+        (exportação cumulativa): só as linhas novas são ordenadas; as listas
+        existentes são copiadas para as posições dos códigos novos
+        """
+        if not isinstance(serie.dtype, pd.CategoricalDtype):
+            return IndiceDimensao(serie)
+
+        novo = IndiceDimensao.__new__(IndiceDimensao)
+        novo.valores = pd.Index(serie.cat.categories)
+        novo.codigos = serie.cat.codes.to_numpy().astype(np.int32) + 1
+
+        # Código antigo -> código novo (categorias novas podem entrar no meio da ordem)
+        mapa = np.zeros(len(self.valores) + 1, dtype=np.int32)
+        mapa[1:] = novo.valores.get_indexer(self.valores) + 1
+        contagem_anterior = np.zeros(len(novo.valores) + 1, dtype=np.int64)
+        contagem_anterior[mapa] = np.diff(self.limites)[:len(self.valores) + 1]
+        codigos_novos = novo.codigos[inicio:]
+        contagem = contagem_anterior + np.bincount(codigos_novos, minlength=len(novo.valores) + 1)
+        novo.limites = np.concatenate([[0], np.cumsum(contagem)])
+
+        novo.linhas_ordenadas = np.empty(len(novo.codigos), dtype=np.int32)
+        codigos_anteriores = self.codigos[self.linhas_ordenadas]
+        posicao_no_codigo = np.arange(len(codigos_anteriores)) - self.limites[codigos_anteriores]
+        novo.linhas_ordenadas[novo.limites[mapa[codigos_anteriores]] + posicao_no_codigo] = self.linhas_ordenadas
+
+        # Linhas novas vêm depois das anteriores de cada código (ordem crescente)
+        ordem = np.argsort(codigos_novos, kind='stable')
+        ordenados = codigos_novos[ordem]
+        posicao_no_codigo = np.arange(len(ordenados)) - np.searchsorted(ordenados, ordenados, side='left')
+        destino = novo.limites[ordenados] + contagem_anterior[ordenados] + posicao_no_codigo
+        novo.linhas_ordenadas[destino] = ordem + inicio
+        return novo
+
+    def codigos_de(self, valores):
+        """
+        Códigos dos valores informados; valores inexistentes no dataset são ignorados
+        """
+        posicoes = self.valores.get_indexer(list(valores))
+        return posicoes[posicoes >= 0] + 1
+
+    def contagem(self, codigos):
+        return int(sum(self.limites[c + 1] - self.limites[c] for c in codigos))
+
+    def linhas(self, codigos):
+        """
+        Linhas (ordenadas) em que aparece algum dos códigos: OR dentro da dimensão
+        """
+        partes = [self.linhas_ordenadas[self.limites[c]:self.limites[c + 1]] for c in codigos]
+        if not partes:
+            return np.empty(0, dtype=np.int32)
+        if len(partes) == 1:
+            return partes[0]
+        return np.sort(np.concatenate(partes))
+
+    def pertence(self, linhas, codigos):
+        """
+        Máscara indicando quais das linhas informadas têm um dos códigos
+        Custo proporcional a len(linhas), não ao tamanho do dataset
+        """
+        tabela = np.zeros(len(self.valores) + 1, dtype=bool)
+        tabela[codigos] = True
+        return tabela[self.codigos[linhas]]
+
+    def valores_presentes(self, linhas=None):
+        """
+        Valores que aparecem no dataset (ou apenas nas linhas informadas)
+        """
+        if linhas is None:
+            presentes = np.flatnonzero(np.diff(self.limites)[1:]) + 1
+        else:
+            presentes = np.unique(self.codigos[linhas])
+            presentes = presentes[presentes > 0]
+        return self.valores[presentes - 1].tolist()
+
+
+class IndiceDatas:
+    """
+    Índice da coluna de data do filtro de período
+    Guarda a permutação que ordena as linhas pela data (datas ausentes ficam de fora),
+    de modo que um intervalo vira duas buscas binárias e uma fatia contígua
+    """
+
+    def __init__(self, serie):
+        self.datas = serie.to_numpy(dtype='datetime64[ns]')
+        validas = np.flatnonzero(~np.isnat(self.datas))
+        self.linhas_ordenadas = validas[np.argsort(self.datas[validas], kind='stable')].astype(np.int32)
+        self.datas_ordenadas = self.datas[self.linhas_ordenadas]
+
+    def estendido(self, serie, inicio):
+        """
+        Índice de `serie`, cujas primeiras `inicio` linhas são as já indexadas:
+        só as datas novas são ordenadas e intercaladas nas existentes
+        """
+        novo = IndiceDatas.__new__(IndiceDatas)
+        novo.datas = serie.to_numpy(dtype='datetime64[ns]')
+        novas = novo.datas[inicio:]
+        validas = np.flatnonzero(~np.isnat(novas))
+        ordem = validas[np.argsort(novas[validas], kind='stable')]
+        # side='right': em datas iguais as linhas novas ficam depois, como na ordenação estável
+        posicoes = np.searchsorted(self.datas_ordenadas, novas[ordem], side='right')
+        novo.linhas_ordenadas = np.insert(self.linhas_ordenadas, posicoes, (ordem + inicio).astype(np.int32))
+        novo.datas_ordenadas = novo.datas[novo.linhas_ordenadas]
+        return novo
+
+    def fatia(self, inicio, fim):
+        """
+        Posições [a, b) em linhas_ordenadas das linhas com inicio <= data <= fim
+        """
+        a = np.searchsorted(self.datas_ordenadas, inicio, side='left')
+        b = np.searchsorted(self.datas_ordenadas, fim, side='right')
+        return a, max(a, b)
+
+    def contagem(self, inicio, fim):
+        a, b = self.fatia(inicio, fim)
+        return int(b - a)
+
+    def linhas(self, inicio, fim):
+        a, b = self.fatia(inicio, fim)
+        # Reordena pela posição original para preservar a ordem das linhas
+        return np.sort(self.linhas_ordenadas[a:b])
+
+    def limites(self):
+        """
+        Menor e maior data (None se não houver datas)
+        """
+        if len(self.datas_ordenadas) == 0:
+            return None
+        return pd.Timestamp(self.datas_ordenadas[0]), pd.Timestamp(self.datas_ordenadas[-1])
+
+    def pertence(self, linhas, inicio, fim):
+        datas = self.datas[linhas]
+        return (datas >= inicio) & (datas <= fim)
+
+
+_versoes_indice = itertools.count(1)
+
+
+class IndiceFiltros:
+    """
+    Índices de todas as dimensões filtráveis e da data do período de um dataset
+    """
+
+    def __init__(self, df, dimensoes, coluna_data=None, versao=None):
+        # Versão do dataset indexado: entra na chave do cache de filtros
+        self.versao = versao if versao is not None else next(_versoes_indice)
+        self.n_linhas = len(df)
+        self.dimensoes = {
+            dimensao: IndiceDimensao(df[coluna])
+            for dimensao, coluna in dimensoes.items()
+            if coluna in df.columns
+        }
+        self.datas = IndiceDatas(df[coluna_data]) if coluna_data in df.columns else None
+
+    def estendido(self, df, dimensoes, coluna_data=None, inicio=0):
+        """
+        Índice de df, cujas primeiras `inicio` linhas são as deste índice
+        (exportação cumulativa, ver data_loader): custo proporcional às linhas novas,
+        fora as cópias dos arrays. Recebe uma versão nova, como um índice construído do zero
+        """
+        novo = IndiceFiltros.__new__(IndiceFiltros)
+        novo.versao = next(_versoes_indice)
+        novo.n_linhas = len(df)
+        novo.dimensoes = {
+            dimensao: self.dimensoes[dimensao].estendido(df[coluna], inicio)
+            for dimensao, coluna in dimensoes.items()
+            if dimensao in self.dimensoes
+        }
+        novo.datas = self.datas.estendido(df[coluna_data], inicio) if self.datas is not None else None
+        return novo
+
+    def chave(self, selecoes, data_inicio=None, data_fim=None):
+        """
+        Chave canônica de um estado de filtros para este dataset
+        Considera só os critérios que se aplicam a ele, com os valores ordenados,
+        para que estados equivalentes compartilhem a mesma entrada no cache
+        """
+        dimensoes = tuple(sorted(
+            (dimensao, tuple(sorted(map(str, valores))))
+            for dimensao, valores in selecoes.items()
+            if valores and dimensao in self.dimensoes
+        ))
+        periodo = None
+        if self.datas is not None and data_inicio is not None and data_fim is not None:
+            periodo = (pd.Timestamp(data_inicio).isoformat(), pd.Timestamp(data_fim).isoformat())
+        return (self.versao, dimensoes, periodo)
+
+    def valores(self, dimensao, linhas=None):
+        if dimensao not in self.dimensoes:
+            return []
+        return self.dimensoes[dimensao].valores_presentes(linhas)
+
+    def resolver(self, selecoes, data_inicio=None, data_fim=None):
+        """
+        Resolve um estado de filtros em linhas do dataset
+        selecoes: {dimensao: lista de valores}; lista vazia ou None = sem filtro
+        data_inicio/data_fim: período (inclusivo) sobre a coluna de data do filtro
+        Dimensões inexistentes no dataset não filtram (ex.: Grupo.1 em Contas Recebidas)
+        Retorna array ordenado de linhas, ou None quando nenhum filtro se aplica
+        """
+        # Cada critério ativo: (índice, argumentos) com contagem/linhas/pertence
+        ativos = [
+            (self.dimensoes[dimensao], (self.dimensoes[dimensao].codigos_de(valores),))
+            for dimensao, valores in selecoes.items()
+            if valores and dimensao in self.dimensoes
+        ]
+        if self.datas is not None and data_inicio is not None and data_fim is not None:
+            inicio = np.datetime64(pd.Timestamp(data_inicio), 'ns')
+            fim = np.datetime64(pd.Timestamp(data_fim), 'ns')
+            ativos.append((self.datas, (inicio, fim)))
+        if not ativos:
+            return None
+
+        # Parte do critério mais seletivo e testa os demais só nas linhas restantes (AND)
+        ativos.sort(key=lambda item: item[0].contagem(*item[1]))
+        indice, argumentos = ativos[0]
+        linhas = indice.linhas(*argumentos)
+        for indice, argumentos in ativos[1:]:
+            if len(linhas) == 0:
+                break
+            linhas = linhas[indice.pertence(linhas, *argumentos)]
+        return linhas
+
+
+_estruturas = {}
+_trava_estruturas = threading.Lock()
+
+
+def estrutura_por_dataset(df, nome, tipo, construtor):
+    """
+    Estrutura derivada de um dataset (índice, cubo...), construída uma vez por
+    objeto DataFrame e descartada junto com ele
+    (os datasets compartilhados do data_loader reaproveitam a mesma estrutura)
+    """
+    chave = (id(df), nome, tipo)
+    with _trava_estruturas:
+        item = _estruturas.get(chave)
+        if item is not None and item[0]() is df:
+            return item[1]
+
+    estrutura = construtor(df, nome)
+
+    with _trava_estruturas:
+        _estruturas[chave] = (weakref.ref(df), estrutura)
+        weakref.finalize(df, _estruturas.pop, chave, None)
+    return estrutura
+
+
+def estender_estrutura(anterior, df, nome, tipo, extensor):
+    """
+    Para um df que repete as linhas de `anterior` e acrescenta outras no fim:
+    se a estrutura `tipo` de `anterior` já foi construída, estende-a com
+    extensor(estrutura, df, nome, len(anterior)) e a associa a df
+    """
+    with _trava_estruturas:
+        item = _estruturas.get((id(anterior), nome, tipo))
+    if item is None or item[0]() is not anterior:
+        return None
+    estrutura = extensor(item[1], df, nome, len(anterior))
+    with _trava_estruturas:
+        chave = (id(df), nome, tipo)
+        _estruturas[chave] = (weakref.ref(df), estrutura)
+        weakref.finalize(df, _estruturas.pop, chave, None)
+    return estrutura
+
+
+def _construir_indice(df, nome):
+    especificacao = DATASETS[nome]
+    return IndiceFiltros(df, especificacao.get('dimensoes', {}), especificacao.get('coluna_data_filtro'))
+
+
+def estender_indice(indice, df, nome, inicio):
+    especificacao = DATASETS[nome]
+    return indice.estendido(df, especificacao.get('dimensoes', {}), especificacao.get('coluna_data_filtro'), inicio)
+
+
+def indice_filtros(df, nome):
+    """
+    Índice de filtros de um dataset, construído uma vez por objeto DataFrame
+    """
+    return estrutura_por_dataset(df, nome, 'indice', _construir_indice)
+
+
+def catalogo_filtros(df, nome):
+    """
+    Opções da sidebar de um dataset: valores de cada dimensão, empresas de cada
+    grupo e limites de data. Pequeno e independente do DataFrame, permite montar
+    a sidebar sem manter o dataset carregado (ver data_loader.catalogos_filtros)
+    """
+    indice = indice_filtros(df, nome)
+    empresas_por_grupo = None
+    if 'grupo' in indice.dimensoes:
+        empresas_por_grupo = {
+            grupo: indice.valores('empresa', indice.resolver({'grupo': [grupo]}))
+            for grupo in indice.valores('grupo')
+        }
+    return {
+        'valores': {dimensao: indice.valores(dimensao) for dimensao in indice.dimensoes},
+        'empresas_por_grupo': empresas_por_grupo,
+        'datas': indice.datas.limites() if indice.datas is not None else None,
+    }
+
+
+def empresas_do_grupo(catalogo, grupo):
+    """
+    Empresas de um grupo segundo o catálogo (todas, se o dataset não tiver a dimensão grupo)
+    """
+    if catalogo['empresas_por_grupo'] is None:
+        return catalogo['valores'].get('empresa', [])
+    return catalogo['empresas_por_grupo'].get(grupo, [])
+
+
+def montar_filtros(grupo, empresa, grupos_despesa, categorias, data_inicio=None, data_fim=None):
+    """
+    Estado de filtros no formato usado pelo motor de filtros e pelo cubo,
+    a partir dos valores escolhidos na sidebar
+    """
+    return {
+        'selecoes': {
+            'grupo': [grupo] if grupo != 'Todos' else [],
+            'empresa': [empresa] if empresa != 'Todas' else [],
+            'grupo_despesa': list(grupos_despesa),
+            'categoria': list(categorias),
+        },
+        'data_inicio': data_inicio,
+        'data_fim': data_fim,
+    }
+
+
+class CacheLRU:
+    """
+    Cache LRU limitado por número de entradas e por bytes, seguro entre threads
+    Compartilhado por todas as páginas e sessões do processo
+    """
+
+    def __init__(self, max_entradas=256, max_bytes=64 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    @staticmethod
+    def _tamanho(valor):
+        return getattr(valor, 'nbytes', 0)
+
+    def obter(self, chave, padrao=None):
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.falhas += 1
+            return padrao
+
+    def guardar(self, chave, valor):
+        tamanho = self._tamanho(valor)
+        if tamanho > self.max_bytes:
+            return
+        with self._trava:
+            if chave in self._itens:
+                self.bytes -= self._tamanho(self._itens.pop(chave))
+            self._itens[chave] = valor
+            self.bytes += tamanho
+            while len(self._itens) > self.max_entradas or self.bytes > self.max_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self.bytes -= self._tamanho(removido)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self.bytes = 0
+
+    def estatisticas(self):
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                'entradas': len(self._itens),
+                'bytes': self.bytes,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': (self.acertos / consultas * 100) if consultas > 0 else 0,
+            }
+
+
+# Linhas resultantes de cada estado de filtros, por dataset e versão
+cache_filtros = CacheLRU()
+
+_SEM_ENTRADA = object()
+
+# Condições das tabelas de detalhe: máscara pandas e a mesma regra em SQL (armazém)
+CONDICOES = {
+    'nao_conciliado': (lambda df: ~df['Conciliado'], '"Conciliado" = 0'),
+    'nao_conforme': (
+        lambda df: ~mascara_conformidade(df),
+        'NOT ("Mes_Emissao" = "Mes_Registro" AND "Mes_Emissao" > 0)',
+    ),
+}
+
+
+def filtrar_dataset(df, nome, selecoes, data_inicio=None, data_fim=None):
+    """
+    Aplica o estado de filtros (dimensões e período) a um dataset
+    e retorna o DataFrame filtrado
+    As linhas de cada estado ficam no cache_filtros, então a mesma combinação
+    de filtros vinda de outra página ou sessão não é recalculada
+    Sem filtro ativo (a visão padrão) retorna o próprio dataset compartilhado,
+    sem cópia: o resultado é somente leitura; para acrescentar colunas use
+    .assign(), que devolve um DataFrame novo
+    Para um recorte do armazém retorna outro recorte sem linhas, com o estado
+    de filtros em attrs['filtros'] (ver linhas_filtradas)
+    """
+    if armazem.recorte_armazem(df):
+        recorte = df.iloc[:0]
+        recorte.attrs['filtros'] = {'selecoes': selecoes, 'data_inicio': data_inicio, 'data_fim': data_fim}
+        return recorte
+
+    indice = indice_filtros(df, nome)
+    chave = (nome,) + indice.chave(selecoes, data_inicio, data_fim)
+
+    linhas = cache_filtros.obter(chave, _SEM_ENTRADA)
+    if linhas is _SEM_ENTRADA:
+        linhas = indice.resolver(selecoes, data_inicio, data_fim)
+        if linhas is not None:
+            # Entradas do cache são compartilhadas: somente leitura
+            linhas.flags.writeable = False
+        cache_filtros.guardar(chave, linhas)
+
+    if linhas is None:
+        return df
+    return df.take(linhas)
+
+
+def linhas_filtradas(df_filtrado, colunas=None, condicao=None, limite=None):
+    """
+    Linhas de um DataFrame filtrado (filtrar_dataset), só com as colunas pedidas
+    condicao: nome de uma condição de CONDICOES (ex.: 'nao_conciliado')
+    limite: no máximo N linhas, as primeiras do relatório (tabelas de detalhe)
+    Em memória é um recorte do próprio DataFrame; de um recorte do armazém as
+    linhas vêm por SQL (filtro, condição e LIMIT no banco), com o mesmo índice
+    Exemplo: linhas_filtradas(pr_filtrado, ['Fornecedor', 'Categoria'], 'nao_conciliado', limite=20)
+    """
+    if armazem.recorte_armazem(df_filtrado):
+        return armazem.ler_linhas(
+            df_filtrado.attrs['dataset'], armazem.filtros_recorte(df_filtrado), colunas,
+            CONDICOES[condicao][1] if condicao else None, limite,
+        )
+
+    linhas = df_filtrado
+    if condicao:
+        linhas = linhas[CONDICOES[condicao][0](linhas)]
+    if colunas is not None:
+        linhas = linhas[list(colunas)]
+    if limite is not None:
+        linhas = linhas.head(limite)
+    return linhas
@@ -3,7 +3,18 @@ Funções auxiliares para o Dashboard Financeiro
 """
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
+
+from utils.desempenho import medido
+from utils.data_loader import catalogos_filtros
+from utils.filtros import empresas_do_grupo, filtrar_dataset, montar_filtros
+from utils.moeda import coluna_em_reais
+from utils.series import PONTOS_POR_TRACE, reduzir_pontos
+# Situação de vencimento: reexportada daqui, onde ficava antes de utils/vencimentos.py
+from utils.vencimentos import (  # noqa: F401
+    SITUACAO_SEM_VENCIMENTO, SITUACOES_VENCIMENTO,
+    calcular_situacao_vencimento, classificar_vencimentos, resumir_vencimentos,
+)
 
 def format_currency_br(value):
     """
@@ -24,6 +35,82 @@ def format_currency_br(value):
     
     return formatted
 
+# Tamanho do bloco processado de uma vez pelo formatador vetorizado (limita a memória)
+_BLOCO_FORMATACAO = 100_000
+
+def _texto_br_vetorizado(centavos, negativo, prefixo):
+    """
+    Monta os textos no padrão brasileiro a partir de centavos inteiros (não negativos)
+    Constrói uma matriz de caracteres (linhas x posições) só com aritmética inteira,
+    alinhada à direita, e depois desloca cada linha para a esquerda
+    """
+    n = len(centavos)
+    reais = centavos // 100
+    
+    n_digitos = np.ones(n, dtype=np.int64)
+    for potencia in range(1, 19):
+        n_digitos += reais >= 10 ** potencia
+    largura_inteiro = n_digitos + (n_digitos - 1) // 3
+    max_digitos = int(n_digitos.max()) if n else 1
+    largura = 1 + int(largura_inteiro.max() if n else 1) + 3
+    
+    matriz = np.zeros((n, largura), dtype=np.uint32)
+    matriz[:, -1] = ord('0') + centavos % 10
+    matriz[:, -2] = ord('0') + (centavos // 10) % 10
+    matriz[:, -3] = ord(',')
+    
+    coluna = largura - 4
+    for posicao in range(max_digitos):
+        if posicao > 0 and posicao % 3 == 0:
+            matriz[:, coluna] = np.where(n_digitos > posicao, ord('.'), 0)
+            coluna -= 1
+        matriz[:, coluna] = np.where(n_digitos > posicao, ord('0') + (reais // 10 ** posicao) % 10, 0)
+        coluna -= 1
+    
+    linhas_negativas = np.flatnonzero(negativo)
+    matriz[linhas_negativas, largura - 4 - largura_inteiro[linhas_negativas]] = ord('-')
+    
+    # Desloca cada linha para a esquerda; zeros à direita somem na conversão para texto
+    deslocamento = largura - (largura_inteiro + 3 + negativo)
+    indices = np.arange(largura)[None, :] + deslocamento[:, None]
+    matriz = np.take_along_axis(matriz, np.minimum(indices, largura - 1), axis=1)
+    matriz[indices >= largura] = 0
+    
+    inicio = np.tile(np.array([ord(c) for c in prefixo], dtype=np.uint32), (n, 1))
+    matriz = np.ascontiguousarray(np.hstack([inicio, matriz]))
+    return matriz.view(f'U{matriz.shape[1]}').ravel().astype(object)
+
+def format_currency_br_array(valores):
+    """
+    Versão vetorizada de format_currency_br para colunas inteiras
+    Aceita Series, array NumPy ou lista; NaN vira "R$ 0,00"
+    Retorna Series com o mesmo índice quando recebe Series, senão array NumPy
+    Exemplo: [519247.8, None] → ['R$ 519.247,80', 'R$ 0,00']
+    """
+    indice = valores.index if isinstance(valores, pd.Series) else None
+    numeros = pd.Series(valores).to_numpy(dtype='float64', na_value=np.nan)
+    numeros = np.where(np.isnan(numeros), 0.0, numeros)
+    
+    with np.errstate(invalid='ignore'):
+        escalado = np.abs(numeros) * 100
+        # Casos em que o arredondamento binário pode divergir do f-string
+        # (meio centavo exato, valores enormes, infinitos) usam o formatador escalar
+        fracao = escalado - np.floor(escalado)
+        ambiguos = ~np.isfinite(escalado) | (escalado >= 1e15) | (np.abs(fracao - 0.5) < 1e-6)
+    centavos = np.round(np.where(ambiguos, 0.0, escalado)).astype(np.int64)
+    negativo = np.signbit(numeros).astype(np.int64)
+    
+    resultado = np.empty(len(numeros), dtype=object)
+    for inicio in range(0, len(numeros), _BLOCO_FORMATACAO):
+        bloco = slice(inicio, inicio + _BLOCO_FORMATACAO)
+        resultado[bloco] = _texto_br_vetorizado(centavos[bloco], negativo[bloco], 'R$ ')
+    for i in np.flatnonzero(ambiguos):
+        resultado[i] = format_currency_br(numeros[i])
+    
+    if indice is not None:
+        return pd.Series(resultado, index=indice, dtype=object)
+    return resultado
+
 def format_number_br(value):
     """
     Formata número para padrão brasileiro sem símbolo de moeda
@@ -39,27 +126,75 @@ def format_number_br(value):
     
     return formatted
 
-def apply_filters_sidebar(pr, cr, par):
+def rotulo_mes(chaves):
+    """
+    Converte chaves inteiras de mês (yyyymm) em rótulos 'AAAA-MM' para os gráficos
+    Exemplo: 202504 → 2025-04
+    """
+    chaves = pd.Series(chaves)
+    return (chaves // 100).astype(str) + '-' + (chaves % 100).astype(str).str.zfill(2)
+
+def pontos_do_grafico(df, coluna_x, coluna_y, chave, grupo=None):
+    """
+    Prepara uma série longa para o gráfico: quando algum trace passa do
+    orçamento de pontos, mostra um seletor de intervalo (zoom) e reduz os
+    pontos com LTTB; em um intervalo curto o gráfico volta à resolução completa
+    O total exibido na legenda é calculado sobre todos os pontos do intervalo
+    """
+    tamanho_trace = df.groupby(grupo, observed=True).size().max() if grupo and len(df) else len(df)
+    if tamanho_trace <= PONTOS_POR_TRACE:
+        return df
+
+    datas = pd.to_datetime(df[coluna_x])
+    inicio, fim = datas.min().date(), datas.max().date()
+    intervalo = st.slider(
+        "🔎 Intervalo do gráfico",
+        min_value=inicio,
+        max_value=fim,
+        value=(inicio, fim),
+        format="DD/MM/YYYY",
+        key=chave,
+    )
+    janela = df[(datas >= pd.Timestamp(intervalo[0])) & (datas < pd.Timestamp(intervalo[1]) + pd.Timedelta(days=1))]
+    reduzido = reduzir_pontos(janela, coluna_x, coluna_y, grupo)
+    total = format_currency_br(janela[coluna_y].sum())
+    exibidos, pontos, orcamento = (f"{n:,}".replace(',', '.') for n in (len(reduzido), len(janela), PONTOS_POR_TRACE))
+    if len(reduzido) < len(janela):
+        st.caption(
+            f"Exibindo {exibidos} de {pontos} pontos (LTTB, até {orcamento} por série) · "
+            f"Total no intervalo: {total}. Reduza o intervalo para ver todos os pontos."
+        )
+    else:
+        st.caption(f"Resolução completa: {pontos} pontos · Total no intervalo: {total}")
+    return reduzido
+
+@medido('filtros da sidebar', linhas_entrada=lambda args, kwargs: sum(len(df) for df in args[:3] if df is not None))
+def apply_filters_sidebar(pr=None, cr=None, par=None):
     """
     Aplica filtros globais na sidebar e retorna dataframes filtrados
     Inclui filtros de Grupo de Empresa, Empresa, Grupo de Despesa, Categoria e Período
+    As opções vêm dos catálogos pré-calculados dos três relatórios, então a sidebar
+    é a mesma em todas as páginas sem que cada página carregue todos os datasets;
+    datasets não informados (None) voltam como None
     """
     st.sidebar.title("🔍 Filtros")
     
+    # Listas de opções de cada dataset (sem carregar os datasets completos)
+    catalogos = catalogos_filtros('pr', 'cr', 'par').values()
+    
     # Filtro de Grupo de Empresa
-    grupos_empresa_disponiveis = ['Todos'] + sorted(list(set(
-        list(pr['Grupo'].unique()) + 
-        list(cr['Grupo'].unique()) + 
-        list(par['Grupo'].unique())
-    )))
+    grupos_empresa_disponiveis = ['Todos'] + sorted(set(
+        valor for catalogo in catalogos for valor in catalogo['valores'].get('grupo', [])
+    ))
     grupo_empresa_selecionado = st.sidebar.selectbox("Grupo da Empresa", grupos_empresa_disponiveis, key='filtro_grupo_empresa')
     
     # Filtro de Empresa
     if grupo_empresa_selecionado != 'Todos':
-        empresas_pr = pr[pr['Grupo'] == grupo_empresa_selecionado]['Minha Empresa (Nome Fantasia)'].unique() if 'Minha Empresa (Nome Fantasia)' in pr.columns else []
-        empresas_cr = cr[cr['Grupo'] == grupo_empresa_selecionado]['Minha Empresa (Razão Social)'].unique() if 'Minha Empresa (Razão Social)' in cr.columns else []
-        empresas_par = par[par['Grupo'] == grupo_empresa_selecionado]['Minha Empresa (Razão Social)'].unique() if 'Minha Empresa (Razão Social)' in par.columns else []
-        empresas_disponiveis = ['Todas'] + sorted(list(set(list(empresas_pr) + list(empresas_cr) + list(empresas_par))))
+        empresas_disponiveis = ['Todas'] + sorted(set(
+            valor
+            for catalogo in catalogos
+            for valor in empresas_do_grupo(catalogo, grupo_empresa_selecionado)
+        ))
     else:
         empresas_disponiveis = ['Todas']
     
@@ -69,11 +204,10 @@ def apply_filters_sidebar(pr, cr, par):
     
     # Filtro de Grupo de Despesa/Receita
     # Usar coluna 'Grupo.1' que contém os tipos de despesa (Despesas Operacionais, Impostos, etc.)
-    grupos_despesa_pr = pr['Grupo.1'].unique().tolist() if 'Grupo.1' in pr.columns else []
-    grupos_despesa_cr = []  # Contas Recebidas não tem Grupo.1
-    grupos_despesa_par = par['Grupo.1'].unique().tolist() if 'Grupo.1' in par.columns else []
-    
-    todos_grupos_despesa = sorted(list(set(grupos_despesa_pr + grupos_despesa_cr + grupos_despesa_par)))
+    # Contas Recebidas não tem Grupo.1
+    todos_grupos_despesa = sorted(set(
+        valor for catalogo in catalogos for valor in catalogo['valores'].get('grupo_despesa', [])
+    ))
     grupos_despesa_selecionados = st.sidebar.multiselect(
         "Grupo (Tipo de Despesa/Receita)",
         options=todos_grupos_despesa,
@@ -83,11 +217,9 @@ def apply_filters_sidebar(pr, cr, par):
     )
     
     # Filtro de Categoria
-    categorias_pr = pr['Categoria'].unique().tolist() if 'Categoria' in pr.columns else []
-    categorias_cr = cr['Categoria'].unique().tolist() if 'Categoria' in cr.columns else []
-    categorias_par = par['Categoria'].unique().tolist() if 'Categoria' in par.columns else []
-    
-    todas_categorias = sorted(list(set(categorias_pr + categorias_cr + categorias_par)))
+    todas_categorias = sorted(set(
+        valor for catalogo in catalogos for valor in catalogo['valores'].get('categoria', [])
+    ))
     categorias_selecionadas = st.sidebar.multiselect(
         "Categoria",
         options=todas_categorias,
@@ -100,16 +232,15 @@ def apply_filters_sidebar(pr, cr, par):
     st.sidebar.markdown("---")
     st.sidebar.subheader("📅 Período")
     
-    # Detectar datas disponíveis
-    datas_pr = pd.to_datetime(pr['Data de Registro (completa)'], errors='coerce').dropna() if 'Data de Registro (completa)' in pr.columns else pd.Series()
-    datas_cr = pd.to_datetime(cr['Data de Crédito ou Débito (No Extrato)'], errors='coerce').dropna() if 'Data de Crédito ou Débito (No Extrato)' in cr.columns else pd.Series()
-    datas_par = pd.to_datetime(par['Vencimento'], errors='coerce').dropna() if 'Vencimento' in par.columns else pd.Series()
-    
-    todas_datas = pd.concat([datas_pr, datas_cr, datas_par])
+    # Detectar datas disponíveis (extremos do índice ordenado de datas de cada dataset)
+    limites_datas = []
+    for catalogo in catalogos:
+        if catalogo['datas'] is not None:
+            limites_datas.extend(catalogo['datas'])
     
-    if len(todas_datas) > 0:
-        data_min = todas_datas.min().date()
-        data_max = todas_datas.max().date()
+    if len(limites_datas) > 0:
+        data_min = min(limites_datas).date()
+        data_max = max(limites_datas).date()
         
         col_data1, col_data2 = st.sidebar.columns(2)
         with col_data1:
@@ -122,157 +253,44 @@ def apply_filters_sidebar(pr, cr, par):
     
     st.sidebar.markdown("---")
     
-    # Aplicar filtros
-    pr_filtrado = pr.copy()
-    cr_filtrado = cr.copy()
-    par_filtrado = par.copy()
-    
-    # Filtro de Grupo de Empresa
-    if grupo_empresa_selecionado != 'Todos':
-        pr_filtrado = pr_filtrado[pr_filtrado['Grupo'] == grupo_empresa_selecionado]
-        cr_filtrado = cr_filtrado[cr_filtrado['Grupo'] == grupo_empresa_selecionado]
-        par_filtrado = par_filtrado[par_filtrado['Grupo'] == grupo_empresa_selecionado]
+    # Aplicar filtros: cada dataset resolve o estado em um array de linhas e é fatiado uma única vez
+    selecoes = montar_filtros(grupo_empresa_selecionado, empresa_selecionada, grupos_despesa_selecionados, categorias_selecionadas)['selecoes']
     
-    # Filtro de Empresa
-    if empresa_selecionada != 'Todas':
-        if 'Minha Empresa (Nome Fantasia)' in pr_filtrado.columns:
-            pr_filtrado = pr_filtrado[pr_filtrado['Minha Empresa (Nome Fantasia)'] == empresa_selecionada]
-        if 'Minha Empresa (Razão Social)' in cr_filtrado.columns:
-            cr_filtrado = cr_filtrado[cr_filtrado['Minha Empresa (Razão Social)'] == empresa_selecionada]
-        if 'Minha Empresa (Razão Social)' in par_filtrado.columns:
-            par_filtrado = par_filtrado[par_filtrado['Minha Empresa (Razão Social)'] == empresa_selecionada]
-    
-    # Filtro de Grupo de Despesa
-    if len(grupos_despesa_selecionados) > 0:
-        # Usar coluna 'Grupo.1' para tipos de despesa
-        if 'Grupo.1' in pr_filtrado.columns:
-            pr_filtrado = pr_filtrado[pr_filtrado['Grupo.1'].isin(grupos_despesa_selecionados)]
-        # Contas Recebidas não tem Grupo.1, então não filtra
-        if 'Grupo.1' in par_filtrado.columns:
-            par_filtrado = par_filtrado[par_filtrado['Grupo.1'].isin(grupos_despesa_selecionados)]
-    
-    # Filtro de Categoria
-    if len(categorias_selecionadas) > 0:
-        if 'Categoria' in pr_filtrado.columns:
-            pr_filtrado = pr_filtrado[pr_filtrado['Categoria'].isin(categorias_selecionadas)]
-        if 'Categoria' in cr_filtrado.columns:
-            cr_filtrado = cr_filtrado[cr_filtrado['Categoria'].isin(categorias_selecionadas)]
-        if 'Categoria' in par_filtrado.columns:
-            par_filtrado = par_filtrado[par_filtrado['Categoria'].isin(categorias_selecionadas)]
-    
-    # Filtro de Período
-    if data_inicio and data_fim:
-        # Converter para datetime
-        data_inicio_dt = pd.to_datetime(data_inicio)
-        data_fim_dt = pd.to_datetime(data_fim)
-        
-        # Filtrar Pagamentos Realizados
-        if 'Data de Registro (completa)' in pr_filtrado.columns:
-            pr_filtrado['_data_temp'] = pd.to_datetime(pr_filtrado['Data de Registro (completa)'], errors='coerce')
-            pr_filtrado = pr_filtrado[
-                (pr_filtrado['_data_temp'] >= data_inicio_dt) & 
-                (pr_filtrado['_data_temp'] <= data_fim_dt)
-            ]
-            pr_filtrado = pr_filtrado.drop('_data_temp', axis=1)
-        
-        # Filtrar Contas Recebidas
-        if 'Data de Crédito ou Débito (No Extrato)' in cr_filtrado.columns:
-            cr_filtrado['_data_temp'] = pd.to_datetime(cr_filtrado['Data de Crédito ou Débito (No Extrato)'], errors='coerce')
-            cr_filtrado = cr_filtrado[
-                (cr_filtrado['_data_temp'] >= data_inicio_dt) & 
-                (cr_filtrado['_data_temp'] <= data_fim_dt)
-            ]
-            cr_filtrado = cr_filtrado.drop('_data_temp', axis=1)
-        
-        # Filtrar Pagamentos a Realizar
-        if 'Vencimento' in par_filtrado.columns:
-            par_filtrado['_data_temp'] = pd.to_datetime(par_filtrado['Vencimento'], errors='coerce')
-            par_filtrado = par_filtrado[
-                (par_filtrado['_data_temp'] >= data_inicio_dt) & 
-                (par_filtrado['_data_temp'] <= data_fim_dt)
-            ]
-            par_filtrado = par_filtrado.drop('_data_temp', axis=1)
+    pr_filtrado, cr_filtrado, par_filtrado = (
+        filtrar_dataset(df, nome, selecoes, data_inicio, data_fim) if df is not None else None
+        for df, nome in ((pr, 'pr'), (cr, 'cr'), (par, 'par'))
+    )
     
     return pr_filtrado, cr_filtrado, par_filtrado, grupo_empresa_selecionado, empresa_selecionada, data_inicio, data_fim, grupos_despesa_selecionados, categorias_selecionadas
 
-def calcular_situacao_vencimento(data_vencimento):
-    """
-    Calcula a situação de vencimento de uma data
-    Retorna categoria e ordem para ordenação temporal
-    """
-    if pd.isna(data_vencimento):
-        return "Sem data de vencimento", 99
-    
-    hoje = pd.Timestamp.now().normalize()
-    data_venc = pd.to_datetime(data_vencimento).normalize()
-    dias_diff = (data_venc - hoje).days
-    
-    # Ordenação temporal conforme especificado
-    if dias_diff == 0:
-        return "Vence hoje", 1
-    elif dias_diff == 1:
-        return "Vence amanhã", 2
-    elif 2 <= dias_diff <= 7:
-        return "Vence nos próximos dias", 3
-    elif 8 <= dias_diff <= 30:
-        return "A vencer até 30 dias", 4
-    elif 31 <= dias_diff <= 60:
-        return "A vencer de 31 até 60 dias", 5
-    elif 61 <= dias_diff <= 90:
-        return "A vencer de 61 até 90 dias", 6
-    elif -30 <= dias_diff < 0:
-        return "Vencido até 30 dias", 7
-    elif -60 <= dias_diff < -30:
-        return "Vencido de 31 a 60 dias", 8
-    elif dias_diff < -90:
-        return "Vencido mais de 90 dias", 9
-    else:
-        return "A vencer (mais de 90 dias)", 10
-
-def criar_tabela_vencimentos(df, coluna_vencimento='Vencimento', coluna_valor='Valor Líquido'):
+@medido('tabela de vencimentos', linhas_entrada=lambda args, kwargs: len(args[0]))
+def criar_tabela_vencimentos(df, coluna_vencimento='Vencimento', coluna_valor='Valor Líquido', as_of=None, relatorio=None):
     """
     Cria tabela de valores por situação de vencimento
     Ordenada temporalmente conforme especificação
+    as_of fixa a data de referência (padrão: hoje)
+    relatorio: resultado do lote para os filtros atuais (motor.ler_relatorio_precomputado),
+    cuja tabela é usada no lugar do cálculo sobre df
     """
-    if coluna_vencimento not in df.columns or coluna_valor not in df.columns:
-        return pd.DataFrame()
-    
-    # Adicionar situação de vencimento
-    df_temp = df.copy()
-    df_temp['Situacao_Vencimento'] = df_temp[coluna_vencimento].apply(
-        lambda x: calcular_situacao_vencimento(x)[0]
-    )
-    df_temp['Ordem_Vencimento'] = df_temp[coluna_vencimento].apply(
-        lambda x: calcular_situacao_vencimento(x)[1]
-    )
-    
-    # Agrupar por situação
-    tabela = df_temp.groupby(['Situacao_Vencimento', 'Ordem_Vencimento']).agg({
-        coluna_valor: ['sum', 'count']
-    }).reset_index()
-    
-    tabela.columns = ['Situação do Vencimento', 'Ordem', 'Valor Total', 'Quantidade']
-    
-    # Ordenar por ordem temporal
-    tabela = tabela.sort_values('Ordem')
-    
-    # Formatar valores
-    tabela['Valor Total Formatado'] = tabela['Valor Total'].apply(format_currency_br)
-    
-    # Remover coluna de ordem (usada apenas para ordenação)
-    tabela_final = tabela[['Situação do Vencimento', 'Valor Total Formatado', 'Quantidade']].copy()
-    tabela_final.columns = ['Situação do Vencimento', 'Valor Total', 'Quantidade']
+    if relatorio is not None:
+        tabela_final = pd.DataFrame(relatorio['vencimentos'])
+    else:
+        tabela_final = resumir_vencimentos(df, coluna_vencimento, coluna_valor, as_of)
+    if len(tabela_final.columns) > 0:
+        tabela_final['Valor Total'] = format_currency_br_array(tabela_final['Valor Total'])
     
     return tabela_final
 
-def format_dataframe_currency(df, currency_columns):
+def format_dataframe_currency(df, currency_columns, max_linhas=None):
     """
     Formata colunas de moeda em um DataFrame para exibição
+    Colunas em centavos (DASHBOARD_CENTAVOS) são convertidas para reais antes
+    Com max_linhas, formata (e retorna) apenas as linhas que serão exibidas
     """
-    df_display = df.copy()
+    df_display = df.head(max_linhas).copy() if max_linhas is not None else df.copy()
     
     for col in currency_columns:
         if col in df_display.columns:
-            df_display[col] = df_display[col].apply(format_currency_br)
+            df_display[col] = format_currency_br_array(coluna_em_reais(df_display[col]))
     
     return df_display
@@ -0,0 +1,816 @@
+"""
+Camada de ingestão dos relatórios financeiros
+Converte cada planilha Excel uma única vez em um snapshot colunar (Parquet)
+e passa a ler o snapshot enquanto o arquivo de origem não mudar.
+Exportações cumulativas (só crescem no fim) podem ser lidas de forma
+incremental: ver ler_incremento
+"""
+import os
+import glob
+import json
+import hashlib
+import logging
+import zipfile
+import tempfile
+import threading
+import posixpath
+import itertools
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.moeda import centavos_ativos, em_centavos, para_centavos
+
+logger = logging.getLogger(__name__)
+
+# Pasta dos relatórios; DASHBOARD_DATA_DIR aponta para outra (ex.: dados sintéticos)
+DATA_DIR = os.environ.get('DASHBOARD_DATA_DIR', 'data')
+CACHE_DIR = os.path.join(DATA_DIR, '.cache')
+
+# Versão do formato do snapshot: incrementar invalida todos os snapshots existentes
+VERSAO_SNAPSHOT = 1
+
+# Partes anexadas ao snapshot (leituras incrementais) antes de regravá-lo em um único arquivo
+MAX_PARTES_SNAPSHOT = 16
+
+# Uma trava por planilha de origem: o snapshot de cada uma é gravado por uma thread de cada vez
+_travas_snapshot = {}
+_trava_travas = threading.Lock()
+
+
+def parquet_disponivel():
+    """
+    Indica se há engine Parquet (pyarrow) instalada
+    Sem ela a ingestão cai de volta para a leitura direta do Excel
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    """
+    Calcula o hash SHA-256 do conteúdo de um arquivo
+    """
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _trava_snapshot(caminho_origem):
+    """
+    Trava que serializa a gravação do snapshot de uma planilha no processo
+    (ex.: aquecimento carregando o relatório enquanto a página lê o catálogo)
+    """
+    with _trava_travas:
+        return _travas_snapshot.setdefault(os.path.abspath(caminho_origem), threading.Lock())
+
+
+def _caminhos_snapshot(nome_arquivo, cache_dir):
+    base = os.path.splitext(os.path.basename(nome_arquivo))[0]
+    return os.path.join(cache_dir, f'{base}.parquet'), os.path.join(cache_dir, f'{base}.json')
+
+
+def _ler_snapshot(caminho_parquet, manifesto, colunas=None):
+    """
+    Lê o snapshot: o arquivo principal e as partes anexadas depois dele, em ordem
+    """
+    pasta = os.path.dirname(caminho_parquet)
+    caminhos = [caminho_parquet] + [os.path.join(pasta, parte) for parte in manifesto.get('partes', [])]
+    partes = [pd.read_parquet(caminho, columns=colunas) for caminho in caminhos]
+    if len(partes) == 1:
+        return partes[0]
+    return pd.concat(partes, ignore_index=True)
+
+
+def _remover_partes(caminho_parquet):
+    for parte in glob.glob(glob.escape(os.path.splitext(caminho_parquet)[0]) + '.parte*.parquet'):
+        os.remove(parte)
+
+
+def _ler_manifesto(caminho_manifesto):
+    try:
+        with open(caminho_manifesto, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_atomico(caminho, gravar):
+    """
+    Grava `caminho` por um arquivo temporário próprio desta escrita (na mesma
+    pasta) trocado de uma vez no final: leitores nunca veem um arquivo pela
+    metade e escritores simultâneos não disputam o mesmo temporário
+    gravar: função que recebe o caminho do temporário; em erro ele é apagado
+    """
+    descritor, temporario = tempfile.mkstemp(
+        dir=os.path.dirname(caminho) or '.', prefix=os.path.basename(caminho) + '.', suffix='.tmp'
+    )
+    os.close(descritor)
+    try:
+        gravar(temporario)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def _gravar_json_atomico(caminho, conteudo):
+    def gravar(temporario):
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(conteudo, f, ensure_ascii=False, indent=2)
+    _gravar_atomico(caminho, gravar)
+
+
+def _serializar_colunas(colunas):
+    """
+    Parquet só aceita nomes de coluna em texto; cabeçalhos que o Excel
+    entrega como data (ex.: PrevisaoFaturamento) são guardados no manifesto
+    para serem restaurados na leitura
+    """
+    serializadas = []
+    for coluna in colunas:
+        if isinstance(coluna, datetime):
+            serializadas.append({'tipo': 'datetime', 'valor': coluna.isoformat()})
+        else:
+            serializadas.append({'tipo': 'str', 'valor': str(coluna)})
+    return serializadas
+
+
+def _restaurar_colunas(serializadas):
+    colunas = []
+    for coluna in serializadas:
+        if coluna['tipo'] == 'datetime':
+            colunas.append(datetime.fromisoformat(coluna['valor']))
+        else:
+            colunas.append(coluna['valor'])
+    return colunas
+
+
+def snapshot_valido(caminho_origem, manifesto):
+    """
+    Verifica se o manifesto corresponde ao arquivo de origem atual
+    Tamanho e mtime iguais bastam; se diferirem, o hash do conteúdo decide
+    (ex.: arquivo copiado de novo sem alteração)
+    Retorna (valido, assinatura_atual)
+    """
+    stat = os.stat(caminho_origem)
+    assinatura = {'tamanho': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    if not manifesto or manifesto.get('versao') != VERSAO_SNAPSHOT:
+        return False, assinatura
+
+    origem = manifesto.get('origem', {})
+    if origem.get('tamanho') == assinatura['tamanho'] and origem.get('mtime_ns') == assinatura['mtime_ns']:
+        assinatura['sha256'] = origem.get('sha256')
+        return True, assinatura
+
+    assinatura['sha256'] = hash_arquivo(caminho_origem)
+    return assinatura['sha256'] == origem.get('sha256'), assinatura
+
+
+def construir_snapshot(caminho_origem, cache_dir=CACHE_DIR, assinatura=None):
+    """
+    Lê a planilha Excel e grava o snapshot Parquet e seu manifesto
+    Retorna o DataFrame lido do Excel
+    """
+    df = pd.read_excel(caminho_origem)
+
+    if assinatura is None:
+        stat = os.stat(caminho_origem)
+        assinatura = {'tamanho': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if not assinatura.get('sha256'):
+        assinatura['sha256'] = hash_arquivo(caminho_origem)
+
+    caminho_parquet, caminho_manifesto = _caminhos_snapshot(caminho_origem, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    manifesto = _ler_manifesto(caminho_manifesto)
+    if (manifesto and manifesto.get('versao') == VERSAO_SNAPSHOT and os.path.exists(caminho_parquet)
+            and manifesto.get('origem', {}).get('sha256') == assinatura['sha256']):
+        # Outro processo já gravou o snapshot desta planilha enquanto ela era lida
+        return df
+
+    df_gravacao = df.copy()
+    df_gravacao.columns = [str(coluna) for coluna in df.columns]
+    try:
+        _gravar_atomico(caminho_parquet, lambda temporario: df_gravacao.to_parquet(temporario, index=False))
+    except (ValueError, TypeError) as e:
+        # Colunas com tipos mistos que o Arrow não representa: segue sem snapshot
+        logger.warning("Snapshot não gerado para %s: %s", caminho_origem, e)
+        return df
+
+    _gravar_json_atomico(caminho_manifesto, {
+        'versao': VERSAO_SNAPSHOT,
+        'origem': assinatura,
+        'colunas': _serializar_colunas(df.columns),
+        'linhas': len(df),
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+    })
+    # Partes de leituras incrementais anteriores não fazem parte do snapshot novo
+    _remover_partes(caminho_parquet)
+    logger.info("Snapshot gerado para %s (%d linhas)", caminho_origem, len(df))
+    return df
+
+
+def _caminho_colunar(caminho_origem):
+    """
+    Exportação .parquet no lugar da planilha, quando o .xlsx não existe
+    """
+    caminho_colunar = os.path.splitext(caminho_origem)[0] + '.parquet'
+    if not os.path.exists(caminho_origem) and os.path.exists(caminho_colunar):
+        return caminho_colunar
+    return None
+
+
+def _projetar(df, colunas):
+    """
+    Mantém só as colunas pedidas que existem no relatório, na ordem do arquivo
+    """
+    if colunas is None:
+        return df
+    return df[[coluna for coluna in df.columns if coluna in colunas]]
+
+
+def ler_relatorio(nome_arquivo, data_dir=DATA_DIR, cache_dir=CACHE_DIR, colunas=None, chave=None):
+    """
+    Carrega um relatório de data/ a partir do snapshot colunar,
+    reconstruindo-o quando a planilha de origem mudou
+    colunas: lista das colunas a ler (None = todas); no Parquet as demais nem
+    são lidas do disco. Colunas ausentes no arquivo são ignoradas
+    chave: colunas da chave estável de linha (exportações cumulativas); guarda em
+    attrs['ancoras'] o que ler_incremento precisa para reconhecer esta leitura
+    """
+    if not chave:
+        return _ler_relatorio(nome_arquivo, data_dir, cache_dir, colunas)
+    lidas = None if colunas is None else list(colunas) + [coluna for coluna in chave if coluna not in colunas]
+    df = _ler_relatorio(nome_arquivo, data_dir, cache_dir, lidas)
+    df.attrs['ancoras'] = ancoras_relatorio(df, chave)
+    return _projetar(df, colunas)
+
+
+def _ler_relatorio(nome_arquivo, data_dir, cache_dir, colunas):
+    caminho_origem = os.path.join(data_dir, nome_arquivo)
+
+    caminho_colunar = _caminho_colunar(caminho_origem)
+    if caminho_colunar:
+        # Exportação já colunar (ex.: utils/sintetico.py): lida diretamente, sem snapshot
+        if colunas is None:
+            return pd.read_parquet(caminho_colunar)
+        import pyarrow.parquet as pq
+        existentes = [coluna for coluna in pq.read_schema(caminho_colunar).names if coluna in colunas]
+        return pd.read_parquet(caminho_colunar, columns=existentes)
+
+    if not parquet_disponivel():
+        if colunas is None:
+            return pd.read_excel(caminho_origem)
+        return pd.read_excel(caminho_origem, usecols=lambda coluna: coluna in colunas)
+
+    df, assinatura = _ler_snapshot_valido(caminho_origem, cache_dir, colunas)
+    if df is not None:
+        return df
+    with _trava_snapshot(caminho_origem):
+        # Outra thread pode ter gravado o snapshot enquanto esta esperava a trava
+        df, assinatura = _ler_snapshot_valido(caminho_origem, cache_dir, colunas)
+        if df is not None:
+            return df
+        # O snapshot guarda sempre todas as colunas; a projeção vale só para a memória
+        return _projetar(construir_snapshot(caminho_origem, cache_dir, assinatura), colunas)
+
+
+def _ler_snapshot_valido(caminho_origem, cache_dir, colunas):
+    """
+    Lê o snapshot da planilha se ele corresponde ao arquivo atual
+    Retorna (DataFrame ou None, assinatura atual da origem)
+    """
+    caminho_parquet, caminho_manifesto = _caminhos_snapshot(caminho_origem, cache_dir)
+    manifesto = _ler_manifesto(caminho_manifesto)
+    valido, assinatura = snapshot_valido(caminho_origem, manifesto)
+    if not valido or not os.path.exists(caminho_parquet):
+        return None, assinatura
+
+    if manifesto['origem'] != assinatura:
+        # Conteúdo idêntico com novo mtime: só atualiza o manifesto
+        manifesto['origem'] = assinatura
+        _gravar_json_atomico(caminho_manifesto, manifesto)
+    originais = _restaurar_colunas(manifesto['colunas'])
+    if colunas is None:
+        df = _ler_snapshot(caminho_parquet, manifesto)
+        df.columns = originais
+        return df, assinatura
+    selecionadas = [coluna for coluna in originais if coluna in colunas]
+    df = _ler_snapshot(caminho_parquet, manifesto, [str(coluna) for coluna in selecionadas])
+    df.columns = selecionadas
+    return df, assinatura
+
+
+def chaves_linhas(df, chave):
+    """
+    Chave estável de cada linha (hash de 64 bits das colunas `chave`)
+    Os valores são canonizados antes do hash (datas em ns, números arredondados
+    ao centavo, o resto como texto), para que a mesma linha lida do Excel, do
+    snapshot ou de uma exportação Parquet tenha a mesma chave
+    """
+    canonicas = {}
+    for coluna in chave:
+        serie = df[coluna]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            canonicas[coluna] = serie.to_numpy(dtype='datetime64[ns]').view('int64')
+        elif pd.api.types.is_numeric_dtype(serie):
+            canonicas[coluna] = serie.to_numpy(dtype='float64', na_value=np.nan).round(2)
+        else:
+            canonicas[coluna] = serie.astype(object).where(serie.notna(), '').astype(str).to_numpy()
+    return pd.util.hash_pandas_object(pd.DataFrame(canonicas), index=False).to_numpy()
+
+
+def ancoras_relatorio(df, chave):
+    """
+    Identificação de uma leitura de exportação cumulativa: número de linhas e
+    chaves da primeira e da última (None se não houver linhas)
+    """
+    if not len(df):
+        return None
+    chaves = chaves_linhas(df.iloc[[0, -1]], chave)
+    return {'linhas': len(df), 'primeira': int(chaves[0]), 'ultima': int(chaves[1])}
+
+
+def _desduplicar(cabecalho):
+    """
+    Nomes de coluna como o pandas os entrega (repetidos ganham .1, .2...)
+    """
+    vistos = {}
+    nomes = []
+    for nome in map(str, cabecalho):
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f'{nome}.{vistos[nome]}'
+        else:
+            vistos[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+
+def _converter_tipos(df, tipos):
+    """
+    Converte as colunas lidas da planilha para os tipos do snapshot
+    """
+    for coluna, tipo in tipos.items():
+        if pd.api.types.is_datetime64_any_dtype(tipo):
+            df[coluna] = pd.to_datetime(df[coluna], errors='coerce').astype(tipo)
+        elif pd.api.types.is_numeric_dtype(tipo) and tipo != bool:
+            df[coluna] = pd.to_numeric(df[coluna], errors='coerce').astype(tipo)
+        else:
+            df[coluna] = df[coluna].astype(tipo)
+    return df
+
+
+# Espaços de nomes do pacote xlsx (SpreadsheetML)
+_NS_PLANILHA = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_RELACOES = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PACOTE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def _relacoes_pacote(pacote, caminho):
+    """
+    Alvos das relações de uma parte do xlsx: {id: (tipo, caminho no zip)}
+    """
+    pasta, nome = posixpath.split(caminho)
+    arquivo_relacoes = posixpath.join(pasta, '_rels', f'{nome}.rels')
+    if arquivo_relacoes not in pacote.namelist():
+        return {}
+    relacoes = {}
+    for relacao in ET.fromstring(pacote.read(arquivo_relacoes)).iter(f'{_NS_PACOTE}Relationship'):
+        alvo = relacao.get('Target', '')
+        alvo = alvo.lstrip('/') if alvo.startswith('/') else posixpath.normpath(posixpath.join(pasta, alvo))
+        relacoes[relacao.get('Id')] = (relacao.get('Type', '').rsplit('/', 1)[-1], alvo)
+    return relacoes
+
+
+def _partes_planilha(pacote):
+    """
+    Partes do xlsx necessárias para ler a primeira planilha
+    Retorna (planilha, textos compartilhados, estilos, época das datas); as duas
+    partes do meio são None quando o arquivo não as tem
+    """
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+
+    caminho_livro = next((alvo for tipo, alvo in _relacoes_pacote(pacote, '').values() if tipo == 'officeDocument'),
+                         'xl/workbook.xml')
+    livro = ET.fromstring(pacote.read(caminho_livro))
+    relacoes = _relacoes_pacote(pacote, caminho_livro)
+    primeira = livro.find(f'{_NS_PLANILHA}sheets')[0]
+    planilha = relacoes[primeira.get(f'{_NS_RELACOES}id')][1]
+    por_tipo = {tipo: alvo for tipo, alvo in relacoes.values()}
+    propriedades = livro.find(f'{_NS_PLANILHA}workbookPr')
+    data1904 = propriedades is not None and propriedades.get('date1904') in ('1', 'true')
+    return (planilha, por_tipo.get('sharedStrings'), por_tipo.get('styles'),
+            CALENDAR_MAC_1904 if data1904 else CALENDAR_WINDOWS_1900)
+
+
+def _textos_compartilhados(pacote, caminho):
+    """
+    Tabela de textos compartilhados do xlsx (células do tipo 's' guardam o índice)
+    """
+    textos = []
+    if caminho is None:
+        return textos
+    for _, elemento in ET.iterparse(pacote.open(caminho)):
+        if elemento.tag != f'{_NS_PLANILHA}si':
+            continue
+        # Texto simples (<t>) ou trechos formatados (<r><t>); a leitura fonética (<rPh>) fica de fora
+        partes = [filho if filho.tag == f'{_NS_PLANILHA}t' else filho.find(f'{_NS_PLANILHA}t')
+                  for filho in elemento if filho.tag in (f'{_NS_PLANILHA}t', f'{_NS_PLANILHA}r')]
+        textos.append(''.join(parte.text or '' for parte in partes if parte is not None))
+        elemento.clear()
+    return textos
+
+
+def _estilos_data(pacote, caminho):
+    """
+    Índices dos estilos de célula com formato de data (o número da célula é uma data serial)
+    """
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+    if caminho is None:
+        return set()
+    estilos = ET.fromstring(pacote.read(caminho))
+    formatos = dict(BUILTIN_FORMATS)
+    personalizados = estilos.find(f'{_NS_PLANILHA}numFmts')
+    for formato in personalizados if personalizados is not None else ():
+        formatos[int(formato.get('numFmtId'))] = formato.get('formatCode', '')
+    celulas = estilos.find(f'{_NS_PLANILHA}cellXfs')
+    return {indice for indice, estilo in enumerate(celulas if celulas is not None else ())
+            if is_date_format(formatos.get(int(estilo.get('numFmtId', 0))) or '')}
+
+
+def _valor_celula(celula, textos, datas, epoca):
+    """
+    Valor de um elemento <c> da planilha, como o openpyxl o devolveria com data_only
+    """
+    from openpyxl.utils.datetime import from_excel
+
+    tipo = celula.get('t', 'n')
+    if tipo == 'inlineStr':
+        return ''.join(trecho.text or '' for trecho in celula.iter(f'{_NS_PLANILHA}t'))
+    valor = celula.find(f'{_NS_PLANILHA}v')
+    if valor is None or valor.text is None:
+        return None
+    texto = valor.text
+    if tipo == 's':
+        return textos[int(texto)]
+    if tipo == 'str':
+        return texto
+    if tipo == 'b':
+        return texto == '1'
+    if tipo == 'e':
+        return None
+    if tipo == 'd':
+        return datetime.fromisoformat(texto)
+    numero = float(texto) if any(caractere in texto for caractere in '.eE') else int(texto)
+    if int(celula.get('s', 0)) in datas:
+        return from_excel(numero, epoca)
+    return numero
+
+
+def _linhas_xml(fonte, textos, datas, epoca):
+    """
+    Percorre o XML de uma planilha em fluxo e gera as linhas não vazias como
+    {índice da coluna: valor}; cada <row> é descartado depois de lido
+    """
+    from openpyxl.utils.cell import column_index_from_string
+
+    dados = None
+    for evento, elemento in ET.iterparse(fonte, events=('start', 'end')):
+        if evento == 'start':
+            if elemento.tag == f'{_NS_PLANILHA}sheetData':
+                dados = elemento
+            continue
+        if elemento.tag != f'{_NS_PLANILHA}row':
+            continue
+        valores = {}
+        coluna = 0
+        for celula in elemento.iter(f'{_NS_PLANILHA}c'):
+            referencia = celula.get('r')
+            if referencia:
+                coluna = column_index_from_string(referencia.rstrip('0123456789')) - 1
+            valor = _valor_celula(celula, textos, datas, epoca)
+            if valor is not None:
+                valores[coluna] = valor
+            coluna += 1
+        if dados is not None:
+            dados.remove(elemento)
+        if valores:
+            yield valores
+
+
+class _LeitorTrechos:
+    """
+    Arquivo só de leitura sobre uma sequência de blocos de bytes (fonte do iterparse)
+    """
+
+    def __init__(self, trechos):
+        self._trechos = iter(trechos)
+
+    def read(self, tamanho=-1):
+        return next(self._trechos, b'')
+
+
+def _trechos_a_partir_da_linha(fonte, linha, tamanho_bloco=1 << 20):
+    """
+    Blocos do XML da planilha com as linhas anteriores a <row r="linha"> cortadas
+    sem passar pelo parser: o cabeçalho do XML (até <sheetData>) seguido do
+    trecho que começa na linha pedida
+    Retorna None se a planilha não tem essa linha marcada
+    """
+    abertura = b'<sheetData>'
+    marca = b'<row r="%d"' % linha
+    cabeca = None
+    pendente = b''
+    for bloco in iter(lambda: fonte.read(tamanho_bloco), b''):
+        pendente += bloco
+        if cabeca is None:
+            posicao = pendente.find(abertura)
+            if posicao < 0:
+                continue
+            cabeca = pendente[:posicao + len(abertura)]
+            pendente = pendente[posicao + len(abertura):]
+        posicao = pendente.find(marca)
+        if posicao >= 0:
+            return itertools.chain((cabeca, pendente[posicao:]), iter(lambda: fonte.read(tamanho_bloco), b''))
+        # Guarda o fim do bloco: a marca pode estar dividida entre dois blocos
+        pendente = pendente[-len(marca):]
+    return None
+
+
+def _ler_cauda_excel(caminho_origem, inicio):
+    """
+    Cabeçalho, primeira linha e linhas a partir de `inicio` da planilha (linhas
+    em branco não contam, como no read_excel)
+    O XML da primeira planilha é lido em fluxo direto do zip: o trecho anterior
+    a <row r="inicio + 2"> (cabeçalho na linha 1) é descompactado e descartado
+    sem passar pelo parser, e só as linhas da cauda são interpretadas.
+    Se a linha não estiver marcada, a planilha é percorrida inteira
+    Retorna (cabeçalho, primeira, cauda) em tuplas de valores
+    """
+    with zipfile.ZipFile(caminho_origem) as pacote:
+        caminho_planilha, caminho_textos, caminho_estilos, epoca = _partes_planilha(pacote)
+        textos = _textos_compartilhados(pacote, caminho_textos)
+        datas = _estilos_data(pacote, caminho_estilos)
+
+        with pacote.open(caminho_planilha) as fonte:
+            linhas = _linhas_xml(fonte, textos, datas, epoca)
+            cabecalho = next(linhas, {})
+            primeira = next(linhas, None)
+            linhas.close()
+        largura = max(cabecalho, default=-1) + 1
+
+        with pacote.open(caminho_planilha) as fonte:
+            trechos = _trechos_a_partir_da_linha(fonte, inicio + 2)
+            if trechos is not None:
+                cauda = list(_linhas_xml(_LeitorTrechos(trechos), textos, datas, epoca))
+        if trechos is None:
+            with pacote.open(caminho_planilha) as fonte:
+                cauda = list(itertools.islice(_linhas_xml(fonte, textos, datas, epoca), inicio + 1, None))
+
+    def em_tupla(valores):
+        return tuple(valores.get(coluna) for coluna in range(largura))
+
+    return (em_tupla(cabecalho), None if primeira is None else em_tupla(primeira),
+            [em_tupla(linha) for linha in cauda])
+
+
+def _ler_cauda_parquet(caminho, inicio, colunas):
+    """
+    Primeira linha e linhas a partir de `inicio` de uma exportação Parquet,
+    lendo só os grupos de linhas que contêm a cauda
+    Retorna (primeira, cauda) em DataFrames, ou None se o arquivo não chega à linha `inicio`
+    """
+    import pyarrow.parquet as pq
+
+    arquivo = pq.ParquetFile(caminho)
+    if arquivo.metadata.num_rows <= inicio:
+        return None
+    lidas = [coluna for coluna in arquivo.schema_arrow.names if colunas is None or coluna in colunas]
+    primeira = next(arquivo.iter_batches(batch_size=1, columns=lidas)).to_pandas()
+
+    grupos = []
+    deslocamento = None
+    fim = 0
+    for grupo in range(arquivo.num_row_groups):
+        linhas = arquivo.metadata.row_group(grupo).num_rows
+        if fim + linhas > inicio:
+            deslocamento = fim if deslocamento is None else deslocamento
+            grupos.append(grupo)
+        fim += linhas
+    if not grupos:
+        return primeira, primeira.iloc[:0]
+    cauda = arquivo.read_row_groups(grupos, columns=lidas).to_pandas()
+    return primeira, cauda.iloc[inicio - deslocamento:].reset_index(drop=True)
+
+
+def _anexar_snapshot(caminho_origem, cache_dir, manifesto, novas):
+    """
+    Grava as linhas novas como mais uma parte do snapshot e atualiza o manifesto
+    para a planilha atual; com muitas partes o snapshot é regravado em um arquivo
+    """
+    caminho_parquet, caminho_manifesto = _caminhos_snapshot(caminho_origem, cache_dir)
+    gravacao = novas.copy()
+    gravacao.columns = [str(coluna) for coluna in novas.columns]
+    partes = list(manifesto.get('partes', []))
+
+    if len(partes) >= MAX_PARTES_SNAPSHOT:
+        completo = pd.concat([_ler_snapshot(caminho_parquet, manifesto), gravacao], ignore_index=True)
+        _gravar_atomico(caminho_parquet, lambda temporario: completo.to_parquet(temporario, index=False))
+        partes = []
+    elif len(gravacao):
+        base = os.path.splitext(os.path.basename(caminho_parquet))[0]
+        parte = f"{base}.parte{manifesto['linhas']}.parquet"
+        _gravar_atomico(os.path.join(cache_dir, parte), lambda temporario: gravacao.to_parquet(temporario, index=False))
+        partes.append(parte)
+
+    stat = os.stat(caminho_origem)
+    _gravar_json_atomico(caminho_manifesto, dict(
+        manifesto,
+        origem={'tamanho': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': hash_arquivo(caminho_origem)},
+        linhas=manifesto['linhas'] + len(novas),
+        partes=partes,
+        gerado_em=datetime.now().isoformat(timespec='seconds'),
+    ))
+    if not partes:
+        _remover_partes(caminho_parquet)
+
+
+def ler_incremento(nome_arquivo, ancoras, chave, data_dir=DATA_DIR, cache_dir=CACHE_DIR, colunas=None):
+    """
+    Linhas acrescentadas a uma exportação cumulativa desde a leitura descrita
+    por `ancoras` (ver ler_relatorio com chave)
+    O prefixo já lido é reconhecido pela contagem e pela chave estável da
+    primeira e da última linha lidas; as linhas seguintes são lidas, anexadas ao
+    snapshot da planilha e devolvidas (brutas, só as colunas pedidas), com as
+    âncoras da leitura completa em attrs['ancoras'].
+    Pressupõe que linhas já exportadas não mudam. Retorna None quando o
+    arquivo não continua o anterior (linhas removidas, reordenadas ou com
+    âncoras diferentes): nesse caso é preciso ler o relatório inteiro
+    """
+    caminho_origem = os.path.join(data_dir, nome_arquivo)
+    inicio = ancoras['linhas']
+
+    caminho_colunar = _caminho_colunar(caminho_origem)
+    if caminho_colunar:
+        lidas = None if colunas is None else list(colunas) + [coluna for coluna in chave if coluna not in colunas]
+        resultado = _ler_cauda_parquet(caminho_colunar, inicio - 1, lidas)
+        if resultado is None:
+            return None
+        primeira, cauda = resultado
+        manifesto = None
+    else:
+        # A planilha precisa de um snapshot da leitura anterior: ele dá os nomes e tipos das colunas
+        if not os.path.exists(caminho_origem) or not parquet_disponivel():
+            return None
+        import pyarrow.parquet as pq
+
+        caminho_parquet, caminho_manifesto = _caminhos_snapshot(caminho_origem, cache_dir)
+        manifesto = _ler_manifesto(caminho_manifesto)
+        if (not manifesto or manifesto.get('versao') != VERSAO_SNAPSHOT or manifesto.get('linhas') != inicio
+                or not os.path.exists(caminho_parquet)):
+            return None
+        originais = _restaurar_colunas(manifesto['colunas'])
+        cabecalho, linha_inicial, linhas = _ler_cauda_excel(caminho_origem, inicio - 1)
+        if _desduplicar(cabecalho) != [str(coluna) for coluna in originais] or linha_inicial is None or not linhas:
+            return None
+        tipos = pq.read_schema(caminho_parquet).empty_table().to_pandas().dtypes
+        try:
+            primeira = _converter_tipos(pd.DataFrame([linha_inicial], columns=tipos.index), tipos)
+            cauda = _converter_tipos(pd.DataFrame(linhas, columns=tipos.index), tipos)
+        except (ValueError, TypeError) as e:
+            logger.info("Leitura incremental de %s descartada: %s", nome_arquivo, e)
+            return None
+        primeira.columns = originais
+        cauda.columns = originais
+
+    if any(coluna not in cauda.columns for coluna in chave) or not len(cauda):
+        return None
+    if (int(chaves_linhas(primeira, chave)[0]) != ancoras['primeira']
+            or int(chaves_linhas(cauda.iloc[:1], chave)[0]) != ancoras['ultima']):
+        return None
+
+    novas = cauda.iloc[1:].reset_index(drop=True)
+    if manifesto is not None:
+        with _trava_snapshot(caminho_origem):
+            # Só anexa se nenhuma outra thread mexeu no snapshot desde a leitura do manifesto
+            atual = _ler_manifesto(caminho_manifesto)
+            if atual is not None and atual.get('linhas') == inicio and atual.get('partes') == manifesto.get('partes'):
+                _anexar_snapshot(caminho_origem, cache_dir, atual, novas)
+    ancoras_novas = dict(ancoras, linhas=inicio + len(novas))
+    if len(novas):
+        ancoras_novas['ultima'] = int(chaves_linhas(novas.iloc[-1:], chave)[0])
+    novas = _projetar(novas, colunas)
+    novas.attrs['ancoras'] = ancoras_novas
+    return novas
+
+
+def anexar_linhas(df, novas):
+    """
+    Acrescenta a um relatório normalizado as linhas novas (também normalizadas)
+    As categorias passam a ser a união ordenada das duas partes, como se o
+    relatório inteiro tivesse sido normalizado de uma vez
+    """
+    novas = novas.copy()
+    ajustadas = {}
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype) and coluna in novas.columns:
+            categorias = df[coluna].cat.categories.union(novas[coluna].astype('category').cat.categories)
+            if not categorias.equals(df[coluna].cat.categories):
+                ajustadas[coluna] = df[coluna].cat.set_categories(categorias)
+            novas[coluna] = novas[coluna].astype('category').cat.set_categories(categorias)
+    if ajustadas:
+        df = df.assign(**ajustadas)
+    return pd.concat([df, novas], ignore_index=True)
+
+
+def versao_relatorio(nome_arquivo, data_dir=DATA_DIR):
+    """
+    Versão do arquivo de origem de um relatório (tamanho e mtime), ou None se ele não existir
+    Só um stat: barata o bastante para o observador de data/ consultar a cada poucos segundos
+    """
+    caminho_origem = os.path.join(data_dir, nome_arquivo)
+    caminho = _caminho_colunar(caminho_origem) or caminho_origem
+    try:
+        stat = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+
+def assinatura_relatorio(nome_arquivo, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    sha256 da planilha de origem, reaproveitando o manifesto do snapshot quando válido
+    Identifica a versão dos dados para quem guarda derivados (ex.: armazém SQLite)
+    """
+    caminho_origem = os.path.join(data_dir, nome_arquivo)
+    caminho_colunar = _caminho_colunar(caminho_origem)
+    if caminho_colunar:
+        return hash_arquivo(caminho_colunar)
+    _, caminho_manifesto = _caminhos_snapshot(caminho_origem, cache_dir)
+    valido, assinatura = snapshot_valido(caminho_origem, _ler_manifesto(caminho_manifesto))
+    if valido and assinatura.get('sha256'):
+        return assinatura['sha256']
+    return hash_arquivo(caminho_origem)
+
+
+def memoria_mb(df):
+    """
+    Memória ocupada por um DataFrame em MB (inclui o conteúdo de textos e categorias)
+    """
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def chave_mes(datas):
+    """
+    Converte uma série de datas em chave inteira de mês (yyyymm)
+    Datas ausentes recebem 0
+    Exemplo: 2025-04-25 → 202504
+    """
+    chave = datas.dt.year * 100 + datas.dt.month
+    return chave.fillna(0).astype('int32')
+
+
+def normalizar_relatorio(df, especificacao):
+    """
+    Normaliza um relatório no momento da carga, de acordo com o esquema:
+    - colunas de data convertidas para datetime64
+    - chaves inteiras de mês (yyyymm) para agrupamentos mensais
+    - colunas de dimensão convertidas para category
+    - colunas Sim/Não convertidas para bool (1 byte por linha, máscara direta)
+    - com DASHBOARD_CENTAVOS=1, coluna de valor em centavos inteiros (utils/moeda.py)
+    Assim nenhuma página precisa converter texto em data a cada interação
+    """
+    df = df.copy()
+
+    for coluna in especificacao.get('colunas_data', []):
+        if coluna in df.columns:
+            df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
+
+    for coluna_mes, coluna_data in especificacao.get('colunas_mes', {}).items():
+        if coluna_data in df.columns:
+            df[coluna_mes] = chave_mes(df[coluna_data])
+
+    for coluna in especificacao.get('colunas_categoricas', []):
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype('category')
+
+    for coluna, verdadeiro in especificacao.get('colunas_booleanas', {}).items():
+        if coluna in df.columns and df[coluna].dtype != bool:
+            df[coluna] = (df[coluna] == verdadeiro).to_numpy()
+
+    coluna_valor = especificacao.get('coluna_valor')
+    if centavos_ativos() and coluna_valor in df.columns and not em_centavos(df[coluna_valor]):
+        df[coluna_valor] = para_centavos(df[coluna_valor])
+
+    return df
@@ -0,0 +1,149 @@
+"""
+Kernel de métricas dos KPIs
+Calcula em uma única passada por dataset os números de cabeçalho das páginas:
+quantidade, valor, conciliados/não conciliados (quantidade e valor)
+e a menor/maior data do período
+"""
+import numpy as np
+import pandas as pd
+
+from utils.esquema import DATASETS
+from utils.moeda import em_centavos, para_reais
+
+# Medidas somáveis (agregáveis por grupo, no cubo e no armazém)
+MEDIDAS = ['valor', 'quantidade', 'conciliados', 'valor_conciliado', 'valor_nao_conciliado']
+
+# Métricas de cabeçalho devolvidas pelo kernel
+METRICAS = [
+    'quantidade', 'valor',
+    'conciliados', 'valor_conciliado',
+    'nao_conciliados', 'valor_nao_conciliado',
+    'data_min', 'data_max',
+]
+
+
+def colunas_kernel(df, nome):
+    """
+    Arrays usados pelo kernel: valor (ausente = 0), máscara de conciliado
+    e datas da coluna do filtro de período (None se o dataset não tiver)
+    """
+    especificacao = DATASETS[nome]
+    valores = df[especificacao['coluna_valor']].to_numpy(dtype='float64', na_value=np.nan)
+    valores = np.where(np.isnan(valores), 0.0, valores)
+
+    if 'Conciliado' in df.columns:
+        conciliado = df['Conciliado'].to_numpy(dtype=bool)
+    else:
+        conciliado = np.zeros(len(df), dtype=bool)
+
+    coluna_data = especificacao.get('coluna_data_filtro')
+    datas = df[coluna_data].to_numpy(dtype='datetime64[ns]') if coluna_data in df.columns else None
+    return valores, conciliado, datas
+
+
+def _limites_datas(datas):
+    if datas is None:
+        return None, None
+    validas = datas[~np.isnat(datas)]
+    if len(validas) == 0:
+        return None, None
+    return pd.Timestamp(validas.min()), pd.Timestamp(validas.max())
+
+
+def calcular_metricas(df, nome):
+    """
+    Métricas de cabeçalho de um DataFrame (já filtrado)
+    Contagens e somas por status de conciliação saem de um único bincount
+    Retorna dicionário com as chaves de METRICAS
+    (contagens inteiras, valores float, datas Timestamp ou None)
+    """
+    valores, conciliado, datas = colunas_kernel(df, nome)
+    status = conciliado.astype(np.intp)
+    quantidades = np.bincount(status, minlength=2)
+    somas = np.bincount(status, weights=valores, minlength=2)
+    data_min, data_max = _limites_datas(datas)
+
+    return {
+        'quantidade': int(quantidades.sum()),
+        'valor': float(valores.sum()),
+        'conciliados': int(quantidades[1]),
+        'valor_conciliado': float(somas[1]),
+        'nao_conciliados': int(quantidades[0]),
+        'valor_nao_conciliado': float(somas[0]),
+        'data_min': data_min,
+        'data_max': data_max,
+    }
+
+
+def resumir_metricas(tabela):
+    """
+    Métricas a partir de uma tabela já agregada (células do cubo)
+    com as colunas de medidas e data_min/data_max por célula
+    """
+    quantidade = int(tabela['quantidade'].sum())
+    conciliados = int(tabela['conciliados'].sum())
+    data_min = tabela['data_min'].min() if 'data_min' in tabela.columns else pd.NaT
+    data_max = tabela['data_max'].max() if 'data_max' in tabela.columns else pd.NaT
+
+    return {
+        'quantidade': quantidade,
+        'valor': float(tabela['valor'].sum()),
+        'conciliados': conciliados,
+        'valor_conciliado': float(tabela['valor_conciliado'].sum()),
+        'nao_conciliados': quantidade - conciliados,
+        'valor_nao_conciliado': float(tabela['valor_nao_conciliado'].sum()),
+        'data_min': None if pd.isna(data_min) else pd.Timestamp(data_min),
+        'data_max': None if pd.isna(data_max) else pd.Timestamp(data_max),
+    }
+
+
+def _coluna_ou_array(df, coluna_ou_valores):
+    if isinstance(coluna_ou_valores, str):
+        return df[coluna_ou_valores]
+    return pd.Series(np.asarray(coluna_ou_valores) if not isinstance(coluna_ou_valores, pd.Series)
+                     else coluna_ou_valores.array)
+
+
+def taxas_por_grupo(df, indicador, por, valores=None):
+    """
+    Taxa de um indicador booleano (ex.: conciliado, conforme) por grupo,
+    com um único groupby().sum() vetorizado (sem função Python por grupo)
+    indicador: coluna booleana de df ou array/Series booleana na ordem das linhas
+    (ausente = False)
+    por: coluna ou lista de colunas; várias dimensões formam grupos combinados (MultiIndex)
+    valores: opcional, coluna ou array com o valor de cada linha (ausente = 0;
+    colunas em centavos são somadas em centavos e devolvidas em reais)
+    Retorna DataFrame indexado pelos grupos com quantidade, marcados e taxa (%);
+    com valores, também valor, valor_marcados e taxa_valor (%)
+    Grupos sem valor total têm taxa_valor 0
+    """
+    por = [por] if isinstance(por, str) else list(por)
+    marcado = _coluna_ou_array(df, indicador).to_numpy(dtype=bool, na_value=False)
+
+    base = pd.DataFrame({coluna: df[coluna].array for coluna in por})
+    base['quantidade'] = np.ones(len(df), dtype=np.int64)
+    base['marcados'] = marcado.astype(np.int64)
+    if valores is not None:
+        serie_valores = _coluna_ou_array(df, valores)
+        numeros = serie_valores.to_numpy(dtype='float64', na_value=np.nan)
+        numeros = np.where(np.isnan(numeros), 0.0, numeros)
+        base['valor'] = numeros
+        base['valor_marcados'] = np.where(marcado, numeros, 0.0)
+
+    tabela = base.groupby(por, observed=True).sum()
+    tabela['taxa'] = tabela['marcados'] / tabela['quantidade'] * 100
+    if valores is not None and em_centavos(serie_valores):
+        tabela['valor'] = para_reais(tabela['valor'])
+        tabela['valor_marcados'] = para_reais(tabela['valor_marcados'])
+    if valores is not None:
+        total = tabela['valor'].to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tabela['taxa_valor'] = np.where(total != 0, tabela['valor_marcados'].to_numpy() / total * 100, 0.0)
+    return tabela
+
+
+def mascara_conformidade(df):
+    """
+    Conforme: emissão e registro no mesmo mês (chaves yyyymm, 0 = data ausente)
+    """
+    return (df['Mes_Emissao'] == df['Mes_Registro']) & (df['Mes_Emissao'] > 0)
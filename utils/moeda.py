@@ -0,0 +1,97 @@
+"""
+Valores monetários em centavos inteiros (opcional)
+Com DASHBOARD_CENTAVOS=1 a ingestão guarda a coluna de valor de cada relatório
+em centavos inteiros (Int64). Somas, agrupamentos, o cubo e o armazém passam a
+acumular inteiros: os totais são exatos (em float64 até 2^53 centavos, cerca de
+R$ 90 trilhões) e o mesmo total calculado em páginas diferentes é idêntico bit
+a bit. A conversão para reais acontece só na saída das agregações
+(utils/cubo.agregar, séries, vencimentos, taxas) e na formatação das tabelas
+de detalhe, conforme o dtype da coluna de origem; sem a variável os valores
+seguem em reais (float64)
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Medidas em unidade monetária (as demais são contagens)
+MEDIDAS_MONETARIAS = ('valor', 'valor_conciliado', 'valor_nao_conciliado')
+
+
+def centavos_ativos():
+    """
+    Indica se a ingestão guarda os valores em centavos inteiros
+    """
+    return os.environ.get('DASHBOARD_CENTAVOS', '') not in ('', '0')
+
+
+def para_centavos(valores):
+    """
+    Converte valores em reais para centavos inteiros (Int64, ausentes preservados)
+    Arredonda para o centavo mais próximo (0,1 + 0,2 vira exatamente 30 centavos)
+    """
+    serie = pd.Series(valores)
+    numeros = pd.to_numeric(serie, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    ausentes = np.isnan(numeros)
+    centavos = np.rint(np.where(ausentes, 0.0, numeros) * 100).astype(np.int64)
+    return pd.Series(pd.arrays.IntegerArray(centavos, ausentes), index=serie.index, name=serie.name)
+
+
+def em_centavos(valores):
+    """
+    Indica se uma coluna está em centavos (dtype Int64 gerado por para_centavos;
+    colunas inteiras comuns lidas do Excel são int64 e ficam em reais)
+    """
+    return isinstance(getattr(valores, 'dtype', None), pd.Int64Dtype)
+
+
+def para_reais(valores):
+    """
+    Converte somas em centavos (escalar, array, Series) para reais
+    """
+    if isinstance(valores, pd.Series):
+        return valores.astype('float64') / 100
+    if np.ndim(valores):
+        return np.asarray(valores, dtype='float64') / 100
+    return float(valores) / 100
+
+
+def coluna_em_reais(serie):
+    """
+    Valores linha a linha de uma coluna em reais (tabelas de detalhe)
+    Só colunas em centavos (Int64) são convertidas
+    """
+    if not em_centavos(serie):
+        return serie
+    return pd.Series(serie.to_numpy(dtype='float64', na_value=np.nan) / 100, index=serie.index, name=serie.name)
+
+
+def soma_em_reais(serie):
+    """
+    Soma de uma coluna de valor em reais; em centavos, a soma é inteira (exata)
+    """
+    if em_centavos(serie):
+        return para_reais(int(serie.sum()))
+    return serie.sum()
+
+
+def medidas_em_reais(resultado, medida=None):
+    """
+    Converte para reais as medidas monetárias de um resultado de agregação feito
+    sobre centavos: dicionário de métricas, DataFrame com colunas de MEDIDAS,
+    ou Series da `medida` informada
+    """
+    if isinstance(resultado, dict):
+        return {
+            chave: para_reais(valor) if chave in MEDIDAS_MONETARIAS else valor
+            for chave, valor in resultado.items()
+        }
+    if isinstance(resultado, pd.DataFrame):
+        resultado = resultado.copy()
+        for coluna in MEDIDAS_MONETARIAS:
+            if coluna in resultado.columns:
+                resultado[coluna] = para_reais(resultado[coluna])
+        return resultado
+    if medida in MEDIDAS_MONETARIAS:
+        return para_reais(resultado)
+    return resultado
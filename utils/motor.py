@@ -0,0 +1,571 @@
+"""
+Motor de relatórios sem Streamlit
+Calcula as métricas de todas as páginas (KPIs, conciliação, conformidade,
+vencimentos, Top 10, evolução mensal e previsão) para um estado de filtros,
+e gera em lote os resultados de todas as combinações Grupo/Empresa.
+
+Uso:
+    python -m utils.motor --saida resultados
+    python -m utils.motor --grupo "Electra Hydra" --inicio 2025-05-01 --fim 2025-10-31
+    python -m utils.motor --todas-combinacoes --processos 4 --formato parquet
+    python -m utils.motor --memoria
+
+O app e as páginas leem o resultado do lote (ler_relatorio_precomputado) quando
+ele corresponde ao estado de filtros e às versões dos dados em uso.
+"""
+import os
+import re
+import json
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from functools import lru_cache
+
+import pandas as pd
+
+from utils import armazem
+from utils.cubo import agregar
+from utils.esquema import DATASETS
+from utils.filtros import filtrar_dataset, indice_filtros, linhas_filtradas, montar_filtros
+from utils.ingest import (
+    CACHE_DIR, DATA_DIR, ler_relatorio, memoria_mb, normalizar_relatorio, parquet_disponivel, versao_relatorio,
+)
+from utils.metricas import mascara_conformidade, taxas_por_grupo
+from utils.vencimentos import resumir_vencimentos
+
+logger = logging.getLogger(__name__)
+
+# Empresa por nome fantasia: usada em Pagamentos Realizados e na Previsão de Faturamento
+EMPRESA_FANTASIA = 'Minha Empresa (Nome Fantasia)'
+
+# Pasta padrão dos relatórios em lote (lida pelo app quando há resultado pré-calculado)
+RELATORIOS_DIR = os.path.join(DATA_DIR, 'relatorios')
+
+# Seções do relatório que substituem agregações das páginas: (dataset, agrupamento) -> seção
+_KPIS = {'pr': 'despesas_realizadas', 'cr': 'receitas', 'par': 'despesas_pendentes'}
+_TOP10 = {
+    ('pr', 'Categoria'): 'categorias_despesas',
+    ('cr', 'Categoria'): 'categorias_receitas',
+    ('par', 'Categoria'): 'categorias_pendentes',
+    ('pr', 'Fornecedor'): 'fornecedores_realizados',
+    ('par', 'Razão Social'): 'fornecedores_pendentes',
+    ('cr', 'Cliente'): 'clientes',
+}
+_EVOLUCAO = {'pr': 'despesas', 'cr': 'receitas'}
+
+
+def carregar_dados(nomes=('pr', 'cr', 'par', 'pf'), data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    Lê e normaliza os datasets (mesmo caminho do data_loader, sem o cache do Streamlit)
+    """
+    return {
+        nome: normalizar_relatorio(
+            ler_relatorio(DATASETS[nome]['arquivo'], data_dir, cache_dir, DATASETS[nome].get('colunas')),
+            DATASETS[nome],
+        )
+        for nome in nomes
+    }
+
+
+def relatorio_memoria(nomes=('pr', 'cr', 'par', 'pf'), data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    Memória de cada dataset antes (todas as colunas, Sim/Não como categoria)
+    e depois da projeção do esquema (só as colunas usadas, Sim/Não como bool)
+    Retorna DataFrame com colunas e MB de cada forma
+    """
+    linhas = []
+    for nome in nomes:
+        especificacao = DATASETS[nome]
+        completo = normalizar_relatorio(ler_relatorio(especificacao['arquivo'], data_dir, cache_dir), {
+            **especificacao,
+            'colunas_categoricas': especificacao['colunas_categoricas'] + list(especificacao.get('colunas_booleanas', {})),
+            'colunas_booleanas': {},
+        })
+        projetado = carregar_dados((nome,), data_dir, cache_dir)[nome]
+        linhas.append({
+            'dataset': nome,
+            'linhas': len(projetado),
+            'colunas_antes': len(completo.columns),
+            'mb_antes': round(memoria_mb(completo), 2),
+            'colunas_depois': len(projetado.columns),
+            'mb_depois': round(memoria_mb(projetado), 2),
+        })
+    return pd.DataFrame(linhas)
+
+
+def limites_periodo(datasets):
+    """
+    Período padrão da sidebar: da menor à maior data entre os datasets filtráveis
+    """
+    limites = []
+    for nome in ('pr', 'cr', 'par'):
+        if armazem.recorte_armazem(datasets[nome]):
+            limites.extend(armazem.limites_datas(nome) or ())
+            continue
+        indice = indice_filtros(datasets[nome], nome)
+        if indice.datas is not None and indice.datas.limites() is not None:
+            limites.extend(indice.datas.limites())
+    if not limites:
+        return None, None
+    return min(limites).normalize(), max(limites).normalize()
+
+
+def estado_filtros(datasets, especificacao):
+    """
+    Estado de filtros a partir de uma especificação simples:
+    {'grupo', 'empresa', 'grupos_despesa', 'categorias', 'data_inicio', 'data_fim'}
+    Sem período informado usa o mesmo período padrão da sidebar
+    """
+    data_inicio, data_fim = limites_periodo(datasets)
+    if especificacao.get('data_inicio'):
+        data_inicio = pd.Timestamp(especificacao['data_inicio'])
+    if especificacao.get('data_fim'):
+        data_fim = pd.Timestamp(especificacao['data_fim'])
+
+    return montar_filtros(
+        especificacao.get('grupo') or 'Todos',
+        especificacao.get('empresa') or 'Todas',
+        especificacao.get('grupos_despesa') or [],
+        especificacao.get('categorias') or [],
+        data_inicio,
+        data_fim,
+    )
+
+
+def _percentual(parte, total):
+    return (parte / total * 100) if total > 0 else 0
+
+
+def resumir_conformidade(conforme):
+    """
+    Contagens e percentual a partir da máscara de conformidade
+    """
+    conformes = int(conforme.sum())
+    total = int(len(conforme))
+    return {
+        'conformes': conformes,
+        'nao_conformes': total - conformes,
+        'total': total,
+        'percentual': _percentual(conformes, total),
+    }
+
+
+def _serie_para_registros(serie, coluna_chave, coluna_valor):
+    return [
+        {coluna_chave: chave, coluna_valor: valor}
+        for chave, valor in zip(serie.index.tolist(), serie.tolist())
+    ]
+
+
+def resumir_previsao(pf, total_realizado):
+    """
+    Consolidação da previsão de faturamento (formato largo -> longo)
+    """
+    if len(pf) == 0 or EMPRESA_FANTASIA not in pf.columns:
+        return {}
+
+    colunas_data = [col for col in pf.columns if col != EMPRESA_FANTASIA]
+    pf_long = pf.melt(id_vars=[EMPRESA_FANTASIA], value_vars=colunas_data, var_name='Data', value_name='Valor')
+    pf_long['Data'] = pd.to_datetime(pf_long['Data'], errors='coerce')
+    pf_long = pf_long.dropna(subset=['Data'])
+
+    total_por_data = pf_long.groupby('Data')['Valor'].sum()
+    total_por_empresa = pf_long.groupby(EMPRESA_FANTASIA)['Valor'].sum().sort_values(ascending=False)
+    return {
+        'total_previsto': float(pf_long['Valor'].sum()),
+        'media_por_periodo': float(total_por_data.mean()) if len(total_por_data) > 0 else 0.0,
+        'empresas': int(pf[EMPRESA_FANTASIA].nunique()),
+        'periodos': len(colunas_data),
+        'total_realizado': float(total_realizado),
+        'por_data': _serie_para_registros(total_por_data, 'Data', 'Valor'),
+        'por_empresa': _serie_para_registros(total_por_empresa, 'Empresa', 'Valor'),
+    }
+
+
+def calcular_relatorio(datasets, especificacao=None, as_of=None):
+    """
+    Calcula as métricas de todas as páginas para uma especificação de filtros
+    Retorna um dicionário serializável em JSON (ver salvar_json)
+    """
+    especificacao = especificacao or {}
+    filtros = estado_filtros(datasets, especificacao)
+    pr = datasets['pr']
+    filtrados = {
+        nome: filtrar_dataset(datasets[nome], nome, filtros['selecoes'], filtros['data_inicio'], filtros['data_fim'])
+        for nome in ('pr', 'cr', 'par')
+    }
+    pr_filtrado, par_filtrado = filtrados['pr'], filtrados['par']
+
+    metricas = {nome: agregar(datasets[nome], filtrados[nome], nome, filtros) for nome in ('pr', 'cr', 'par')}
+
+    def top10(nome, coluna):
+        if coluna not in filtrados[nome].columns:
+            return []
+        serie = agregar(datasets[nome], filtrados[nome], nome, filtros, coluna, 'valor', limite=10)
+        return _serie_para_registros(serie, coluna, 'Valor')
+
+    def evolucao(nome):
+        serie = agregar(datasets[nome], filtrados[nome], nome, filtros, 'Mes_Ano', 'valor')
+        serie = serie[serie.index > 0].sort_index()
+        return _serie_para_registros(serie, 'Mes_Ano', 'Valor')
+
+    # Conciliação por empresa (Pagamentos Realizados)
+    conciliacao_empresa = []
+    if EMPRESA_FANTASIA in pr_filtrado.columns:
+        por_empresa = agregar(pr, pr_filtrado, 'pr', filtros, EMPRESA_FANTASIA)
+        taxa = (por_empresa['conciliados'] / por_empresa['quantidade'] * 100).sort_values(ascending=False)
+        conciliacao_empresa = _serie_para_registros(taxa, 'Empresa', 'Percentual')
+
+    # Conformidade emissão x registro
+    conformidade = {}
+    conformidade_empresa = []
+    for nome, df in (('pr', pr_filtrado), ('par', par_filtrado)):
+        if 'Mes_Emissao' in df.columns and 'Mes_Registro' in df.columns:
+            df = linhas_filtradas(df, [coluna for coluna in ('Mes_Emissao', 'Mes_Registro', EMPRESA_FANTASIA)
+                                       if coluna in df.columns])
+            conforme = mascara_conformidade(df)
+            conformidade[nome] = resumir_conformidade(conforme)
+            if nome == 'pr' and EMPRESA_FANTASIA in df.columns:
+                taxa = taxas_por_grupo(df, conforme, EMPRESA_FANTASIA)['taxa'].sort_values(ascending=False)
+                conformidade_empresa = _serie_para_registros(taxa, 'Empresa', 'Percentual')
+    conformes = sum(item['conformes'] for item in conformidade.values())
+    total_conformidade = sum(item['total'] for item in conformidade.values())
+    conformidade['geral'] = {
+        'conformes': conformes,
+        'nao_conformes': total_conformidade - conformes,
+        'total': total_conformidade,
+        'percentual': _percentual(conformes, total_conformidade),
+    }
+
+    vencimentos = resumir_vencimentos(par_filtrado, 'Vencimento', 'Valor Líquido', as_of)
+
+    return {
+        'especificacao': especificacao,
+        'filtros': {
+            'selecoes': filtros['selecoes'],
+            'data_inicio': filtros['data_inicio'],
+            'data_fim': filtros['data_fim'],
+        },
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'kpis': {
+            'receitas': metricas['cr'],
+            'despesas_realizadas': metricas['pr'],
+            'despesas_pendentes': metricas['par'],
+            'saldo': metricas['cr']['valor'] + metricas['pr']['valor'],
+        },
+        'conciliacao': {
+            'despesas': _percentual(metricas['pr']['conciliados'], metricas['pr']['quantidade']),
+            'receitas': _percentual(metricas['cr']['conciliados'], metricas['cr']['quantidade']),
+            'por_empresa': conciliacao_empresa,
+        },
+        'conformidade': {**conformidade, 'por_empresa': conformidade_empresa},
+        'vencimentos': vencimentos.to_dict('records'),
+        'top10': {
+            'categorias_despesas': top10('pr', 'Categoria'),
+            'categorias_receitas': top10('cr', 'Categoria'),
+            'categorias_pendentes': top10('par', 'Categoria'),
+            'fornecedores_realizados': top10('pr', 'Fornecedor'),
+            'fornecedores_pendentes': top10('par', 'Razão Social'),
+            'clientes': top10('cr', 'Cliente'),
+        },
+        'evolucao_mensal': {
+            'receitas': evolucao('cr'),
+            'despesas': evolucao('pr'),
+        },
+        'previsao': resumir_previsao(datasets['pf'], metricas['cr']['valor']) if 'pf' in datasets else {},
+    }
+
+
+def combinacoes_grupo_empresa(datasets):
+    """
+    Todas as combinações oferecidas pela sidebar:
+    visão geral, cada Grupo e cada Empresa dentro do Grupo
+    """
+    indices = {nome: indice_filtros(datasets[nome], nome) for nome in ('pr', 'cr', 'par')}
+    grupos = sorted(set(valor for indice in indices.values() for valor in indice.valores('grupo')))
+
+    especificacoes = [{}]
+    for grupo in grupos:
+        especificacoes.append({'grupo': grupo})
+        empresas = sorted(set(
+            valor
+            for indice in indices.values()
+            for valor in indice.valores('empresa', indice.resolver({'grupo': [grupo]}))
+        ))
+        especificacoes.extend({'grupo': grupo, 'empresa': empresa} for empresa in empresas)
+    return especificacoes
+
+
+def chave_filtros(filtros):
+    """
+    Texto que identifica um estado de filtros (montar_filtros) independente da
+    ordem das seleções e do tipo das datas (date, datetime ou Timestamp)
+    """
+    def dia(valor):
+        return None if valor is None else pd.Timestamp(valor).date().isoformat()
+
+    return json.dumps({
+        'selecoes': {dimensao: sorted(map(str, valores)) for dimensao, valores in filtros['selecoes'].items() if valores},
+        'data_inicio': dia(filtros['data_inicio']),
+        'data_fim': dia(filtros['data_fim']),
+    }, sort_keys=True, ensure_ascii=False)
+
+
+def versoes_dados(nomes=('pr', 'cr', 'par', 'pf'), data_dir=DATA_DIR):
+    """
+    Versão do arquivo de origem de cada dataset (ver ingest.versao_relatorio)
+    """
+    return {nome: versao_relatorio(DATASETS[nome]['arquivo'], data_dir) for nome in nomes}
+
+
+@lru_cache(maxsize=64)
+def _ler_json(caminho, _mtime_ns):
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _ler_json_atual(caminho):
+    try:
+        return _ler_json(caminho, os.stat(caminho).st_mtime_ns)
+    except (OSError, ValueError):
+        return None
+
+
+def ler_relatorio_precomputado(filtros, datasets, pasta=RELATORIOS_DIR):
+    """
+    Relatório do lote (executar_lote, formato json) para o estado de filtros,
+    ou None quando não há um válido e as métricas devem ser calculadas
+    datasets: {nome: DataFrame} em uso na página; o lote precisa ter sido
+    calculado sobre as mesmas versões desses datasets (attrs['versao'] do
+    data_loader ou, sem ela, a versão atual do arquivo) e na data de hoje
+    (as situações de vencimento dependem dela)
+    """
+    indice = _ler_json_atual(os.path.join(pasta, 'indice.json'))
+    if not indice or indice.get('formato') != 'json' or indice.get('data_referencia') != date.today().isoformat():
+        return None
+    identificador = indice.get('chaves', {}).get(chave_filtros(filtros))
+    if identificador is None:
+        return None
+    versoes = indice.get('versoes', {})
+    for nome, df in datasets.items():
+        atual = df.attrs.get('versao') or versao_relatorio(DATASETS[nome]['arquivo'])
+        if atual is None or versoes.get(nome) != atual:
+            return None
+    return _ler_json_atual(os.path.join(pasta, f'{identificador}.json'))
+
+
+def _serie_de_registros(registros, coluna_chave, coluna_valor, nome_indice, nome_serie):
+    return pd.Series(
+        [registro[coluna_valor] for registro in registros],
+        index=pd.Index([registro[coluna_chave] for registro in registros], name=nome_indice),
+        name=nome_serie,
+        dtype='float64',
+    )
+
+
+def resultado_precomputado(relatorio, nome, por=None, medida=None, limite=None):
+    """
+    Resultado de agregar() tirado de um relatório pré-calculado, ou None se o
+    relatório não tem a agregação pedida
+    Cobre as métricas de cabeçalho, os Top 10 por valor e a evolução mensal
+    por valor (só meses válidos, Mes_Ano > 0, em ordem)
+    """
+    if por is None:
+        secao = _KPIS.get(nome)
+        if secao is None:
+            return None
+        metricas = dict(relatorio['kpis'][secao])
+        for chave in ('data_min', 'data_max'):
+            if metricas.get(chave) is not None:
+                metricas[chave] = pd.Timestamp(metricas[chave])
+        return metricas if medida is None else metricas.get(medida)
+
+    if not isinstance(por, str) or medida != 'valor':
+        return None
+    coluna_valor = DATASETS[nome]['coluna_valor']
+    if limite == 10 and (nome, por) in _TOP10:
+        return _serie_de_registros(relatorio['top10'][_TOP10[(nome, por)]], por, 'Valor', por, coluna_valor)
+    if limite is None and por == 'Mes_Ano' and nome in _EVOLUCAO:
+        return _serie_de_registros(relatorio['evolucao_mensal'][_EVOLUCAO[nome]], por, 'Valor', por, coluna_valor)
+    return None
+
+
+def taxas_precomputadas(relatorio, secao):
+    """
+    Percentual por empresa ('conciliacao' ou 'conformidade') de um relatório
+    pré-calculado, em ordem decrescente, como taxas_por_grupo(...)['taxa']
+    """
+    return _serie_de_registros(relatorio[secao]['por_empresa'], 'Empresa', 'Percentual', EMPRESA_FANTASIA, 'taxa')
+
+
+def _json_padrao(valor):
+    if isinstance(valor, (pd.Timestamp, datetime)):
+        return valor.isoformat()
+    if hasattr(valor, 'item'):
+        # Escalares numpy
+        return valor.item()
+    raise TypeError(f"Tipo não serializável: {type(valor)}")
+
+
+def salvar_json(relatorio, caminho):
+    temporario = f'{caminho}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2, default=_json_padrao)
+    os.replace(temporario, caminho)
+
+
+def _identificador(posicao, especificacao):
+    partes = [especificacao.get('grupo') or 'todos', especificacao.get('empresa') or '']
+    texto = re.sub(r'[^0-9A-Za-z]+', '_', '_'.join(parte for parte in partes if parte)).strip('_').lower()
+    return f'{posicao:04d}_{texto}'
+
+
+def salvar_parquet(relatorios, saida):
+    """
+    Uma tabela Parquet por seção, com uma coluna 'relatorio' identificando a combinação
+    """
+    tabelas = {}
+    for identificador, relatorio in relatorios.items():
+        linha = {'relatorio': identificador, **{
+            f'{secao}_{medida}': valor
+            for secao, metricas in relatorio['kpis'].items() if isinstance(metricas, dict)
+            for medida, valor in metricas.items()
+        }, 'saldo': relatorio['kpis']['saldo']}
+        linha.update({
+            f'conciliacao_{chave}': relatorio['conciliacao'][chave] for chave in ('despesas', 'receitas')
+        })
+        linha.update({
+            f'conformidade_{nome}': item['percentual']
+            for nome, item in relatorio['conformidade'].items() if isinstance(item, dict)
+        })
+        tabelas.setdefault('kpis', []).append(linha)
+
+        registros = {'vencimentos': relatorio['vencimentos']}
+        registros.update({f'top10_{nome}': itens for nome, itens in relatorio['top10'].items()})
+        registros.update({f'evolucao_{nome}': itens for nome, itens in relatorio['evolucao_mensal'].items()})
+        for nome, itens in registros.items():
+            tabelas.setdefault(nome, []).extend({'relatorio': identificador, **item} for item in itens)
+
+    for nome, linhas in tabelas.items():
+        tabela = pd.DataFrame(linhas)
+        # Chaves de agrupamento podem misturar tipos entre combinações: grava como texto
+        for coluna in tabela.columns:
+            if tabela[coluna].dtype == object:
+                tabela[coluna] = tabela[coluna].map(lambda valor: None if valor is None else str(valor))
+        tabela.to_parquet(os.path.join(saida, f'{nome}.parquet'), index=False)
+
+
+_dados_worker = {}
+
+
+def preparar_snapshots(nomes=('pr', 'cr', 'par', 'pf'), data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    Gera (ou confere) o snapshot de cada relatório uma única vez, antes de
+    iniciar os workers: eles só leem snapshots prontos, sem gravá-los ao mesmo tempo
+    """
+    if not parquet_disponivel():
+        return
+    for nome in nomes:
+        # Sem colunas: só valida o manifesto ou reconstrói o snapshot
+        ler_relatorio(DATASETS[nome]['arquivo'], data_dir, cache_dir, colunas=[])
+
+
+def _iniciar_worker(data_dir, cache_dir):
+    _dados_worker.update(carregar_dados(data_dir=data_dir, cache_dir=cache_dir))
+
+
+def _calcular_no_worker(especificacao, as_of):
+    return calcular_relatorio(_dados_worker, especificacao, as_of)
+
+
+def executar_lote(especificacoes, saida, formato='json', processos=1, as_of=None,
+                  data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    Calcula os relatórios das especificações e grava em saida/
+    Com processos > 1 cada worker carrega os dados uma vez e calcula parte das combinações
+    Retorna o índice {identificador: especificacao}
+    """
+    os.makedirs(saida, exist_ok=True)
+    # Versões lidas antes da carga: se um arquivo mudar durante o lote, o resultado não vale para a nova
+    versoes = versoes_dados(data_dir=data_dir)
+    identificadores = [_identificador(posicao, esp) for posicao, esp in enumerate(especificacoes)]
+
+    if processos > 1 and len(especificacoes) > 1:
+        preparar_snapshots(data_dir=data_dir, cache_dir=cache_dir)
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_worker,
+                                 initargs=(data_dir, cache_dir)) as executor:
+            resultados = list(executor.map(_calcular_no_worker, especificacoes, [as_of] * len(especificacoes)))
+    else:
+        datasets = carregar_dados(data_dir=data_dir, cache_dir=cache_dir)
+        resultados = [calcular_relatorio(datasets, esp, as_of) for esp in especificacoes]
+
+    relatorios = dict(zip(identificadores, resultados))
+    if formato == 'parquet':
+        salvar_parquet(relatorios, saida)
+    else:
+        for identificador, relatorio in relatorios.items():
+            salvar_json(relatorio, os.path.join(saida, f'{identificador}.json'))
+
+    indice = dict(zip(identificadores, especificacoes))
+    salvar_json({
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'formato': formato,
+        'data_referencia': (pd.Timestamp(as_of).date() if as_of else date.today()).isoformat(),
+        'versoes': versoes,
+        'relatorios': indice,
+        'chaves': {chave_filtros(relatorio['filtros']): identificador for identificador, relatorio in relatorios.items()},
+    }, os.path.join(saida, 'indice.json'))
+    logger.info("%d relatórios gravados em %s", len(relatorios), saida)
+    return indice
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera os relatórios do dashboard sem Streamlit")
+    parser.add_argument('--saida', default=RELATORIOS_DIR, help="Pasta de saída")
+    parser.add_argument('--formato', choices=['json', 'parquet'], default='json')
+    parser.add_argument('--todas-combinacoes', action='store_true',
+                        help="Calcula visão geral, cada Grupo e cada Empresa")
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1,
+                        help="Processos paralelos (com --todas-combinacoes)")
+    parser.add_argument('--grupo')
+    parser.add_argument('--empresa')
+    parser.add_argument('--grupo-despesa', action='append', default=[], dest='grupos_despesa')
+    parser.add_argument('--categoria', action='append', default=[], dest='categorias')
+    parser.add_argument('--inicio', dest='data_inicio', help="Data inicial (AAAA-MM-DD)")
+    parser.add_argument('--fim', dest='data_fim', help="Data final (AAAA-MM-DD)")
+    parser.add_argument('--as-of', help="Data de referência dos vencimentos (padrão: hoje)")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--memoria', action='store_true',
+                        help="Só mostra a memória de cada dataset antes/depois da projeção de colunas")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    cache_dir = os.path.join(args.data_dir, '.cache')
+
+    if args.memoria:
+        print(relatorio_memoria(data_dir=args.data_dir, cache_dir=cache_dir).to_string(index=False))
+        return
+
+    if args.todas_combinacoes:
+        especificacoes = combinacoes_grupo_empresa(carregar_dados(('pr', 'cr', 'par'), args.data_dir, cache_dir))
+        periodo = {'data_inicio': args.data_inicio, 'data_fim': args.data_fim}
+        especificacoes = [{**esp, **{k: v for k, v in periodo.items() if v}} for esp in especificacoes]
+        processos = args.processos
+    else:
+        especificacao = {
+            'grupo': args.grupo,
+            'empresa': args.empresa,
+            'grupos_despesa': args.grupos_despesa,
+            'categorias': args.categorias,
+            'data_inicio': args.data_inicio,
+            'data_fim': args.data_fim,
+        }
+        especificacoes = [{k: v for k, v in especificacao.items() if v}]
+        processos = 1
+
+    executar_lote(especificacoes, args.saida, args.formato, processos, args.as_of, args.data_dir, cache_dir)
+
+
+if __name__ == '__main__':
+    main()
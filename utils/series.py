@@ -0,0 +1,126 @@
+"""
+Séries temporais dos gráficos de evolução
+Soma os valores por dia, semana ou mês (totais exatos, a partir das linhas
+filtradas) e reduz séries longas a um orçamento de pontos por trace com
+LTTB (Largest-Triangle-Three-Buckets), que mantém picos, vales e o formato
+da curva. A redução afeta só os pontos desenhados: totais e KPIs continuam
+calculados sobre a série completa
+Com o armazém SQLite as somas diárias vêm do banco e o agrupamento por
+semana ou mês é o mesmo
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils import armazem
+from utils.esquema import DATASETS
+from utils.metricas import colunas_kernel
+from utils.moeda import em_centavos, para_reais
+
+GRANULARIDADES = {'Mensal': 'M', 'Semanal': 'W', 'Diária': 'D'}
+
+# Pontos por trace enviados ao navegador
+PONTOS_POR_TRACE = int(os.environ.get('DASHBOARD_PONTOS_GRAFICO', 1500))
+
+
+def _inicio_periodo(dias, frequencia):
+    """
+    Dia inicial do período (dias desde 1970-01-01) de cada data
+    Semanas começam na segunda-feira (1970-01-01 foi uma quinta)
+    """
+    if frequencia == 'D':
+        return dias
+    if frequencia == 'W':
+        return dias - (dias + 3) % 7
+    if frequencia == 'M':
+        return dias.astype('datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    raise ValueError(f"Frequência desconhecida: {frequencia}")
+
+
+def serie_temporal(df, nome, frequencia='D'):
+    """
+    Soma da coluna de valor do dataset por período da data do filtro
+    frequencia: 'D' (dia), 'W' (semana) ou 'M' (mês)
+    Retorna Series indexada pela data inicial de cada período (só períodos com lançamentos),
+    com valores em reais
+    """
+    if armazem.recorte_armazem(df):
+        dias, pesos = armazem.somas_por_dia(nome, armazem.filtros_recorte(df))
+    else:
+        valores, _, datas = colunas_kernel(df, nome)
+        if datas is None:
+            return pd.Series(dtype='float64')
+        validas = ~np.isnat(datas)
+        dias = datas[validas].astype('datetime64[D]').astype(np.int64)
+        pesos = valores[validas]
+    if len(dias) == 0:
+        return pd.Series(dtype='float64')
+    periodos, posicoes = np.unique(_inicio_periodo(dias, frequencia), return_inverse=True)
+    somas = np.bincount(posicoes, weights=pesos, minlength=len(periodos))
+    if em_centavos(df[DATASETS[nome]['coluna_valor']]):
+        somas = para_reais(somas)
+    return pd.Series(somas, index=pd.DatetimeIndex(periodos.astype('datetime64[D]')), name='valor')
+
+
+def lttb(x, y, limite):
+    """
+    Índices dos pontos escolhidos pelo LTTB (sempre inclui o primeiro e o último)
+    x: valores numéricos crescentes; y: valores do eixo vertical
+    """
+    n = len(x)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # Limites dos baldes intermediários (o primeiro e o último ponto ficam sozinhos)
+    limites = np.linspace(1, n - 1, limite - 1).astype(np.int64)
+    escolhidos = np.empty(limite, dtype=np.int64)
+    escolhidos[0] = 0
+    escolhidos[-1] = n - 1
+    anterior = 0
+    for i in range(limite - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        # Média do balde seguinte (ou o último ponto, no último balde)
+        if i + 2 < len(limites):
+            proximo_inicio, proximo_fim = limites[i + 1], limites[i + 2]
+            media_x = x[proximo_inicio:proximo_fim].mean()
+            media_y = y[proximo_inicio:proximo_fim].mean()
+        else:
+            media_x, media_y = x[n - 1], y[n - 1]
+        # Ponto do balde que forma o maior triângulo com o anterior e a média seguinte
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+
+def _eixo_numerico(x):
+    x = pd.Series(x)
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return x.to_numpy(dtype='datetime64[ns]').view(np.int64).astype('float64')
+    return x.to_numpy(dtype='float64')
+
+
+def reduzir_pontos(df, coluna_x, coluna_y, grupo=None, limite=None):
+    """
+    Reduz cada trace (um por valor de `grupo`, ou a tabela inteira) a no máximo
+    `limite` pontos com LTTB; a tabela deve estar ordenada por coluna_x
+    Os pontos mantidos são pontos reais da série (valores exatos, sem médias)
+    """
+    limite = PONTOS_POR_TRACE if limite is None else limite
+    if grupo is None:
+        if len(df) <= limite:
+            return df
+        return df.iloc[lttb(_eixo_numerico(df[coluna_x]), df[coluna_y], limite)]
+
+    partes = []
+    for _, parte in df.groupby(grupo, observed=True, sort=False):
+        if len(parte) > limite:
+            parte = parte.iloc[lttb(_eixo_numerico(parte[coluna_x]), parte[coluna_y], limite)]
+        partes.append(parte)
+    return pd.concat(partes) if partes else df
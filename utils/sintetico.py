@@ -0,0 +1,301 @@
+"""
+Gerador de dados sintéticos nos esquemas dos quatro relatórios
+Produz Pagamentos Realizados, Contas Recebidas, Pagamentos a Realizar e
+Previsão de Faturamento com os mesmos nomes de coluna das planilhas,
+cardinalidades realistas (poucos grupos, dezenas de empresas, milhares de
+fornecedores), valores com distribuição assimétrica e proporção de
+conciliados configurável. Mesma semente = mesmos dados.
+
+Uso:
+    python -m utils.sintetico --linhas 1000000 --formato parquet --destino /tmp/dados
+    streamlit run app.py  # com DASHBOARD_DATA_DIR=/tmp/dados (ver utils/ingest.py)
+"""
+import os
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+from utils.esquema import DATASETS
+from utils.vencimentos import classificar_vencimentos
+
+logger = logging.getLogger(__name__)
+
+GRUPOS_DESPESA = {
+    'Despesas Administrativas': ['Despesas Jurídicas', 'Material de Escritório', 'Aluguel', 'Contabilidade', 'Software'],
+    'Despesas Operacionais': ['Serviços', 'Manutenção', 'Combustível', 'Energia Elétrica', 'Seguros'],
+    'Despesas com Pessoal': ['Salários', 'Pró-labore', 'FGTS', 'INSS', 'Benefícios'],
+    'Despesas Financeiras': ['Tarifas Bancárias', 'Juros', 'IOF'],
+    'Impostos': ['IRPJ', 'CSLL', 'PIS', 'COFINS', 'ISS', 'ICMS'],
+    'Investimentos': ['Obras', 'Equipamentos'],
+    'Transferências': ['Transferência entre Contas', 'Mútuo'],
+    'Outras Despesas': ['Outros'],
+}
+
+CATEGORIAS_RECEITA = [
+    'Venda de Energia', 'Aportes', 'Rendimentos', 'Reembolsos', 'Mútuo Recebido',
+    'Transferência entre Contas', 'Serviços Prestados', 'Outras Receitas',
+]
+
+CONTAS_CORRENTES = ['Itaú Unibanco', 'Banco do Brasil', 'Bradesco', 'Santander', 'Caixa', 'Sicredi', 'BTG Pactual']
+FORMAS_PAGAMENTO = ['Pagamento de Boleto', 'Transferência', 'PIX', 'Débito Automático']
+
+
+def _zipf(rng, n_valores, tamanho, expoente=1.1):
+    """
+    Índices em [0, n_valores) com frequência decrescente (poucos valores concentram as linhas)
+    """
+    pesos = 1.0 / np.arange(1, n_valores + 1) ** expoente
+    return rng.choice(n_valores, size=tamanho, p=pesos / pesos.sum())
+
+
+def _cnpj(indices, base):
+    """
+    CNPJ fictício e estável por índice (formatado)
+    """
+    numeros = (np.asarray(indices, dtype=np.int64) + base) % 100_000_000
+    return [f'{n // 1_000_000:02d}.{n // 1_000 % 1_000:03d}.{n % 1_000:03d}/0001-{n % 97:02d}' for n in numeros]
+
+
+def _categorias(codigos, valores):
+    return pd.Categorical.from_codes(np.asarray(codigos, dtype=np.int32), categories=list(valores))
+
+
+def _valores(rng, tamanho, media_log=7.0, desvio_log=1.6):
+    """
+    Valores positivos com cauda longa (lognormal), em centavos exatos
+    """
+    return np.round(rng.lognormal(media_log, desvio_log, size=tamanho), 2)
+
+
+def _dias(rng, inicio, fim, tamanho):
+    total = max((fim - inicio).days, 0)
+    return inicio.to_datetime64() + rng.integers(0, total + 1, size=tamanho).astype('timedelta64[D]')
+
+
+class Universo:
+    """
+    Dimensões compartilhadas pelos relatórios (grupos, empresas, contrapartes),
+    para que os filtros da sidebar cruzem os datasets como nos dados reais
+    """
+
+    def __init__(self, rng, n_grupos=5, n_empresas=34, n_fornecedores=1000, n_clientes=120):
+        self.grupos = [f'Grupo {chr(ord("A") + i)}' if i < 26 else f'Grupo {i}' for i in range(n_grupos)]
+        self.empresas = [f'EMPRESA {i + 1:03d} GERAÇÃO DE ENERGIA S.A.' for i in range(n_empresas)]
+        # Cada empresa pertence a um único grupo; grupos com tamanhos desiguais
+        self.grupo_da_empresa = np.sort(_zipf(rng, n_grupos, n_empresas, expoente=0.8))
+        self.grupo_da_empresa[:n_grupos] = np.arange(min(n_grupos, n_empresas))
+        self.cnpj_empresas = _cnpj(np.arange(n_empresas), 55_560_074)
+        self.fornecedores = [f'FORNECEDOR {i + 1:06d} LTDA' for i in range(n_fornecedores)]
+        self.clientes = [f'CLIENTE {i + 1:05d} S.A.' for i in range(n_clientes)]
+        self.grupos_despesa = list(GRUPOS_DESPESA)
+        self.categorias_despesa = [categoria for categorias in GRUPOS_DESPESA.values() for categoria in categorias]
+        self.grupo_da_categoria = np.array([
+            self.grupos_despesa.index(grupo)
+            for grupo, categorias in GRUPOS_DESPESA.items() for _ in categorias
+        ])
+
+    def empresas_sorteadas(self, rng, tamanho):
+        empresas = _zipf(rng, len(self.empresas), tamanho, expoente=0.9)
+        return empresas, self.grupo_da_empresa[empresas]
+
+    def colunas_empresa(self, empresas, grupos, coluna_nome):
+        return {
+            'Grupo': _categorias(grupos, self.grupos),
+            coluna_nome: _categorias(empresas, self.empresas),
+            'Minha Empresa (CNPJ)': _categorias(empresas, self.cnpj_empresas),
+        }
+
+
+def gerar_pagamentos_realizados(rng, universo, linhas, inicio, fim, conciliado=0.99):
+    empresas, grupos = universo.empresas_sorteadas(rng, linhas)
+    fornecedores = _zipf(rng, len(universo.fornecedores), linhas)
+    categorias = _zipf(rng, len(universo.categorias_despesa), linhas, expoente=0.9)
+
+    registro = _dias(rng, inicio, fim, linhas)
+    emissao = registro - rng.geometric(0.08, size=linhas).astype('timedelta64[D]') + np.timedelta64(1, 'D')
+    vencimento = emissao + rng.integers(0, 31, size=linhas).astype('timedelta64[D]')
+
+    valor = _valores(rng, linhas)
+    juros = np.where(rng.random(linhas) < 0.02, np.round(valor * 0.01, 2), 0.0)
+    multa = np.where(rng.random(linhas) < 0.005, np.round(valor * 0.02, 2), 0.0)
+    desconto = np.where(rng.random(linhas) < 0.01, np.round(valor * 0.03, 2), 0.0)
+    pago = valor + juros + multa - desconto
+
+    df = pd.DataFrame(universo.colunas_empresa(empresas, grupos, 'Minha Empresa (Nome Fantasia)'))
+    df['CNPJ/CPF'] = _categorias(fornecedores, _cnpj(np.arange(len(universo.fornecedores)), 77_968_170))
+    df['Fornecedor'] = _categorias(fornecedores, universo.fornecedores)
+    df['Data de Crédito ou Débito (No Extrato)'] = registro
+    df['Vencimento'] = vencimento
+    df['Previsão'] = vencimento
+    df['Emissão'] = emissao
+    df['Grupo.1'] = _categorias(universo.grupo_da_categoria[categorias], universo.grupos_despesa)
+    df['Categoria'] = _categorias(categorias, universo.categorias_despesa)
+    df['Conta Corrente'] = _categorias(rng.integers(0, len(CONTAS_CORRENTES), linhas), CONTAS_CORRENTES)
+    df['Valor da Conta'] = -valor
+    df['Juros'] = -juros
+    df['Multa'] = -multa
+    df['Desconto'] = desconto
+    df['Pago ou Recebido'] = -np.round(pago, 2)
+    df['A Pagar ou Receber'] = 0.0
+    df['Conciliado'] = _categorias((rng.random(linhas) < conciliado).astype(int), ['Não', 'Sim'])
+    df['Data de Registro (completa)'] = registro
+    df['Forma de Pagamento'] = _categorias(_zipf(rng, len(FORMAS_PAGAMENTO), linhas), FORMAS_PAGAMENTO)
+    df['Impostos Retidos'] = np.where(rng.random(linhas) < 0.05, np.round(valor * 0.015, 2), 0.0)
+    return df
+
+
+def gerar_contas_recebidas(rng, universo, linhas, inicio, fim, conciliado=0.99):
+    empresas, grupos = universo.empresas_sorteadas(rng, linhas)
+    clientes = _zipf(rng, len(universo.clientes), linhas)
+    categorias = _zipf(rng, len(CATEGORIAS_RECEITA), linhas)
+
+    credito = _dias(rng, inicio, fim, linhas)
+    emissao = credito - rng.integers(0, 15, size=linhas).astype('timedelta64[D]')
+    valor = _valores(rng, linhas, media_log=9.0, desvio_log=1.8)
+    conciliados = rng.random(linhas) < conciliado
+
+    df = pd.DataFrame(universo.colunas_empresa(empresas, grupos, 'Minha Empresa (Razão Social)'))
+    df['Data de Crédito ou Débito (No Extrato)'] = credito
+    df['CNPJ/CPF'] = _categorias(clientes, _cnpj(np.arange(len(universo.clientes)), 55_629_962))
+    df['Cliente'] = _categorias(clientes, universo.clientes)
+    df['Vencimento'] = credito
+    df['Previsão'] = credito
+    df['Emissão'] = emissao
+    df['Categoria'] = _categorias(categorias, CATEGORIAS_RECEITA)
+    df['Conta Corrente'] = _categorias(rng.integers(0, len(CONTAS_CORRENTES), linhas), CONTAS_CORRENTES)
+    df['Nota Fiscal'] = 'N/D'
+    df['Parcela'] = 'N/D'
+    df['Origem'] = _categorias(_zipf(rng, 3, linhas), ['Lançamento de Crédito', 'Contas a Receber', 'Transferência'])
+    df['Valor da Conta'] = valor
+    df['Pago ou Recebido'] = valor
+    df['Conciliado'] = _categorias(conciliados.astype(int), ['Não', 'Sim'])
+    df['Dias em Atraso'] = 0
+    df['Situação'] = _categorias(conciliados.astype(int), ['Recebido', 'Conciliado'])
+    df['Valor Líquido'] = valor
+    return df
+
+
+def gerar_pagamentos_a_realizar(rng, universo, linhas, inicio, fim, referencia):
+    empresas, grupos = universo.empresas_sorteadas(rng, linhas)
+    fornecedores = _zipf(rng, len(universo.fornecedores), linhas)
+    categorias = _zipf(rng, len(universo.categorias_despesa), linhas, expoente=0.9)
+
+    vencimento = _dias(rng, inicio, fim, linhas)
+    emissao = vencimento - rng.integers(0, 46, size=linhas).astype('timedelta64[D]')
+    registro = emissao + rng.geometric(0.15, size=linhas).astype('timedelta64[D]') - np.timedelta64(1, 'D')
+    valor = _valores(rng, linhas, media_log=8.0)
+    impostos = np.where(rng.random(linhas) < 0.05, np.round(valor * 0.015, 2), 0.0)
+
+    df = pd.DataFrame(universo.colunas_empresa(empresas, grupos, 'Minha Empresa (Razão Social)'))
+    df['Previsão'] = vencimento
+    df['CNPJ/CPF'] = _categorias(fornecedores, _cnpj(np.arange(len(universo.fornecedores)), 77_968_170))
+    df['Razão Social'] = _categorias(fornecedores, universo.fornecedores)
+    df['Emissão'] = emissao
+    df['Vencimento'] = vencimento
+    df['Registro'] = registro
+    df['Grupo.1'] = _categorias(universo.grupo_da_categoria[categorias], universo.grupos_despesa)
+    df['Categoria'] = _categorias(categorias, universo.categorias_despesa)
+    df['Conta Corrente'] = _categorias(rng.integers(0, len(CONTAS_CORRENTES), linhas), CONTAS_CORRENTES)
+    df['Origem'] = _categorias(_zipf(rng, 4, linhas), [
+        'Contas a Pagar', 'Contas a Pagar (repetição)', 'Contas a Pagar (parcela)', 'Importação',
+    ])
+    df['Valor da Conta'] = -valor
+    df['Valor Líquido'] = -np.round(valor - impostos, 2)
+    df['Impostos Retidos'] = impostos
+    vencido = vencimento < np.datetime64(pd.Timestamp(referencia).normalize(), 'ns')
+    df['Situação'] = _categorias(vencido.astype(int), ['A vencer', 'Vencido'])
+    df['Situação do Vencimento'] = classificar_vencimentos(pd.Series(vencimento), referencia).astype(str)
+    return df
+
+
+def gerar_previsao_faturamento(rng, universo, n_empresas=15, n_periodos=4, inicio=None):
+    """
+    Formato largo: uma linha por empresa e uma coluna (data) por período
+    """
+    inicio = pd.Timestamp(inicio or pd.Timestamp.now()).normalize()
+    periodos = pd.date_range(inicio, periods=n_periodos, freq='ME')
+    n_empresas = min(n_empresas, len(universo.empresas))
+
+    df = pd.DataFrame({'Minha Empresa (Nome Fantasia)': universo.empresas[:n_empresas]})
+    for periodo in periodos:
+        valores = _valores(rng, n_empresas, media_log=13.0, desvio_log=1.0)
+        df[periodo.to_pydatetime()] = np.where(rng.random(n_empresas) < 0.8, valores, np.nan)
+    return df
+
+
+def gerar_datasets(linhas=100_000, linhas_cr=None, linhas_par=None, seed=0, conciliado=0.99,
+                   inicio='2025-01-01', fim='2025-12-31', n_grupos=5, n_empresas=34,
+                   n_fornecedores=None, n_clientes=None):
+    """
+    Gera os quatro relatórios, na proporção dos dados reais quando
+    linhas_cr/linhas_par não são informados (~4 pagamentos por recebimento,
+    ~13 pagamentos realizados por pagamento a realizar)
+    Retorna {'pr', 'cr', 'par', 'pf'} com DataFrames no formato das planilhas
+    """
+    rng = np.random.default_rng(seed)
+    inicio = pd.Timestamp(inicio)
+    fim = pd.Timestamp(fim)
+    linhas_cr = linhas_cr if linhas_cr is not None else max(linhas // 4, 1)
+    linhas_par = linhas_par if linhas_par is not None else max(linhas // 13, 1)
+    # Contrapartes crescem com o volume, como nos relatórios reais
+    n_fornecedores = n_fornecedores or int(np.clip(linhas / 12, 50, 200_000))
+    n_clientes = n_clientes or int(np.clip(linhas_cr / 27, 20, 50_000))
+
+    universo = Universo(rng, n_grupos, n_empresas, n_fornecedores, n_clientes)
+    return {
+        'pr': gerar_pagamentos_realizados(rng, universo, linhas, inicio, fim, conciliado),
+        'cr': gerar_contas_recebidas(rng, universo, linhas_cr, inicio, fim, conciliado),
+        'par': gerar_pagamentos_a_realizar(rng, universo, linhas_par, inicio, fim, referencia=fim),
+        'pf': gerar_previsao_faturamento(rng, universo, inicio=fim),
+    }
+
+
+def salvar_datasets(datasets, destino, formato='parquet'):
+    """
+    Grava os relatórios em destino/ com os nomes de arquivo do esquema
+    formato: 'xlsx' (planilhas, até ~1 milhão de linhas), 'csv' ou
+    'parquet' (exportação colunar lida diretamente pela ingestão)
+    """
+    os.makedirs(destino, exist_ok=True)
+    caminhos = []
+    for nome, df in datasets.items():
+        base = os.path.splitext(DATASETS[nome]['arquivo'])[0]
+        caminho = os.path.join(destino, f'{base}.{formato}')
+        if formato == 'xlsx':
+            df.to_excel(caminho, index=False)
+        elif formato == 'csv':
+            df.to_csv(caminho, index=False)
+        elif formato == 'parquet':
+            df_gravacao = df.copy()
+            df_gravacao.columns = [str(coluna) for coluna in df.columns]
+            df_gravacao.to_parquet(caminho, index=False)
+        else:
+            raise ValueError(f"Formato desconhecido: {formato}")
+        caminhos.append(caminho)
+        logger.info("%s: %d linhas em %s", nome, len(df), caminho)
+    return caminhos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera relatórios sintéticos nos esquemas do dashboard")
+    parser.add_argument('--linhas', type=int, default=100_000, help="Linhas de Pagamentos Realizados")
+    parser.add_argument('--linhas-cr', type=int, help="Linhas de Contas Recebidas (padrão: linhas/4)")
+    parser.add_argument('--linhas-par', type=int, help="Linhas de Pagamentos a Realizar (padrão: linhas/13)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--conciliado', type=float, default=0.99, help="Proporção de conciliados (0 a 1)")
+    parser.add_argument('--inicio', default='2025-01-01')
+    parser.add_argument('--fim', default='2025-12-31')
+    parser.add_argument('--formato', choices=['xlsx', 'csv', 'parquet'], default='parquet')
+    parser.add_argument('--destino', required=True, help="Pasta de saída")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    datasets = gerar_datasets(args.linhas, args.linhas_cr, args.linhas_par, args.seed, args.conciliado,
+                              args.inicio, args.fim)
+    salvar_datasets(datasets, args.destino, args.formato)
+
+
+if __name__ == '__main__':
+    main()
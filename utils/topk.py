@@ -0,0 +1,154 @@
+"""
+Top-K sem ordenação completa
+Os widgets de Top 10 só precisam dos K maiores grupos: em vez de ordenar
+todos os grupos (centenas de milhares de fornecedores, por exemplo), a
+seleção parcial (np.partition) encontra o K-ésimo maior valor em tempo linear
+e só os candidatos são ordenados.
+Resultado igual a sort_values(ascending=False, kind='stable').head(k):
+empates seguem a ordem original (a ordem das chaves, nos agrupamentos)
+"""
+import numpy as np
+import pandas as pd
+
+# Somas parciais acumuladas antes de consolidar (limita a memória entre blocos)
+_PARCIAIS_POR_COMPACTACAO = 8
+
+
+def posicoes_top_k(valores, k, desempate=None):
+    """
+    Posições dos k maiores valores, em ordem decrescente
+    NaN fica por último, como no sort_values
+    desempate: valores alinhados a `valores` que ordenam os empates (ex.: as chaves
+    dos grupos); sem ele os empates seguem a posição. Só os empatados no limiar e
+    os k candidatos são ordenados
+    """
+    valores = np.asarray(valores, dtype='float64')
+    n = len(valores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+
+    chave = np.where(np.isnan(valores), -np.inf, valores)
+    if n > k:
+        limiar = np.partition(chave, n - k)[n - k]
+        acima = np.flatnonzero(chave > limiar)
+        # Empate no limiar: entram os primeiros pela ordem de desempate, como em uma ordenação estável
+        iguais = np.flatnonzero(chave == limiar)
+        if desempate is not None and len(iguais) > k - len(acima):
+            iguais = iguais[np.argsort(desempate[iguais], kind='stable')]
+        candidatos = np.concatenate([acima, iguais[:k - len(acima)]])
+    else:
+        candidatos = np.arange(n)
+
+    if desempate is None:
+        ordem_empate = candidatos
+    else:
+        # Posto de cada candidato na ordem de desempate (só os k candidatos são ordenados)
+        ordem_empate = np.empty(len(candidatos), dtype=np.intp)
+        ordem_empate[np.argsort(desempate[candidatos], kind='stable')] = np.arange(len(candidatos))
+    ordem = np.lexsort((ordem_empate, np.isnan(valores[candidatos]), -chave[candidatos]))
+    return candidatos[ordem]
+
+
+def top_k(dados, k, coluna=None, desempate_por_indice=False):
+    """
+    Os k maiores valores de uma Series, ou as k linhas de um DataFrame
+    com os maiores valores em `coluna`
+    desempate_por_indice: empates seguem a ordem do índice (em vez da posição),
+    sem precisar ordenar o índice inteiro antes
+    """
+    valores = dados if coluna is None else dados[coluna]
+    desempate = _chaves_desempate(dados.index) if desempate_por_indice else None
+    return dados.iloc[posicoes_top_k(valores.to_numpy(dtype='float64', na_value=np.nan), k, desempate)]
+
+
+def _chaves_desempate(chaves):
+    """
+    Array de desempate a partir de chaves de grupo; categorias valem pela ordem
+    das categorias (códigos), como em um agrupamento
+    """
+    if isinstance(chaves.dtype, pd.CategoricalDtype):
+        return np.asarray(chaves.codes if isinstance(chaves, pd.Index) else chaves.cat.codes)
+    return np.asarray(chaves, dtype=object)
+
+
+def top_k_agrupado(chaves, valores, k, tamanho_bloco=1_000_000):
+    """
+    Soma `valores` por `chaves` e devolve as k maiores somas (Series indexada pela chave)
+    Somas acumuladas por código da chave (bincount) em blocos de linhas, sem montar
+    o groupby completo nem ordenar os grupos (nem as chaves distintas); só chaves
+    presentes entram (como groupby(observed=True)) e empates seguem a ordem das chaves
+    """
+    chaves = pd.Series(chaves)
+    if isinstance(chaves.dtype, pd.CategoricalDtype):
+        codigos = chaves.cat.codes.to_numpy()
+        categorias = chaves.cat.categories
+        desempate = None  # códigos já seguem a ordem das categorias
+    else:
+        codigos, categorias = pd.factorize(chaves, sort=False)
+        desempate = np.asarray(categorias, dtype=object)
+    valores = np.asarray(valores, dtype='float64')
+
+    somas = np.zeros(len(categorias), dtype='float64')
+    presentes = np.zeros(len(categorias), dtype=bool)
+    for inicio in range(0, len(codigos), tamanho_bloco):
+        bloco = codigos[inicio:inicio + tamanho_bloco]
+        validos = bloco >= 0
+        somas += np.bincount(
+            bloco[validos], weights=valores[inicio:inicio + tamanho_bloco][validos], minlength=len(categorias)
+        )
+        presentes[bloco[validos]] = True
+
+    posicoes = np.flatnonzero(presentes)
+    desempate = desempate[posicoes] if desempate is not None else None
+    escolhidas = posicoes[posicoes_top_k(somas[posicoes], k, desempate)]
+    return pd.Series(somas[escolhidas], index=pd.Index(categorias[escolhidas], name=chaves.name))
+
+
+def top_k_em_fluxo(ler_blocos, coluna_chave, coluna_valor, k, particoes=1):
+    """
+    Top-K exato das somas por chave sobre uma fonte lida em blocos
+    (ex.: grupos de linhas de um Parquet, ver blocos_parquet)
+    ler_blocos: função sem argumentos que devolve um iterável de DataFrames
+    particoes: com P > 1 as chaves são divididas por hash em P partições e a
+    fonte é lida P vezes; cada passada guarda as somas de ~1/P das chaves e só
+    os K maiores de cada partição seguem para o resultado (memória limitada)
+    """
+    def compactar(parciais):
+        return pd.concat(parciais).groupby(level=0, sort=False).sum()
+
+    candidatos = []
+    for particao in range(particoes):
+        parciais = []
+        for bloco in ler_blocos():
+            # Agrega o bloco primeiro; partição e acumulação trabalham só com as chaves do bloco
+            parcial = bloco.groupby(coluna_chave, observed=True, sort=False)[coluna_valor].sum()
+            parcial.index = pd.Index(np.asarray(parcial.index), name=coluna_chave)
+            if particoes > 1:
+                parcial = parcial[pd.util.hash_array(parcial.index.to_numpy()) % particoes == particao]
+            parciais.append(parcial)
+            if len(parciais) >= _PARCIAIS_POR_COMPACTACAO:
+                parciais = [compactar(parciais)]
+        if parciais:
+            somas = compactar(parciais)
+            if len(somas):
+                candidatos.append(top_k(somas, k, desempate_por_indice=True))
+
+    if not candidatos:
+        return pd.Series(dtype='float64', name=coluna_valor)
+    return top_k(pd.concat(candidatos), k, desempate_por_indice=True)
+
+
+def blocos_parquet(caminho, colunas, linhas_por_bloco=500_000):
+    """
+    Leitor em blocos de um Parquet (só as colunas pedidas), para top_k_em_fluxo:
+        top_k_em_fluxo(lambda: blocos_parquet(caminho, ['Fornecedor', 'Pago ou Recebido']),
+                       'Fornecedor', 'Pago ou Recebido', 10, particoes=8)
+    """
+    import pyarrow.parquet as pq
+
+    # Colunas de texto lidas como dicionário (categóricas): agrupamento e hash por código
+    arquivo = pq.ParquetFile(caminho, read_dictionary=[
+        campo.name for campo in pq.read_schema(caminho) if campo.name in colunas and str(campo.type) in ('string', 'large_string')
+    ])
+    for lote in arquivo.iter_batches(batch_size=linhas_por_bloco, columns=list(colunas)):
+        yield lote.to_pandas()
@@ -0,0 +1,113 @@
+"""
+Situação de vencimento das contas a pagar
+Classificação por faixa de dias até o vencimento e resumo por situação
+(sem dependência do Streamlit: usado pelas páginas e pelo motor de relatórios)
+"""
+import pandas as pd
+import numpy as np
+
+from utils.filtros import linhas_filtradas
+from utils.moeda import em_centavos, para_reais
+
+SITUACAO_SEM_VENCIMENTO = ("Sem data de vencimento", 99)
+
+def _situacao_por_dias(dias_diff):
+    """
+    Situação e ordem de vencimento a partir da diferença em dias para hoje
+    """
+    # Ordenação temporal conforme especificado
+    if dias_diff == 0:
+        return "Vence hoje", 1
+    elif dias_diff == 1:
+        return "Vence amanhã", 2
+    elif 2 <= dias_diff <= 7:
+        return "Vence nos próximos dias", 3
+    elif 8 <= dias_diff <= 30:
+        return "A vencer até 30 dias", 4
+    elif 31 <= dias_diff <= 60:
+        return "A vencer de 31 até 60 dias", 5
+    elif 61 <= dias_diff <= 90:
+        return "A vencer de 61 até 90 dias", 6
+    elif -30 <= dias_diff < 0:
+        return "Vencido até 30 dias", 7
+    elif -60 <= dias_diff < -30:
+        return "Vencido de 31 a 60 dias", 8
+    elif dias_diff < -90:
+        return "Vencido mais de 90 dias", 9
+    else:
+        return "A vencer (mais de 90 dias)", 10
+
+def calcular_situacao_vencimento(data_vencimento, as_of=None):
+    """
+    Calcula a situação de vencimento de uma data
+    Retorna categoria e ordem para ordenação temporal
+    """
+    if pd.isna(data_vencimento):
+        return SITUACAO_SEM_VENCIMENTO
+    
+    hoje = pd.Timestamp(as_of).normalize() if as_of is not None else pd.Timestamp.now().normalize()
+    data_venc = pd.to_datetime(data_vencimento).normalize()
+    dias_diff = (data_venc - hoje).days
+    
+    return _situacao_por_dias(dias_diff)
+
+# Fora de [-91, 91] dias a situação não muda mais; a tabela cobre esse intervalo
+_LIMITE_DIAS_VENCIMENTO = 91
+_SITUACOES_POR_DIA = [_situacao_por_dias(dias) for dias in range(-_LIMITE_DIAS_VENCIMENTO, _LIMITE_DIAS_VENCIMENTO + 1)]
+
+# Situações na ordem temporal (campo ordem), com "Sem data de vencimento" por último
+SITUACOES_VENCIMENTO = sorted(set(_SITUACOES_POR_DIA) | {SITUACAO_SEM_VENCIMENTO}, key=lambda situacao: situacao[1])
+_CODIGO_SITUACAO = {situacao: codigo for codigo, situacao in enumerate(SITUACOES_VENCIMENTO)}
+_CODIGO_POR_DIA = np.array([_CODIGO_SITUACAO[situacao] for situacao in _SITUACOES_POR_DIA], dtype=np.int8)
+
+def classificar_vencimentos(datas, as_of=None):
+    """
+    Versão vetorizada de calcular_situacao_vencimento para uma coluna inteira
+    Calcula a diferença em dias uma única vez contra a data de referência (as_of)
+    e mapeia para a situação por tabela de consulta
+    Retorna um Categorical ordenado temporalmente (mesmas categorias e ordem)
+    """
+    hoje = pd.Timestamp(as_of).normalize() if as_of is not None else pd.Timestamp.now().normalize()
+    datas = pd.to_datetime(pd.Series(datas), errors='coerce')
+    
+    dias = (datas.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]') - np.datetime64(hoje.date(), 'D')).astype(np.int64)
+    dias = np.clip(dias, -_LIMITE_DIAS_VENCIMENTO, _LIMITE_DIAS_VENCIMENTO)
+    codigos = _CODIGO_POR_DIA[dias + _LIMITE_DIAS_VENCIMENTO]
+    codigos[datas.isna().to_numpy()] = _CODIGO_SITUACAO[SITUACAO_SEM_VENCIMENTO]
+    
+    return pd.Categorical.from_codes(
+        codigos,
+        categories=[nome for nome, _ in SITUACOES_VENCIMENTO],
+        ordered=True
+    )
+
+def resumir_vencimentos(df, coluna_vencimento='Vencimento', coluna_valor='Valor Líquido', as_of=None):
+    """
+    Valor total (numérico, em reais) e quantidade por situação de vencimento
+    Ordenada temporalmente conforme especificação; só situações presentes
+    as_of fixa a data de referência (padrão: hoje)
+    """
+    if coluna_vencimento not in df.columns or coluna_valor not in df.columns:
+        return pd.DataFrame()
+    # Só as duas colunas usadas (vindas do armazém SQLite, quando ativo)
+    df = linhas_filtradas(df, [coluna_vencimento, coluna_valor])
+    
+    situacoes = classificar_vencimentos(df[coluna_vencimento], as_of)
+    codigos = situacoes.codes
+    valores = df[coluna_valor].to_numpy(dtype='float64', na_value=np.nan)
+    preenchidos = ~np.isnan(valores)
+    
+    # Soma e contagem por situação em uma única passada
+    n_situacoes = len(situacoes.categories)
+    linhas = np.bincount(codigos, minlength=n_situacoes)
+    soma = np.bincount(codigos, weights=np.where(preenchidos, valores, 0.0), minlength=n_situacoes)
+    quantidade = np.bincount(codigos, weights=preenchidos, minlength=n_situacoes).astype(np.int64)
+    if em_centavos(df[coluna_valor]):
+        soma = para_reais(soma)
+    
+    presentes = linhas > 0
+    return pd.DataFrame({
+        'Situação do Vencimento': situacoes.categories[presentes],
+        'Valor Total': soma[presentes],
+        'Quantidade': quantidade[presentes]
+    })